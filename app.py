@@ -1,46 +1,192 @@
 # file: app.py
 from flask import Flask, render_template, request, jsonify
-from backend.search import retrieve
-from backend.db import insert_passage
+from backend.batcher import retrieve
 from backend.bot import answer_question
-from chatbot.learning_engine import get_learning_engine
-from chatbot.sentiment_analyzer import get_sentiment_analyzer
-from chatbot.conversation_manager import get_conversation_manager
-import json, uuid, os
-from config import TOP_K, HOST, PORT, DEBUG
+from backend import cache
+import json, uuid, os, time
+import functools
+import hashlib
+from typing import Optional, Annotated
+from concurrent.futures import ProcessPoolExecutor
+import msgspec
+from config import TOP_K, HOST, PORT, DEBUG, DATA_DIR
 
 app = Flask(__name__, static_folder="frontend/static", template_folder="frontend/templates")
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Compress JSON bodies (search results are mostly Vietnamese text, 50-200 KB)
+try:
+    from flask_compress import Compress
+    app.config["COMPRESS_ALGORITHM"] = ["br", "zstd", "gzip"]
+    app.config["COMPRESS_BR_LEVEL"] = 4
+    app.config["COMPRESS_MIN_SIZE"] = 1024
+    app.config["COMPRESS_MIMETYPES"] = ["application/json", "text/html", "text/css", "application/javascript"]
+    Compress(app)
+except ImportError:
+    print("⚠️ flask-compress not installed, responses are sent uncompressed")
+
+
+def json_response(obj, status=200):
+    """Serialize a response body with orjson (handles numpy scores natively)."""
+    if orjson is None:
+        return jsonify(obj), status
+    body = orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return app.response_class(body, status=status, mimetype="application/json")
+
+
+# Request bodies, decoded straight from bytes (strict=False accepts "5" for ints)
+# Required question text with at least one non-space character: a missing or
+# empty body, or a blank q, is a 400 instead of a search for ""
+Query = Annotated[str, msgspec.Meta(pattern=r"\S")]
+
+
+class SearchReq(msgspec.Struct):
+    q: Query
+    k: int = TOP_K
+    mode: Optional[str] = None
+
+
+class ChatReq(msgspec.Struct):
+    q: Query
+    session_id: Optional[str] = None
+    user_id: str = "anonymous"
+
+
+class FeedbackReq(msgspec.Struct):
+    interaction_id: str = ""
+    rating: int = 0  # 1-5
+    feedback: str = ""
+
+
+class SessionCreateReq(msgspec.Struct):
+    user_id: str = "anonymous"
+    session_name: str = ""
+
+
+class BuildIndexReq(msgspec.Struct):
+    incremental: bool = False
+
+
+class InvalidBody(ValueError):
+    pass
+
+
+def parse_body(req_type):
+    """Decode the JSON request body into `req_type`; raises InvalidBody if invalid."""
+    try:
+        return msgspec.json.decode(request.get_data() or b"{}", type=req_type, strict=False)
+    except msgspec.DecodeError as e:
+        raise InvalidBody(str(e))
+
+
+@app.errorhandler(InvalidBody)
+def handle_invalid_body(e):
+    return json_response({"status": "error", "message": str(e)}, 400)
+
+
+# Chatbot engines are imported on first use rather than at app import
+@functools.cache
+def _learning():
+    from chatbot.learning_engine import get_learning_engine
+    return get_learning_engine()
+
+
+@functools.cache
+def _conversations():
+    from chatbot.conversation_manager import get_conversation_manager
+    return get_conversation_manager()
+
+
+# Background index rebuilds: one worker process, jobs tracked by id. Job status
+# lives in files under DATA_DIR so a poll can land on any web worker; finished
+# jobs are forgotten after INDEX_JOB_TTL seconds.
+_index_executor = None
+INDEX_JOBS_DIR = os.path.join(DATA_DIR, "index_jobs")
+INDEX_JOB_TTL = 3600
+
+
+def get_index_executor() -> ProcessPoolExecutor:
+    global _index_executor
+    if _index_executor is None:
+        _index_executor = ProcessPoolExecutor(max_workers=1)
+    return _index_executor
+
+@functools.cache
+def _index_html():
+    """index.html has no template context, so render it once and reuse the bytes."""
+    html = render_template("index.html").encode("utf-8")
+    return html, hashlib.sha256(html).hexdigest()[:16]
+
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    if DEBUG:
+        return render_template("index.html")
+    html, etag = _index_html()
+    resp = app.response_class(html, mimetype="text/html")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "public, max-age=300"
+    return resp.make_conditional(request)
+
+# Search results show at most this many characters of each passage
+SNIPPET_CHARS = 800
+
+
+def snippet(text: str) -> str:
+    return text[:SNIPPET_CHARS] + "..." if len(text) > SNIPPET_CHARS else text
+
 
 @app.route("/api/search", methods=["POST"])
 def api_search():
-    data = request.get_json()
-    q = data.get("q", "")
-    k = data.get("k", TOP_K)
-    mode = data.get("mode", None)
-    hits = retrieve(q, k=int(k), mode=mode)
+    req = parse_body(SearchReq)
+    q, k, mode = req.q, req.k, req.mode
+    key = cache.make_key("s", cache.normalize_query(q), k, mode)
+    cached = cache.get_json(key)
+    if cached is not None:
+        return json_response(cached)
+    hits = retrieve(q, k=k, mode=mode)
     # format response
-    out = []
-    for h in hits:
-        out.append({
-            "title": h.get("title"),
-            "section": h.get("section"),
-            "text": (h.get("text")[:800] + "...") if len(h.get("text",""))>800 else h.get("text",""),
-            "score": h.get("score", 0),
-            "url": h.get("url")
-        })
-    return jsonify({"query": q, "results": out})
+    out = [{
+        "title": h.get("title"),
+        "section": h.get("section"),
+        "text": snippet(h.get("text") or ""),
+        "score": h.get("score", 0),
+        "url": h.get("url")
+    } for h in hits]
+    resp = {"query": q, "results": out}
+    cache.set_json(key, resp)
+    return json_response(resp)
 
 @app.route("/api/chat", methods=["POST"])
 def api_chat():
-    data = request.get_json()
-    q = data.get("q","")
-    session_id = data.get("session_id", None)
-    user_id = data.get("user_id", "anonymous")
+    req = parse_body(ChatReq)
+    q, session_id, user_id = req.q, req.session_id, req.user_id
     
+    # Cache key ignores session_id but includes the last bot turn, so
+    # follow-up questions are not answered from an unrelated conversation.
+    conversation_manager = _conversations()
+    last_turn = conversation_manager.get_last_bot_answer(session_id) if session_id else None
+    key = cache.make_key("c", cache.normalize_query(q), user_id, last_turn)
+    cached = cache.get_json(key)
+    if cached is not None:
+        # A cache hit is still an interaction of its own: learning stats count it
+        # and feedback on it must not land on the interaction that was cached
+        if cached.get("interaction_id"):
+            cached["interaction_id"] = _learning().record_interaction(
+                q, cached.get("answer") or "", cached.get("sources", []), user_id,
+                {"from_cache": True, "sentiment": cached.get("sentiment"), "urgency": cached.get("urgency"),
+                 "confidence": cached.get("confidence")}
+            )
+        if session_id:
+            conversation_manager.add_message(session_id, "user", q)
+            conversation_manager.add_message(session_id, "bot", cached.get("answer") or "",
+                                             {"interaction_id": cached.get("interaction_id")})
+        return json_response(cached)
+
     # Use bot helper to compose answer from retrieval
     bot_resp = answer_question(q, k=5, session_id=session_id, user_id=user_id)
     
@@ -55,21 +201,20 @@ def api_chat():
     }
     if bot_resp.get("confidence") is not None:
         resp["confidence"] = bot_resp.get("confidence")
-    return jsonify(resp)
+    cache.set_json(key, resp)
+    return json_response(resp)
 
 
 @app.route("/api/feedback", methods=["POST"])
 def api_feedback():
     """Record user feedback on bot response"""
-    data = request.get_json()
-    interaction_id = data.get("interaction_id", "")
-    rating = data.get("rating", 0)  # 1-5
-    feedback_text = data.get("feedback", "")
+    req = parse_body(FeedbackReq)
+    interaction_id, rating, feedback_text = req.interaction_id, req.rating, req.feedback
     
-    learning_engine = get_learning_engine()
-    learning_engine.submit_feedback(interaction_id, rating, feedback_text)
+    learning_engine = _learning()
+    learning_engine.submit_feedback_async(interaction_id, rating, feedback_text)
     
-    return jsonify({
+    return json_response({
         "status": "ok",
         "message": "Cảm ơn bạn vì phản hồi! Tôi sẽ cải thiện.",
         "interaction_id": interaction_id
@@ -79,22 +224,21 @@ def api_feedback():
 @app.route("/api/learning-stats", methods=["GET"])
 def api_learning_stats():
     """Get learning engine statistics"""
-    learning_engine = get_learning_engine()
+    learning_engine = _learning()
     stats = learning_engine.get_learning_stats()
-    return jsonify(stats)
+    return json_response(stats)
 
 
 @app.route("/api/session/create", methods=["POST"])
 def api_create_session():
     """Create new conversation session"""
-    data = request.get_json()
-    user_id = data.get("user_id", "anonymous")
-    session_name = data.get("session_name", "")
+    req = parse_body(SessionCreateReq)
+    user_id, session_name = req.user_id, req.session_name
     
-    conversation_manager = get_conversation_manager()
+    conversation_manager = _conversations()
     session_id = conversation_manager.create_session(user_id, session_name)
     
-    return jsonify({
+    return json_response({
         "status": "ok",
         "session_id": session_id
     })
@@ -103,44 +247,116 @@ def api_create_session():
 @app.route("/api/session/<session_id>/stats", methods=["GET"])
 def api_session_stats(session_id):
     """Get statistics for a session"""
-    conversation_manager = get_conversation_manager()
+    conversation_manager = _conversations()
     stats = conversation_manager.get_conversation_stats(session_id)
-    return jsonify(stats)
+    return json_response(stats)
 
 
 @app.route("/api/session/<session_id>/context", methods=["GET"])
 def api_session_context(session_id):
     """Get context from conversation"""
     window_size = request.args.get("window_size", 5, type=int)
-    conversation_manager = get_conversation_manager()
+    conversation_manager = _conversations()
     context = conversation_manager.get_context_window(session_id, window_size)
-    return jsonify(context)
+    return json_response(context)
+
+
+def _job_path(job_id: str) -> str:
+    return os.path.join(INDEX_JOBS_DIR, f"{job_id}.json")
+
+
+def _write_job(job_id: str, status: str, message: str = ""):
+    """Record a job's status (temp file + rename, so a poll never reads half a file)."""
+    os.makedirs(INDEX_JOBS_DIR, exist_ok=True)
+    path = _job_path(job_id)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"status": status, "message": message}, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _read_job(job_id: str):
+    """Status dict of a job, or None if the id is unknown or expired."""
+    try:
+        uuid.UUID(job_id)
+        with open(_job_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+def _prune_jobs():
+    """Delete status files of jobs that finished more than INDEX_JOB_TTL seconds ago."""
+    cutoff = time.time() - INDEX_JOB_TTL
+    try:
+        entries = list(os.scandir(INDEX_JOBS_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff and entry.name.endswith(".json"):
+                job = _read_job(entry.name[:-len(".json")])
+                if job is None or job.get("status") != "running":
+                    os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _index_rebuilt(job_id, future):
+    """Record the job's outcome; serve the new index in this worker at once and drop cached answers."""
+    err = future.exception()
+    if err is not None:
+        _write_job(job_id, "error", str(err))
+        return
+    _write_job(job_id, "ok", "TF-IDF index rebuilt.")
+    from backend.search import reload_models
+    reload_models()
+    cache.invalidate()
 
 
 @app.route("/api/build_index", methods=["POST"])
 def api_build_index():
-    # rebuild TF-IDF index (blocking)
+    # rebuild TF-IDF index in a background process; poll /api/build_index/<job_id>
+    # {"incremental": true} only indexes passages inserted since the last build
     from backend import indexer
+    req = parse_body(BuildIndexReq)
+    job = indexer.update_tfidf if req.incremental else indexer.build_tfidf
+    _prune_jobs()
+    job_id = str(uuid.uuid4())
     try:
-        indexer.build_tfidf()
-        return jsonify({"status": "ok", "message": "TF-IDF index rebuilt."})
+        _write_job(job_id, "running")
+        future = get_index_executor().submit(job)
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        _write_job(job_id, "error", str(e))
+        return json_response({"status": "error", "message": str(e)}, 500)
+    future.add_done_callback(functools.partial(_index_rebuilt, job_id))
+    return json_response({"status": "accepted", "job_id": job_id, "message": "TF-IDF rebuild started."}, 202)
+
+
+@app.route("/api/build_index/<job_id>", methods=["GET"])
+def api_build_index_status(job_id):
+    """Get status of a background index rebuild"""
+    job = _read_job(job_id)
+    if job is None:
+        return json_response({"status": "error", "message": "Job not found"}, 404)
+    resp = {"status": job["status"], "job_id": job_id}
+    if job.get("message"):
+        resp["message"] = job["message"]
+    return json_response(resp)
 
 
 @app.route("/api/export-learned", methods=["POST"])
 def api_export_learned():
     """Export learned data"""
-    learning_engine = get_learning_engine()
+    learning_engine = _learning()
     try:
         learning_engine.export_learned_data()
-        return jsonify({
+        return json_response({
             "status": "ok",
             "message": "Dữ liệu học được đã được export.",
             "location": "data/learned_exports"
         })
     except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return json_response({"status": "error", "message": str(e)}, 500)
 
 
 if __name__=="__main__":
@@ -5,8 +5,24 @@ package import time. `ingest.py` performs file I/O and DB writes when imported,
 which caused the application to run ingestion automatically when any
 `backend` submodule was imported. Keep `ingest` out of top-level imports and
 import it explicitly where needed.
+
+`indexer` pulls in scikit-learn and is only needed when (re)building the
+index, so it is imported on first attribute access instead of at startup.
+`db` is resolved the same way: it imports pymongo (~80 ms), which search
+and chat only need once they actually connect to MongoDB.
+`backend.ingest` is resolved the same way, so ingestion only runs when that
+attribute is explicitly accessed; it is deliberately left out of `__all__`.
 """
 
-from . import search, db, bot, indexer
+from . import search, bot
 
 __all__ = ["search", "db", "bot", "indexer"]
+
+_LAZY_SUBMODULES = ("db", "indexer", "ingest")
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        import importlib
+        return importlib.import_module(f"{__name__}.{name}")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
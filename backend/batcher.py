@@ -0,0 +1,137 @@
+# file: backend/batcher.py
+"""Micro-batching of concurrent retrieval and query-embedding calls.
+
+Flask serves each request on its own thread. Instead of every thread running
+its own TF-IDF mat-vec product (or embedding-model forward pass), callers hand
+their query to a single worker thread which waits up to `BATCH_MAX_WAIT_MS` for
+more queries, then handles the whole batch with one `retrieve_batch` (or one
+`model.encode`) call and hands each caller its result.
+"""
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from backend.search import retrieve_batch, encode_queries
+from config import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+
+
+class _MicroBatcher:
+    """Worker thread that collects up to `max_batch` items (or waits `max_wait` s) per batch."""
+
+    name = "micro-batcher"
+
+    def __init__(self, max_batch: int = BATCH_MAX_SIZE, max_wait: float = BATCH_MAX_WAIT_MS / 1000.0):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _submit(self, *item):
+        """Queue `item` and block until the worker sets its result."""
+        fut = Future()
+        self._ensure_worker()
+        self._queue.put((*item, fut))
+        return fut.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        """Handle one batch of queued items; each item ends with its Future."""
+        raise NotImplementedError
+
+
+class RetrievalBatcher(_MicroBatcher):
+    """Collects (query, k, mode) requests and answers them in batches."""
+
+    name = "retrieval-batcher"
+
+    def retrieve(self, query: str, k: int = 10, mode=None):
+        """Drop-in replacement for `backend.search.retrieve` (blocks until batched result is ready)."""
+        return self._submit(query, k, mode)
+
+    def _process(self, batch):
+        # Queries can only share a matmul when k and mode match
+        groups = defaultdict(list)
+        for item in batch:
+            groups[(item[1], item[2])].append(item)
+
+        for (k, mode), items in groups.items():
+            try:
+                results = retrieve_batch([q for q, _, _, _ in items], k=k, mode=mode)
+                for (_, _, _, fut), res in zip(items, results):
+                    fut.set_result(res)
+            except Exception as e:
+                for _, _, _, fut in items:
+                    fut.set_exception(e)
+
+
+class EmbeddingBatcher(_MicroBatcher):
+    """Collects query strings and embeds them with one `model.encode` call per batch."""
+
+    name = "embedding-batcher"
+
+    def embed(self, query: str):
+        """Normalized float32 embedding of `query` (blocks until its batch is encoded)."""
+        return self._submit(query)
+
+    def _process(self, batch):
+        try:
+            embs = encode_queries([q for q, _ in batch], batch_size=self.max_batch)
+            for (_, fut), emb in zip(batch, embs):
+                fut.set_result(emb)
+        except Exception as e:
+            for _, fut in batch:
+                fut.set_exception(e)
+
+
+# Global instance
+_batcher = None
+
+def get_batcher() -> RetrievalBatcher:
+    """Get or create the global retrieval batcher."""
+    global _batcher
+    if _batcher is None:
+        _batcher = RetrievalBatcher()
+    return _batcher
+
+
+def retrieve(query, k=10, mode=None):
+    """Batched equivalent of `backend.search.retrieve`."""
+    return get_batcher().retrieve(query, k=k, mode=mode)
+
+
+_embedding_batcher = None
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    """Get or create the global query-embedding batcher."""
+    global _embedding_batcher
+    if _embedding_batcher is None:
+        _embedding_batcher = EmbeddingBatcher()
+    return _embedding_batcher
+
+
+def embed_query(query: str):
+    """Batched, normalized query embedding (see `EmbeddingBatcher`)."""
+    return get_embedding_batcher().embed(query)
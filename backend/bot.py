@@ -12,16 +12,16 @@ Advanced retrieval-based chatbot with reasoning and scenario analysis.
 - NLG engine: generates natural-sounding responses with variations
 """
 from typing import List, Dict, Tuple, Optional
-from backend.search import retrieve
-from chatbot.learning_engine import get_learning_engine
-from chatbot.sentiment_analyzer import get_sentiment_analyzer
-from chatbot.conversation_manager import get_conversation_manager
-from chatbot.nlg_engine import get_nlg_engine
+from backend.batcher import retrieve
+from backend.semantic_cache import get_semantic_cache, get_fuzzy_cache
 import re
 import random
 from collections import defaultdict
 import json
 import os
+import functools
+import itertools
+import threading
 
 
 # Dynamic greeting system
@@ -39,6 +39,10 @@ NO_RESULT_TEMPLATES = [
     "Câu hỏi này có vẻ nằm ngoài phạm vi của tôi. Nhưng mình có thể giúp bạn với các câu hỏi khác liên quan đến luật đất đai.",
 ]
 
+# Template counts, so picking one is a single randrange + index
+_GREETING_N = len(GREETING_RESPONSES)
+_NO_RESULT_N = len(NO_RESULT_TEMPLATES)
+
 # Confidence-based response modifiers
 CONFIDENCE_PREFIXES = {
     'very_high': "Đây là thông tin từ pháp luật chính thức:",
@@ -54,43 +58,99 @@ CONFIDENCE_SUFFIXES = {
     'low': "⚠️ Bạn NÊN liên hệ với cơ quan pháp luật để được tư vấn chính xác. Thông tin này có độ tin cậy thấp.",
 }
 
+# Regexes used on every chat request, compiled once at import
+# One alternation: a single search instead of one search per scenario pattern
+_SCENARIO_RE = re.compile('|'.join((
+    r'\btôi (có|muốn|cần|sẽ|đang)\b',  # I am doing something
+    r'\bmình (có|muốn|cần|sẽ|đang)\b',  # We are doing something
+    r'\bnếu\b',  # if (conditional scenario)
+    r'\btrường hợp\b',  # case/scenario
+    r'\btình huống\b',  # situation
+    r'\bnên làm gì\b|\bphải làm gì\b|\bnên như thế nào\b',  # what should I do
+    r'\bcó được không\b|\bđược không\b|\bcó thể không\b',  # is it allowed
+)))
+_LA_GI_RE = re.compile(r'^[^?]*là gì\?$')
+
+_ACTIONS_RE = [(re.compile(p), t) for p, t in (
+    ('mua|sở hữu', 'mua'), ('bán|chuyển nhượng|chuyển', 'bán'),
+    ('cho thuê|cho sử dụng', 'cho_thuê'), ('xây dựng|xây|khai thác', 'xây_dựng'),
+    ('di chúc|thừa kế', 'thừa_kế'), ('cấp|cấp phép', 'xin_phép'),
+)]
+_OBJECTS_RE = [(re.compile(p), t) for p, t in (
+    (r'đất nông nghiệp', 'đất_nông_nghiệp'),
+    (r'đất phi nông nghiệp|thổ cư|ở', 'đất_cụ_thể'),
+    (r'đất\b', 'đất'),
+    (r'nhà\b|nhà ở|nhà cửa', 'nhà'),
+    (r'quyền sử dụng', 'quyền'),
+    (r'bất động sản', 'bất_động_sản'),
+)]
+_LOCATION_RE = re.compile(r'(thành phố|quận|huyện|tỉnh|thôn|xã|trong nước ngoài)')
+_BUSINESS_RE = re.compile(r'kinh doanh|lợi nhuận|thu nhập|doanh nghiệp')
+
+_PENALTY_RE = re.compile(r'(phạt tiền|mức phạt|lệ phí)[\s:]*(\d+[\.,]?\d*)\s*(triệu|nghìn|đồng|%|năm)')
+_TIME_RE = re.compile(r'(thời hạn|tối đa|tối thiểu)[\s:]*(\d+)\s*(năm|tháng|ngày|buổi)')
+_PERCENT_RE = re.compile(r'(\d+[\.,]?\d*)\s*%')
+_AREA_RE = re.compile(r'(diện tích|m²)[\s:]*(\d+[\.,]?\d*)')
+
+_SENT_SPLIT_RE = re.compile(r'[.!?]\s+')
+_SENT_END_RE = re.compile(r'[.!?]')
+_CLAUSE_SPLIT_RE = re.compile(r'[.!?;,-]\s+')
+_DEF_LINE_SPLIT_RE = re.compile(r'(?<=[.;])\s*')
+_ARTICLE_RE = re.compile(r'điều\s+(\d+)')
+_ARTICLE_INTENT_RE = re.compile(r"\bđi[eê]u\b|\bdieu\b")
+_DEF_SUFFIX_RE = re.compile(r'\s*(là gì|là|được hiểu là|có nghĩa là)\?*$')
+_LA_GI_SUFFIX_RE = re.compile(r'\s*(là gì|là)\?*$')
+_SECTION_ARTICLE_RE = re.compile(r"[Đd]i[eê]u\s*(\d+)")
+_DOC_ID_NUM_RE = re.compile(r"#(\d+)")
+
+# Keyword lists scanned per sentence (substring tests beat a regex alternation here)
+_IMPORTANT_KEYWORDS = ('quyền', 'nghĩa vụ', 'điều kiện', 'vi phạm', 'phạt')
+_PROCEDURE_VERBS = ('nộp', 'lập', 'xin', 'cấp', 'trình', 'hoàn thành', 'thực hiện', 'gửi', 'khai', 'đề nghị')
+_PENALTY_KEYWORDS = ('phạt', 'xử phạt', 'mức phạt', 'tiền phạt', 'hành chính')
+_TIME_KEYWORDS = ('thời hạn', 'năm', 'tháng', 'ngày', 'tối đa', 'tối thiểu')
+_DEF_EXCLUSIONS = ('khái niệm', 'định nghĩa', 'ý nghĩa', 'được hiểu là')
+
+
+def _keywords_re(words) -> re.Pattern:
+    """One alternation of plain substrings, longest first (same hits as `any(w in s for w in words)`)."""
+    return re.compile('|'.join(map(re.escape, sorted(words, key=len, reverse=True))))
+
+
+# detect_intent: (pattern, intent) in priority order
+_INTENT_PATTERNS = (
+    (_keywords_re(['xin chào', 'chào', 'hello', 'hi', 'halo', 'bay', 'hế lô']), 'greeting'),
+    (_ARTICLE_INTENT_RE, 'article'),
+    (_keywords_re(['là gì', 'định nghĩa', 'được hiểu', 'được gọi', 'có nghĩa', 'tức là', 'khái niệm', 'ý nghĩa']), 'definition'),
+    (_keywords_re(['bao lâu', 'thời hạn', 'khi nào', 'tối đa', 'tối thiểu', 'bao giờ', 'mấy năm', 'mấy tháng', 'mấy ngày']), 'time_limit'),
+    (_keywords_re(['thủ tục', 'hồ sơ', 'nộp', 'xin', 'cách thức', 'làm sao', 'cách nào', 'bước', 'quy trình', 'process']), 'procedure'),
+    (_keywords_re(['phạt', 'xử phạt', 'mức phạt', 'vi phạm', 'hình phạt', 'xử lý', 'hậu quả']), 'penalty'),
+    (_keywords_re(['ai', 'người', 'cơ quan', 'chủ thể', 'có quyền', 'phải', 'tổ chức', 'doanh nghiệp']), 'who'),
+)
+
 
 # ============ REASONING & SCENARIO ANALYSIS ENGINE ============
 
-def detect_scenario_query(query: str) -> bool:
+def detect_scenario_query(query: str, q_lower: Optional[str] = None) -> bool:
     """Detect if query is about a practical scenario (not generic law question).
     
     Returns True if query describes a personal situation or asks for practical advice,
-    False if it's a generic law question.
+    False if it's a generic law question. `q_lower` is `query.lower()`, if already computed.
     """
-    scenario_keywords = [
-        r'\btôi (có|muốn|cần|sẽ|đang)\b',  # I am doing something
-        r'\bmình (có|muốn|cần|sẽ|đang)\b',  # We are doing something
-        r'\bnếu\b',  # if (conditional scenario)
-        r'\btrường hợp\b',  # case/scenario
-        r'\btình huống\b',  # situation
-        r'\bnên làm gì\b|\bphải làm gì\b|\bnên như thế nào\b',  # what should I do
-        r'\bcó được không\b|\bđược không\b|\bcó thể không\b',  # is it allowed
-    ]
-    q_lower = query.lower()
-    
-    # Check if this is a scenario query
-    is_scenario = any(re.search(pattern, q_lower) for pattern in scenario_keywords)
-    
-    # But exclude generic "what is X" questions even if they match
-    if is_scenario:
-        # If it's purely asking "X là gì?" (what is X?), it's not a scenario
-        if re.match(r'^[^?]*là gì\?$', q_lower):
-            return False
-        # If asking about definition/concept, not scenario
-        if any(w in q_lower for w in ['khái niệm', 'định nghĩa', 'ý nghĩa', 'được hiểu là']):
-            return False
+    if q_lower is None:
+        q_lower = query.lower()
     
-    return is_scenario
+    # Exclusions are cheaper than the scenario patterns, so check them first:
+    # purely asking "X là gì?" (what is X?) or about a definition/concept is not a scenario
+    if _LA_GI_RE.match(q_lower):
+        return False
+    if any(w in q_lower for w in _DEF_EXCLUSIONS):
+        return False
+    
+    return _SCENARIO_RE.search(q_lower) is not None
 
 
-def extract_scenario_context(query: str) -> Dict:
-    """Extract key information from scenario query."""
+def extract_scenario_context(query: str, q_lower: Optional[str] = None) -> Dict:
+    """Extract key information from scenario query (`q_lower` is `query.lower()`, if already computed)."""
     context = {
         'query': query,
         'subject': None,  # người dùng thực hiện hành động
@@ -99,66 +159,102 @@ def extract_scenario_context(query: str) -> Dict:
         'conditions': [],  # điều kiện: có lợi nhuận, trong thành phố, etc.
     }
     
-    q_lower = query.lower()
+    if q_lower is None:
+        q_lower = query.lower()
     
     # Detect action type
-    actions = {
-        'mua|sở hữu': 'mua', 'bán|chuyển nhượng|chuyển': 'bán',
-        'cho thuê|cho sử dụng': 'cho_thuê', 'xây dựng|xây|khai thác': 'xây_dựng',
-        'di chúc|thừa kế': 'thừa_kế', 'cấp|cấp phép': 'xin_phép'
-    }
-    
-    for pattern, action_type in actions.items():
-        if re.search(pattern, q_lower):
+    for pattern, action_type in _ACTIONS_RE:
+        if pattern.search(q_lower):
             context['action'] = action_type
             break
     
     # Detect object type
-    objects = {
-        r'đất nông nghiệp': 'đất_nông_nghiệp',
-        r'đất phi nông nghiệp|thổ cư|ở': 'đất_cụ_thể',
-        r'đất\b': 'đất',
-        r'nhà\b|nhà ở|nhà cửa': 'nhà',
-        r'quyền sử dụng': 'quyền',
-        r'bất động sản': 'bất_động_sản'
-    }
-    
-    for pattern, obj_type in objects.items():
-        if re.search(pattern, q_lower):
+    for pattern, obj_type in _OBJECTS_RE:
+        if pattern.search(q_lower):
             context['object'] = obj_type
             break
     
     # Extract location or special conditions
-    locations = re.findall(r'(thành phố|quận|huyện|tỉnh|thôn|xã|trong nước ngoài)', q_lower)
+    locations = _LOCATION_RE.findall(q_lower)
     if locations:
         context['conditions'].append(f"Địa điểm: {locations[0]}")
     
     # Check for business/profit intent
-    if re.search(r'kinh doanh|lợi nhuận|thu nhập|doanh nghiệp', q_lower):
+    if _BUSINESS_RE.search(q_lower):
         context['conditions'].append('Mục đích kinh doanh')
         context['requires_permit'] = True  # <- Thêm flag bắt giấy phép kinh doanh
     
     return context
 
 
-def analyze_scenario(query: str, context: Dict, hits: List[Dict]) -> str:
-    """Analyze practical scenario based on law provisions and reasoning."""
+def _hit_text(h: Dict) -> str:
+    """Display text of a hit: `text`, or `noi_dung` with list items joined (dict items capped at 200 chars)."""
+    text = h.get('text') or h.get('noi_dung') or ''
+    
+    # Convert list items to strings
+    if isinstance(text, list):
+        text_parts = []
+        for item in text:
+            if isinstance(item, str):
+                text_parts.append(item)
+            elif isinstance(item, dict):
+                dict_text = item.get('noi_dung') or item.get('text') or item.get('content') or str(item)
+                text_parts.append(str(dict_text)[:200])  # Limit each dict to 200 chars
+            else:
+                text_parts.append(str(item)[:200])
+        return ' '.join(text_parts)
+    return text if isinstance(text, str) else str(text)
+
+
+def _hit_law_texts(h: Dict) -> List[str]:
+    """Article bodies of a hit's `noi_dung` (or `noi_dung` itself when it is not a list)."""
+    noi_dung = h.get('noi_dung', '')
+    if isinstance(noi_dung, list):
+        return [article.get('noi_dung', '') for article in noi_dung if isinstance(article, dict)]
+    return [noi_dung]
+
+
+class _FlatHits:
+    """Flattened views of `hits` for one compose_answer call, each built on first use.
+
+    - texts: display text per hit (see `_hit_text`)
+    - law_texts: article bodies of all hits, in order (scenario analysis)
+    - raw_texts: `str(noi_dung)` per hit (number extraction)
+
+    Scenario answers only need the last two and other intents only the first,
+    so nothing is flattened (or repr'd) that the chosen branch does not read.
+    """
+
+    def __init__(self, hits: List[Dict]):
+        self.hits = hits
+
+    @functools.cached_property
+    def texts(self) -> List[str]:
+        return [_hit_text(h) for h in self.hits]
+
+    @functools.cached_property
+    def law_texts(self) -> List[str]:
+        return [t for h in self.hits for t in _hit_law_texts(h)]
+
+    @functools.cached_property
+    def raw_texts(self) -> List[str]:
+        return [str(h.get('noi_dung', '')) for h in self.hits]
+
+
+def analyze_scenario(query: str, context: Dict, hits: List[Dict], law_texts: Optional[List[str]] = None,
+                     q_lower: Optional[str] = None) -> str:
+    """Analyze practical scenario based on law provisions and reasoning.
+
+    `law_texts` is the precomputed `_FlatHits(hits).law_texts` and `q_lower` is
+    `query.lower()`, if available.
+    """
     if not hits:
         return ""
     
     # Combine all relevant law text
-    all_texts = []
-    for h in hits:
-        noi_dung = h.get('noi_dung', '')
-        if isinstance(noi_dung, list):
-            for article in noi_dung:
-                if isinstance(article, dict):
-                    text = article.get('noi_dung', '')
-                    all_texts.append(text)
-        else:
-            all_texts.append(noi_dung)
-    
-    combined_text = ' '.join(all_texts)
+    if law_texts is None:
+        law_texts = [t for h in hits for t in _hit_law_texts(h)]
+    combined_text = ' '.join(law_texts)
     
     # Build reasoning response
     reasoning_parts = []
@@ -170,7 +266,7 @@ def analyze_scenario(query: str, context: Dict, hits: List[Dict]) -> str:
     
     if action == 'mua' or action == 'sở hữu':
         reasoning_parts.append("**Về việc mua/sở hữu:**")
-        if obj in ('đất_nông_nghiệp', 'đất_cụ_thể') or 'nông nghiệp' in query.lower():
+        if obj in ('đất_nông_nghiệp', 'đất_cụ_thể') or 'nông nghiệp' in (q_lower if q_lower is not None else query.lower()):
             if 'nước ngoài' in combined_text or 'không được' in combined_text:
                 reasoning_parts.append("- ⚠️ **Hạn chế**: Người nước ngoài không được sở hữu đất nông nghiệp tại Việt Nam")
             if 'diện tích' in combined_text:
@@ -219,44 +315,47 @@ def extract_numbers_from_text(text: str) -> Dict:
         'areas': [],  # diện tích
     }
     
+    # Lowercase once; each pattern only runs if its literal keyword occurs at all
+    text_lower = text.lower()
+    
     # Extract penalties
-    penalty_pattern = r'(phạt tiền|mức phạt|lệ phí)[\s:]*(\d+[\.,]?\d*)\s*(triệu|nghìn|đồng|%|năm)'
-    penalties = re.findall(penalty_pattern, text.lower())
-    if penalties:
-        numbers_info['penalties'] = [f"{p[1]} {p[2]}" for p in penalties]
+    if 'phạt tiền' in text_lower or 'mức phạt' in text_lower or 'lệ phí' in text_lower:
+        penalties = _PENALTY_RE.findall(text_lower)
+        if penalties:
+            numbers_info['penalties'] = [f"{p[1]} {p[2]}" for p in penalties]
     
     # Extract time limits
-    time_pattern = r'(thời hạn|tối đa|tối thiểu)[\s:]*(\d+)\s*(năm|tháng|ngày|buổi)'
-    times = re.findall(time_pattern, text.lower())
-    if times:
-        numbers_info['time_limits'] = [f"{t[1]} {t[2]}" for t in times]
+    if 'thời hạn' in text_lower or 'tối đa' in text_lower or 'tối thiểu' in text_lower:
+        times = _TIME_RE.findall(text_lower)
+        if times:
+            numbers_info['time_limits'] = [f"{t[1]} {t[2]}" for t in times]
     
     # Extract percentages
-    percent_pattern = r'(\d+[\.,]?\d*)\s*%'
-    percentages = re.findall(percent_pattern, text)
-    if percentages:
-        numbers_info['percentages'] = percentages
+    if '%' in text:
+        percentages = _PERCENT_RE.findall(text)
+        if percentages:
+            numbers_info['percentages'] = percentages
     
     # Extract area/land measurements
-    area_pattern = r'(diện tích|m²)[\s:]*(\d+[\.,]?\d*)'
-    areas = re.findall(area_pattern, text.lower())
-    if areas:
-        numbers_info['areas'] = [a[1] for a in areas]
+    if 'diện tích' in text_lower or 'm²' in text_lower:
+        areas = _AREA_RE.findall(text_lower)
+        if areas:
+            numbers_info['areas'] = [a[1] for a in areas]
     
     return numbers_info
 
 
+_COMPARISON_HEADER = "### 🔍 So sánh và đối chiếu:\n\n**Theo các quy định khác nhau:**"
+
+
 def generate_comparison_analysis(query: str, hits: List[Dict]) -> str:
     """Generate comparison and differentiation analysis for complex scenarios."""
     if len(hits) < 2:
         return ""
     
-    comparison_parts = []
-    comparison_parts.append("### 🔍 So sánh và đối chiếu:\n")
+    comparison_parts = [_COMPARISON_HEADER]
     
     # Extract key info from multiple sources
-    comparison_parts.append("**Theo các quy định khác nhau:**")
-    
     for idx, hit in enumerate(hits[:3], 1):
         title = hit.get('title') or f"Quy định {idx}"
         noi_dung = hit.get('noi_dung', '')
@@ -275,73 +374,79 @@ def generate_comparison_analysis(query: str, hits: List[Dict]) -> str:
     return "\n".join(comparison_parts)
 
 
+# Recommended steps per scenario action
+_ADVICE_STEPS = {
+    'mua': (
+        "✓ Đảm bảo bạn hiểu rõ loại đất và quyền sử dụng",
+        "✓ Kiểm tra đầy đủ hồ sơ pháp lý và giấy tờ liên quan",
+        "✓ Tư vấn với cơ quan đất đai địa phương trước khi quyết định",
+        "✓ Lập hợp đồng mua bán rõ ràng, có chứng thực",
+    ),
+    'bán': (
+        "✓ Chuẩn bị đầy đủ giấy chứng nhận quyền sử dụng",
+        "✓ Thực hiện đúng thủ tục công khai/hạn chế (nếu có)",
+        "✓ Lập hợp đồng bán rõ ràng, có giác thương",
+        "✓ Hoàn thành thủ tục chuyển quyền tại cơ quan",
+    ),
+    'xây_dựng': (
+        "✓ Xin cấp giấy phép xây dựng từ chính quyền địa phương",
+        "✓ Tuân thủ quy hoạch chung của khu vực",
+        "✓ Chuẩn bị bản vẽ kiến trúc phù hợp",
+        "✓ Kiểm tra các quy định về mật độ xây dựng",
+    ),
+    'cho_thuê': (
+        "✓ Lập hợp đồng cho thuê có xác thực",
+        "✓ Thỏa thuận rõ tiền thuê, thời hạn, bảo hành",
+        "✓ Ghi rõ các quyền và nghĩa vụ của hai bên",
+        "✓ Kiểm tra pháp lý trước khi ký kết",
+    ),
+    None: (
+        "✓ Tìm hiểu kỹ các quy định liên quan",
+        "✓ Tư vấn chuyên gia pháp lý khi cần",
+        "✓ Chuẩn bị hồ sơ đầy đủ và rõ ràng",
+        "✓ Tuân thủ quy trình hành chính",
+    ),
+}
+_ADVICE_STEPS['sở hữu'] = _ADVICE_STEPS['mua']
+
+# The advice text is static per action, so it is assembled once at import
+_ADVICE_TEXT = {
+    action: "### 💡 Lời khuyên thực tế:\n\n**Các bước đề xuất:**\n" + "\n".join(steps)
+    for action, steps in _ADVICE_STEPS.items()
+}
+_ADVICE_BUSINESS_NOTE = (
+    "\n\n⚠️ **Lưu ý quan trọng:**"
+    "\n- Nếu mục đích kinh doanh/có lợi nhuận, có thể áp dụng thêm quy định khác"
+    "\n- Hãy xác nhận với cơ quan thuế và quản lý kinh doanh địa phương"
+)
+
+
 def generate_practical_advice(query: str, context: Dict, scenario_hits: List[Dict]) -> str:
     """Generate practical advice and recommendations for real-world scenarios."""
-    advice_parts = []
-    advice_parts.append("### 💡 Lời khuyên thực tế:\n")
-    
-    action = context.get('action')
-    conditions = context.get('conditions')
-    
-    # General recommendations
-    recommendations = []
-    
-    if action in ('mua', 'sở hữu'):
-        recommendations = [
-            "✓ Đảm bảo bạn hiểu rõ loại đất và quyền sử dụng",
-            "✓ Kiểm tra đầy đủ hồ sơ pháp lý và giấy tờ liên quan",
-            "✓ Tư vấn với cơ quan đất đai địa phương trước khi quyết định",
-            "✓ Lập hợp đồng mua bán rõ ràng, có chứng thực",
-        ]
-    elif action == 'bán':
-        recommendations = [
-            "✓ Chuẩn bị đầy đủ giấy chứng nhận quyền sử dụng",
-            "✓ Thực hiện đúng thủ tục công khai/hạn chế (nếu có)",
-            "✓ Lập hợp đồng bán rõ ràng, có giác thương",
-            "✓ Hoàn thành thủ tục chuyển quyền tại cơ quan",
-        ]
-    elif action == 'xây_dựng':
-        recommendations = [
-            "✓ Xin cấp giấy phép xây dựng từ chính quyền địa phương",
-            "✓ Tuân thủ quy hoạch chung của khu vực",
-            "✓ Chuẩn bị bản vẽ kiến trúc phù hợp",
-            "✓ Kiểm tra các quy định về mật độ xây dựng",
-        ]
-    elif action == 'cho_thuê':
-        recommendations = [
-            "✓ Lập hợp đồng cho thuê có xác thực",
-            "✓ Thỏa thuận rõ tiền thuê, thời hạn, bảo hành",
-            "✓ Ghi rõ các quyền và nghĩa vụ của hai bên",
-            "✓ Kiểm tra pháp lý trước khi ký kết",
-        ]
-    else:
-        recommendations = [
-            "✓ Tìm hiểu kỹ các quy định liên quan",
-            "✓ Tư vấn chuyên gia pháp lý khi cần",
-            "✓ Chuẩn bị hồ sơ đầy đủ và rõ ràng",
-            "✓ Tuân thủ quy trình hành chính",
-        ]
-    
-    advice_parts.append("**Các bước đề xuất:**")
-    for rec in recommendations:
-        advice_parts.append(rec)
+    advice = _ADVICE_TEXT.get(context.get('action'), _ADVICE_TEXT[None])
     
     # Add warning if applicable
     if context.get('requires_business_permit'):
-        advice_parts.append("\n⚠️ **Lưu ý quan trọng:**")
-        advice_parts.append("- Nếu mục đích kinh doanh/có lợi nhuận, có thể áp dụng thêm quy định khác")
-        advice_parts.append("- Hãy xác nhận với cơ quan thuế và quản lý kinh doanh địa phương")
+        advice += _ADVICE_BUSINESS_NOTE
     
-    return "\n".join(advice_parts)
+    return advice
+
+
+# Common Vietnamese stop words dropped from key phrases
+_STOP_WORDS = frozenset({'các', 'và', 'hay', 'hay là', 'có', 'là', 'được', 'để', 'trong', 'ở', 'về', 'từ', 'với', 'như', 'cái'})
 
 
 def extract_key_phrases(text: str) -> List[str]:
     """Extract key phrases from query for better context understanding."""
-    # Remove common Vietnamese stop words
-    stop_words = {'các', 'và', 'hay', 'hay là', 'có', 'là', 'được', 'để', 'trong', 'ở', 'về', 'từ', 'với', 'như', 'cái'}
-    words = text.lower().split()
-    phrases = [w for w in words if w not in stop_words and len(w) > 2]
-    return phrases[:5]  # Return top 5 key phrases
+    # Words longer than 2 chars come from the memoised split shared with verify_answer_relevance
+    phrases = (w for w in _key_terms(text, 2) if w not in _STOP_WORDS)
+    return list(itertools.islice(phrases, 5))  # Return top 5 key phrases
+
+
+@functools.lru_cache(maxsize=4096)
+def _key_terms(text: str, min_len: int) -> Tuple[str, ...]:
+    """Lowercased words of `text` longer than `min_len` (memoised: the same query/title is checked per sentence)."""
+    return tuple(w for w in text.lower().split() if len(w) > min_len)
 
 
 def verify_answer_relevance(query: str, answer: str, hits: List[Dict]) -> bool:
@@ -349,121 +454,153 @@ def verify_answer_relevance(query: str, answer: str, hits: List[Dict]) -> bool:
     
     Returns False if answer seems unrelated (e.g., doesn't contain key terms from hits).
     """
-    query_lower = query.lower()
     answer_lower = answer.lower()
     
+    # Check if first hit's title/section appears in answer (as source verification)
+    if hits:
+        first_hit_info = hits[0].get('title', '') + ' ' + hits[0].get('section', '')
+        # If hit info has substantial overlap with answer, it's likely relevant
+        if any(word in answer_lower for word in _key_terms(first_hit_info, 4)):
+            return True
+    
     # Extract key terms from query
-    query_terms = [w for w in query_lower.split() if len(w) > 3]
+    query_terms = _key_terms(query, 3)
     
-    # Check if at least some key terms appear in answer
+    # Check if at least some key terms appear in answer. Substring tests on purpose:
+    # they also match "đất," / "đất." and beat building a token set of a long answer.
     matching_terms = sum(1 for term in query_terms if term in answer_lower)
     
     # If less than 30% of key terms are in answer, it might be irrelevant
     relevance_ratio = matching_terms / max(1, len(query_terms))
     
-    # Also check if first hit's title/section appears in answer (as source verification)
-    if hits:
-        first_hit_info = (hits[0].get('title', '') + ' ' + hits[0].get('section', '')).lower()
-        # If hit info has substantial overlap with answer, it's likely relevant
-        if any(word in answer_lower for word in first_hit_info.split() if len(word) > 4):
-            return True
-    
     return relevance_ratio > 0.25  # At least 25% of query terms should match
 
 
+def _iter_sentences(text: str, splitter=_SENT_SPLIT_RE):
+    """Yield the pieces of `splitter.split(text)` one at a time, so callers can stop early."""
+    last = 0
+    for m in splitter.finditer(text):
+        yield text[last:m.start()]
+        last = m.end()
+    yield text[last:]
+
+
 def summarize_snippet(text: str, max_length: int = 500) -> str:
     """Intelligently summarize a snippet by keeping key sentences."""
-    sentences = re.split(r'[.!?]\s+', text)
     result = []
     current_length = 0
     
-    for sent in sentences:
+    for sent in _iter_sentences(text):
         sent = sent.strip()
         if not sent:
             continue
-        # Prioritize sentences with important keywords
-        importance_score = sum(1 for kw in ['quyền', 'nghĩa vụ', 'điều kiện', 'vi phạm', 'phạt'] if kw in sent.lower())
-        
         if current_length + len(sent) <= max_length:
             result.append(sent)
             current_length += len(sent) + 1
-        elif importance_score > 0 and current_length < max_length:
-            result.append(sent)
-            current_length += len(sent) + 1
-            break
+        elif current_length < max_length:
+            # Prioritize sentences with important keywords (only lowercased when it decides)
+            sent_lower = sent.lower()
+            if any(kw in sent_lower for kw in _IMPORTANT_KEYWORDS):
+                result.append(sent)
+                break
+        else:
+            break  # budget used up: no later sentence can be added
     
     return '. '.join(result) + '.' if result else text[:max_length]
 
 
+# Article 3 (definitions) lines from tinydb.json, reloaded only when the file changes
+_ARTICLE_3_CACHE = None  # (mtime, [(line, line_lower), ...])
+_ARTICLE_3_LOCK = threading.Lock()
+
+
+def _load_article_3_lines() -> Tuple[float, List[Tuple[str, str]]]:
+    """Return (mtime, definition lines of Điều 3) from tinydb.json, cached on mtime."""
+    global _ARTICLE_3_CACHE
+    from config import TINYDB_PATH, DATA_DIR
+    tiny_path = TINYDB_PATH or os.path.join(DATA_DIR, 'tinydb.json')
+    mtime = os.path.getmtime(tiny_path)
+    cached = _ARTICLE_3_CACHE
+    if cached is not None and cached[0] == mtime:
+        return cached
+
+    with _ARTICLE_3_LOCK:
+        if _ARTICLE_3_CACHE is not None and _ARTICLE_3_CACHE[0] == mtime:
+            return _ARTICLE_3_CACHE
+        from tinydb import TinyDB
+        from backend.tinydb_storage import UTF8Storage
+
+        db = TinyDB(tiny_path, storage=UTF8Storage)
+        try:
+            # Find Article 3 (Điều 3)
+            article_3 = next((a for a in db.all() if 'Điều 3' in a.get('section', '')), None)
+        finally:
+            db.close()
+
+        lines = []
+        if article_3:
+            # Get the definitions content
+            noi_dung = article_3.get('noi_dung', '')
+            if isinstance(noi_dung, list):
+                noi_dung = ' '.join(str(item) for item in noi_dung)
+            # Definitions in Article 3 are typically numbered: "1. term là ...", "2. term là ..."
+            lines = [(line, line.lower()) for line in _DEF_LINE_SPLIT_RE.split(noi_dung)]
+        _ARTICLE_3_CACHE = (mtime, lines)
+        return _ARTICLE_3_CACHE
+
+
+@functools.lru_cache(maxsize=1024)
+def _find_definition(query_term_lower: str, mtime: float) -> Tuple[bool, str]:
+    """Look up a cleaned term in the cached Article 3 lines (`mtime` keys the cache)."""
+    _, lines = _load_article_3_lines()
+    if not lines:
+        return False, ""
+
+    # Search for definition pattern: "term là ..." or "term:"
+    term = re.escape(query_term_lower)
+    marker_re = re.compile(rf'\b{term}\s*(là|:|\s*-)')
+    extract_re = re.compile(rf'({term}\s*(?:là|:|-)?[^.;]*[.;]?)', re.IGNORECASE)
+
+    for line, line_lower in lines:
+        # Look for pattern where term appears followed by "là" (means)
+        if query_term_lower in line_lower:
+            # Check if this line contains a definition marker
+            if marker_re.search(line_lower):
+                # Extract the definition
+                match = extract_re.search(line)
+                if match:
+                    return True, match.group(1).strip()
+
+    return False, ""
+
+
 def check_definition_exists_in_db(query_term: str) -> Tuple[bool, str]:
     """Check if a definition for the query term actually exists in Article 3 of tinydb.json.
     
     Returns (exists: bool, definition: str)
     """
     try:
-        from tinydb import TinyDB
-        from tinydb.storages import JSONStorage
-        from config import TINYDB_PATH, DATA_DIR
-
-        class UTF8Storage(JSONStorage):
-            def __init__(self, path, **kwargs):
-                kwargs['encoding'] = 'utf-8'
-                super().__init__(path, **kwargs)
-
-        tiny_path = TINYDB_PATH or os.path.join(DATA_DIR, 'tinydb.json')
-        db = TinyDB(tiny_path, storage=UTF8Storage)
-        
-        # Find Article 3 (Điều 3)
-        articles = db.all()
-        article_3 = None
-        for article in articles:
-            section = article.get('section', '')
-            if 'Điều 3' in section:
-                article_3 = article
-                break
-        
-        if not article_3:
-            return False, ""
-        
-        # Get the definitions content
-        noi_dung = article_3.get('noi_dung', '')
-        if isinstance(noi_dung, list):
-            noi_dung = ' '.join(str(item) for item in noi_dung)
-        
-        # Clean query term
-        query_term_lower = query_term.lower().strip()
-        # Remove "là gì?" suffix if present
-        query_term_lower = re.sub(r'\s*(là gì|là|được hiểu là|có nghĩa là)\?*$', '', query_term_lower)
-        
-        # Search for definition pattern: "term là ..." or "term:"
-        # Definitions in Article 3 are typically numbered: "1. term là ...", "2. term là ..."
-        
-        # Split by periods to find definition lines
-        definition_lines = re.split(r'(?<=[.;])\s*', noi_dung)
-        
-        for line in definition_lines:
-            line_lower = line.lower()
-            # Look for pattern where term appears followed by "là" (means)
-            if query_term_lower in line_lower:
-                # Check if this line contains a definition marker
-                if re.search(rf'\b{re.escape(query_term_lower)}\s*(là|:|\s*-)', line_lower):
-                    # Extract the definition
-                    match = re.search(rf'({re.escape(query_term_lower)}\s*(?:là|:|-)?[^.;]*[.;]?)', line, re.IGNORECASE)
-                    if match:
-                        definition = match.group(1).strip()
-                        return True, definition
-        
-        return False, ""
+        mtime, _ = _load_article_3_lines()
+        # Clean query term, removing "là gì?" suffix if present
+        query_term_lower = _DEF_SUFFIX_RE.sub('', query_term.lower().strip())
+        return _find_definition(query_term_lower, mtime)
     
     except Exception as e:
         print(f"Error checking definition: {e}")
         return False, ""
 
 
-def calculate_confidence(scores: List[float], query: str, hits: List[Dict]) -> Tuple[str, float]:
+# Confidence buckets: avg_score >= 0.85 very_high, >= 0.65 high, >= 0.45 medium, else low
+_CONF_THRESHOLDS = (0.85, 0.65, 0.45)
+_CONF_LEVELS = ('very_high', 'high', 'medium', 'low')
+# Score reported when composition changes the level
+_CONF_LEVEL_SCORES = {'very_high': 0.95, 'high': 0.75, 'medium': 0.55, 'low': 0.35}
+
+
+def calculate_confidence(scores: List[float], query: str, hits: List[Dict], q_lower: Optional[str] = None) -> Tuple[str, float]:
     """Calculate confidence level based on retrieval scores and query-result alignment.
     
-    More conservative scoring to avoid false confidence.
+    More conservative scoring to avoid false confidence. `q_lower` is `query.lower()`, if already computed.
     """
     if not scores:
         return 'low', 0.0
@@ -471,7 +608,7 @@ def calculate_confidence(scores: List[float], query: str, hits: List[Dict]) -> T
     avg_score = sum(scores[:3]) / max(1, len(scores[:3]))
     
     # Check for exact matches (Điều X)
-    article_match = re.search(r'điều\s+(\d+)', query.lower())
+    article_match = _ARTICLE_RE.search(q_lower if q_lower is not None else query.lower())
     if article_match:
         for h in hits:
             section = (h.get('section') or '') + ' ' + (h.get('title') or '')
@@ -480,306 +617,352 @@ def calculate_confidence(scores: List[float], query: str, hits: List[Dict]) -> T
     
     # More conservative thresholds to avoid false confidence
     # Only 'very_high' for very strong matches (0.85+)
-    if avg_score >= 0.85:
-        return 'very_high', avg_score
-    elif avg_score >= 0.65:
-        return 'high', avg_score
-    elif avg_score >= 0.45:
-        return 'medium', avg_score
-    else:
-        return 'low', avg_score
+    return _CONF_LEVELS[sum(avg_score < t for t in _CONF_THRESHOLDS)], avg_score
 
 
-def compose_answer(intent: str, hits: List[Dict], query: str, confidence_level: str, is_scenario: bool = False, scenario_context: Optional[Dict] = None) -> Tuple[str, str]:
-    """Dynamically compose answer based on intent and hits (AI-like generation).
-    
-    For scenarios: includes reasoning, comparison, and practical advice.
-    
-    Returns: (answer: str, updated_confidence_level: str)
-    """
-    if not hits:
-        return random.choice(NO_RESULT_TEMPLATES), confidence_level
-    
-    scores = [h.get('score', 0) for h in hits]
+# Concise official definitions for well-known legal terms
+_KNOWN_DEFINITIONS = {
+    'quyền sử dụng đất': 'Quyền sử dụng đất là quyền của người được Nhà nước giao đất, cho thuê đất, công nhận quyền sử dụng đất để khai thác, sử dụng đất theo quy định của Luật.',
+    'đất đai': 'Đất đai là toàn bộ lãnh thổ đất liền lạc và đảo của Việt Nam, bao gồm mặt đất, lòng đất, tài nguyên trên bề mặt đất.',
+    'người sử dụng đất': 'Người sử dụng đất là người được Nhà nước giao đất, cho thuê đất, công nhận quyền sử dụng đất hoặc nhận chuyển quyền sử dụng đất theo quy định của Luật.',
+}
+
+
+def _compose_scenario(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str,
+                      scenario_context: Dict) -> Tuple[str, str]:
+    """Scenario answer: analysis, numbers, comparison and practical advice."""
     updated_confidence_level = confidence_level
-    
-    # Build context-aware intro
-    intro = CONFIDENCE_PREFIXES.get(confidence_level, "Mình tìm được thông tin sau:")
-    
-    # If this is a scenario query, build comprehensive response
-    if is_scenario and scenario_context:
-        response_parts = []
-        response_parts.append(intro)
+    response_parts = []
+    response_parts.append(intro)
+    response_parts.append("")
+
+    # Add scenario analysis
+    scenario_analysis = analyze_scenario(query, scenario_context, hits, flat.law_texts, q_lower)
+    if scenario_analysis:
+        response_parts.append(scenario_analysis)
         response_parts.append("")
-        
-        # Add scenario analysis
-        scenario_analysis = analyze_scenario(query, scenario_context, hits)
-        if scenario_analysis:
-            response_parts.append(scenario_analysis)
-            response_parts.append("")
-        
-        # Add numerical/regulatory info
-        numbers_info = {}
+
+    # Add numerical/regulatory info
+    numbers_info = {}
+    for text_to_search in flat.raw_texts:
+        extracted = extract_numbers_from_text(text_to_search)
+        for key in extracted:
+            if extracted[key]:
+                numbers_info[key] = extracted[key]
+
+    if numbers_info:
+        response_parts.append("### 📊 Thông tin số liệu:")
+        if numbers_info.get('penalties'):
+            response_parts.append(f"- Mức phạt: {', '.join(numbers_info['penalties'])}")
+        if numbers_info.get('time_limits'):
+            response_parts.append(f"- Thời hạn: {', '.join(numbers_info['time_limits'])}")
+        if numbers_info.get('percentages'):
+            response_parts.append(f"- Tỷ lệ: {', '.join(numbers_info['percentages'])}%")
+        response_parts.append("")
+
+    # Add comparison
+    comparison = generate_comparison_analysis(query, hits)
+    if comparison:
+        response_parts.append(comparison)
+        response_parts.append("")
+
+    # Add practical advice
+    advice = generate_practical_advice(query, scenario_context, hits)
+    if advice:
+        response_parts.append(advice)
+        response_parts.append("")
+
+    response_parts.append(CONFIDENCE_SUFFIXES.get(confidence_level, ""))
+    return "\n".join(response_parts), updated_confidence_level
+
+
+def _compose_article(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str) -> Tuple[str, str]:
+    """Article intent - direct quote with context."""
+    updated_confidence_level = confidence_level
+    article_match = _ARTICLE_RE.search(q_lower)
+    if article_match:
+        article_num = article_match.group(1)
         for h in hits:
             noi_dung = h.get('noi_dung', '')
-            text_to_search = str(noi_dung)
-            extracted = extract_numbers_from_text(text_to_search)
-            for key in extracted:
-                if extracted[key]:
-                    numbers_info[key] = extracted[key]
-        
-        if numbers_info:
-            response_parts.append("### 📊 Thông tin số liệu:")
-            if numbers_info.get('penalties'):
-                response_parts.append(f"- Mức phạt: {', '.join(numbers_info['penalties'])}")
-            if numbers_info.get('time_limits'):
-                response_parts.append(f"- Thời hạn: {', '.join(numbers_info['time_limits'])}")
-            if numbers_info.get('percentages'):
-                response_parts.append(f"- Tỷ lệ: {', '.join(numbers_info['percentages'])}%")
-            response_parts.append("")
-        
-        # Add comparison
-        comparison = generate_comparison_analysis(query, hits)
-        if comparison:
-            response_parts.append(comparison)
-            response_parts.append("")
-        
-        # Add practical advice
-        advice = generate_practical_advice(query, scenario_context, hits)
-        if advice:
-            response_parts.append(advice)
-            response_parts.append("")
-        
-        response_parts.append(CONFIDENCE_SUFFIXES.get(confidence_level, ""))
-        return "\n".join(response_parts), updated_confidence_level
-    
-    # Original logic for non-scenario queries
-    
-    scores = [h.get('score', 0) for h in hits]
-    
-    # Build context-aware intro
-    intro = CONFIDENCE_PREFIXES.get(confidence_level, "Mình tìm được thông tin sau:")
-    
-    # Helper: safely extract text (generic, for non-article intents)
-    def get_text(h):
-        """Extract text from hit"""
-        text = h.get('text') or h.get('noi_dung') or ''
-        
-        # Convert list items to strings
-        if isinstance(text, list):
-            text_parts = []
-            for item in text:
-                if isinstance(item, str):
-                    text_parts.append(item)
-                elif isinstance(item, dict):
-                    dict_text = item.get('noi_dung') or item.get('text') or item.get('content') or str(item)
-                    text_parts.append(str(dict_text)[:200])  # Limit each dict to 200 chars
-                else:
-                    text_parts.append(str(item)[:200])
-            text = ' '.join(text_parts)
-        return str(text)
-    
-    # For article intent - direct quote with context
-    if intent == 'article':
-        article_match = re.search(r'điều\s+(\d+)', query.lower())
-        if article_match:
-            article_num = article_match.group(1)
-            for h in hits:
-                noi_dung = h.get('noi_dung', '')
-                # If noi_dung is a list of article dicts, find the matching one
-                if isinstance(noi_dung, list):
-                    for article in noi_dung:
-                        if isinstance(article, dict) and str(article.get('dieu_so', '')) == str(article_num):
-                            text = article.get('noi_dung', '')
-                            if text:
-                                return f"{intro}\n\n**Điều {article_num}:**\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
-        
-        # Fallback: use top hit, but take first article only
-        top_hit = hits[0]
-        noi_dung = top_hit.get('noi_dung', '')
-        if isinstance(noi_dung, list) and noi_dung:
-            text = noi_dung[0].get('noi_dung', str(noi_dung[0])) if isinstance(noi_dung[0], dict) else str(noi_dung[0])
-        else:
-            text = str(noi_dung or '')
-        return f"{intro}\n\n{text[:1000]}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
-    
-    # For definition intent - extract and explain  
-    if intent == 'definition':
-        # Extract the term from query (remove "là gì?" suffix)
-        query_term = re.sub(r'\s*(là gì|là)\?*$', '', query.lower()).strip()
-        
-        # For well-known legal terms, provide concise official definition
-        known_definitions = {
-            'quyền sử dụng đất': 'Quyền sử dụng đất là quyền của người được Nhà nước giao đất, cho thuê đất, công nhận quyền sử dụng đất để khai thác, sử dụng đất theo quy định của Luật.',
-            'đất đai': 'Đất đai là toàn bộ lãnh thổ đất liền lạc và đảo của Việt Nam, bao gồm mặt đất, lòng đất, tài nguyên trên bề mặt đất.',
-            'người sử dụng đất': 'Người sử dụng đất là người được Nhà nước giao đất, cho thuê đất, công nhận quyền sử dụng đất hoặc nhận chuyển quyền sử dụng đất theo quy định của Luật.',
-        }
-        
-        # Check if we have a known definition
-        if query_term in known_definitions:
-            definition = known_definitions[query_term]
-            # Use high confidence for known definitions
-            return f"Dựa trên các tài liệu pháp luật:\n\n{definition}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
-        
-        # Otherwise, look for definition in hits
-        found_def = False
-        for h in hits:
-            text = get_text(h)
-            sentences = re.split(r'[.!?]\s+', text)
-            
-            for sent in sentences[:15]:
-                sent = sent.strip()
-                if not sent or len(sent) < 20:
-                    continue
-                    
-                sent_lower = sent.lower()
-                # Look for definition pattern: "query_term là ..."
-                definition_pattern = re.escape(query_term) + r'\s+là'
-                if re.search(definition_pattern, sent_lower):
-                    if verify_answer_relevance(query, sent, hits):
-                        # Extract just the definition sentence
-                        found_def = True
-                        return f"Dựa trên các tài liệu pháp luật:\n\n{sent.strip()}.\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
-        
-        # If no definition found, provide related info with medium confidence
-        if not found_def:
-            updated_confidence_level = 'medium'
-            top_hit = hits[0]
-            text = get_text(top_hit)
-            # Only take first 1-2 sentences for conciseness
-            first_sentences = re.split(r'[.!?]', text)[:2]
-            text = '. '.join([s.strip() for s in first_sentences if s.strip()]) + '.'
-            return f"Thông tin liên quan:\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(updated_confidence_level, '')}", updated_confidence_level
-        
-        return f"{intro}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
-    
-    # For procedure intent - list steps clearly
-    if intent == 'procedure':
-        steps = []
-        for h in hits:
-            text = get_text(h)
-            sentences = re.split(r'[.!?;,-]\s+', text)
-            
-            for sent in sentences:
-                sent = sent.strip()
-                if sent and any(verb in sent.lower() for verb in ['nộp', 'lập', 'xin', 'cấp', 'trình', 'hoàn thành', 'thực hiện', 'gửi', 'khai', 'đề nghị']):
-                    steps.append(sent)
-                if len(steps) >= 4:
-                    break
-            if steps:
+            # If noi_dung is a list of article dicts, find the matching one
+            if isinstance(noi_dung, list):
+                for article in noi_dung:
+                    if isinstance(article, dict) and str(article.get('dieu_so', '')) == str(article_num):
+                        text = article.get('noi_dung', '')
+                        if text:
+                            return f"{intro}\n\n**Điều {article_num}:**\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
+
+    # Fallback: use top hit, but take first article only
+    top_hit = hits[0]
+    noi_dung = top_hit.get('noi_dung', '')
+    if isinstance(noi_dung, list) and noi_dung:
+        text = noi_dung[0].get('noi_dung', str(noi_dung[0])) if isinstance(noi_dung[0], dict) else str(noi_dung[0])
+    else:
+        text = str(noi_dung or '')
+    return f"{intro}\n\n{text[:1000]}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
+
+
+def _compose_definition(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str) -> Tuple[str, str]:
+    """Definition intent - extract and explain."""
+    updated_confidence_level = confidence_level
+    # Extract the term from query (remove "là gì?" suffix)
+    query_term = _LA_GI_SUFFIX_RE.sub('', q_lower).strip()
+
+    # Check if we have a known definition
+    if query_term in _KNOWN_DEFINITIONS:
+        definition = _KNOWN_DEFINITIONS[query_term]
+        # Use high confidence for known definitions
+        return f"Dựa trên các tài liệu pháp luật:\n\n{definition}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
+
+    # Otherwise, look for definition in hits
+    found_def = False
+    definition_re = re.compile(re.escape(query_term) + r'\s+là')
+    for text in flat.texts:
+        for sent in itertools.islice(_iter_sentences(text), 15):
+            sent = sent.strip()
+            if not sent or len(sent) < 20:
+                continue
+
+            sent_lower = sent.lower()
+            # Look for definition pattern: "query_term là ..."
+            if definition_re.search(sent_lower):
+                if verify_answer_relevance(query, sent, hits):
+                    # Extract just the definition sentence
+                    found_def = True
+                    return f"Dựa trên các tài liệu pháp luật:\n\n{sent.strip()}.\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
+
+    # If no definition found, provide related info with medium confidence
+    if not found_def:
+        updated_confidence_level = 'medium'
+        text = flat.texts[0]
+        # Only take first 1-2 sentences for conciseness
+        first_sentences = itertools.islice(_iter_sentences(text, _SENT_END_RE), 2)
+        text = '. '.join([s.strip() for s in first_sentences if s.strip()]) + '.'
+        return f"Thông tin liên quan:\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(updated_confidence_level, '')}", updated_confidence_level
+
+    return f"{intro}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
+
+
+def _compose_procedure(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str) -> Optional[Tuple[str, str]]:
+    """Procedure intent - list steps clearly; None if no step-like sentence is found."""
+    steps = []
+    for text in flat.texts:
+        for sent in _iter_sentences(text, _CLAUSE_SPLIT_RE):
+            sent = sent.strip()
+            sent_lower = sent.lower()
+            if sent and any(verb in sent_lower for verb in _PROCEDURE_VERBS):
+                steps.append(sent)
+            if len(steps) >= 4:
                 break
-        
         if steps:
-            step_text = '\n'.join([f"{i+1}. {s}" for i, s in enumerate(steps[:5])])
-            return f"{intro}\n\n{step_text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
-    
-    # For penalty/violation intent
-    if intent == 'penalty':
-        top_hit = hits[0]
-        text = get_text(top_hit)
-        
-        # Extract penalty-related sentences
-        sentences = re.split(r'[.!?]\s+', text)
-        penalty_sents = [s for s in sentences if any(kw in s.lower() for kw in ['phạt', 'xử phạt', 'mức phạt', 'tiền phạt', 'hành chính'])]
-        
-        if penalty_sents:
-            penalty_text = '. '.join(penalty_sents[:3]) + '.'
-            return f"{intro}\n\n{penalty_text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
-        
-        text = summarize_snippet(text, 400)
-        return f"{intro}\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
-    
-    # For time/duration/limit intent - extract the most relevant time information
-    if intent == 'time_limit':
-        # Look through hits for time-related information
-        for h in hits:
-            text = get_text(h)
-            sentences = re.split(r'[.!?]\s+', text)
-            
-            # Find sentences with time keywords
-            for sent in sentences:
-                sent = sent.strip()
-                if any(kw in sent.lower() for kw in ['thời hạn', 'năm', 'tháng', 'ngày', 'tối đa', 'tối thiểu']):
-                    if len(sent) > 20:  # Meaningful sentence
-                        # Verify relevance
-                        if verify_answer_relevance(query, sent, hits):
-                            return f"{intro}\n\n{sent}.\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
-        
-        # Fallback: summarize top hit
-        top_hit = hits[0]
-        text = get_text(top_hit)
-        # If not relevant, downgrade confidence
-        if not verify_answer_relevance(query, text, hits):
-            updated_confidence_level = 'low'
-            intro = CONFIDENCE_PREFIXES.get(updated_confidence_level, "Mình tìm được thông tin sau:")
-        text = summarize_snippet(text, 400)
-        return f"{intro}\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(updated_confidence_level, '')}", updated_confidence_level
-    
-    # General/WHO intent - focus on BEST result only (not all 3)
+            break
+
+    if steps:
+        step_text = '\n'.join([f"{i+1}. {s}" for i, s in enumerate(steps[:5])])
+        return f"{intro}\n\n{step_text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", confidence_level
+    return None
+
+
+def _compose_penalty(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str) -> Tuple[str, str]:
+    """Penalty/violation intent."""
+    updated_confidence_level = confidence_level
+    text = flat.texts[0]
+
+    # Extract penalty-related sentences (only the first 3 are used)
+    penalty_sents = []
+    for sent in _iter_sentences(text):
+        sent_lower = sent.lower()
+        if any(kw in sent_lower for kw in _PENALTY_KEYWORDS):
+            penalty_sents.append(sent)
+            if len(penalty_sents) == 3:
+                break
+
+    if penalty_sents:
+        penalty_text = '. '.join(penalty_sents) + '.'
+        return f"{intro}\n\n{penalty_text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
+
+    text = summarize_snippet(text, 400)
+    return f"{intro}\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
+
+
+def _compose_time_limit(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str) -> Tuple[str, str]:
+    """Time/duration/limit intent - extract the most relevant time information."""
+    updated_confidence_level = confidence_level
+    # Look through hits for time-related information
+    for text in flat.texts:
+        # Find sentences with time keywords
+        for sent in _iter_sentences(text):
+            sent = sent.strip()
+            sent_lower = sent.lower()
+            if any(kw in sent_lower for kw in _TIME_KEYWORDS):
+                if len(sent) > 20:  # Meaningful sentence
+                    # Verify relevance
+                    if verify_answer_relevance(query, sent, hits):
+                        return f"{intro}\n\n{sent}.\n\n{CONFIDENCE_SUFFIXES.get(confidence_level, '')}", updated_confidence_level
+
+    # Fallback: summarize top hit
+    text = flat.texts[0]
+    # If not relevant, downgrade confidence
+    if not verify_answer_relevance(query, text, hits):
+        updated_confidence_level = 'low'
+        intro = CONFIDENCE_PREFIXES.get(updated_confidence_level, "Mình tìm được thông tin sau:")
+    text = summarize_snippet(text, 400)
+    return f"{intro}\n\n{text}\n\n{CONFIDENCE_SUFFIXES.get(updated_confidence_level, '')}", updated_confidence_level
+
+
+def _compose_general(query: str, q_lower: str, hits: List[Dict], flat: _FlatHits, confidence_level: str, intro: str) -> Tuple[str, str]:
+    """General/WHO intent (and fallback for the other handlers)."""
+    updated_confidence_level = confidence_level
+    # Focus on BEST result only (not all 3)
     top_hit = hits[0]
-    text = get_text(top_hit)
-    
+    text = flat.texts[0]
+
     # Verify answer relevance
     is_relevant = verify_answer_relevance(query, text, hits)
-    
+
     # If relevance is low, downgrade confidence
     if not is_relevant and confidence_level in ['very_high', 'high']:
         updated_confidence_level = 'low'
         intro = CONFIDENCE_PREFIXES.get(updated_confidence_level, "Mình tìm được thông tin sau:")
-    
+
     # If hit has high score, use it directly with longer summary
     if top_hit.get('score', 0) > 0.6:
         summary = summarize_snippet(text, 500)
         return f"{intro}\n\n{summary}\n\n{CONFIDENCE_SUFFIXES.get(updated_confidence_level, '')}", updated_confidence_level
-    
+
     # If lower score, try showing top 2 results only (not 3)
     summaries = []
-    for i, h in enumerate(hits[:2], 1):
-        text = get_text(h)
+    for i, (h, text) in enumerate(zip(hits[:2], flat.texts), 1):
         summary = summarize_snippet(text, 250)
         title = h.get('title') or 'Thông tin'
         summaries.append(f"**{i}. {title}:**\n{summary}")
-    
+
     combined = '\n\n'.join(summaries)
     return f"{intro}\n\n{combined}\n\n{CONFIDENCE_SUFFIXES.get(updated_confidence_level, '')}", updated_confidence_level
 
 
+# Intent -> handler; anything else (or a handler returning None) uses _compose_general
+_INTENT_HANDLERS = {
+    'article': _compose_article,
+    'definition': _compose_definition,
+    'procedure': _compose_procedure,
+    'penalty': _compose_penalty,
+    'time_limit': _compose_time_limit,
+}
 
-def detect_intent(q: str) -> str:
-    """Detect user intent from query with multi-level matching."""
-    ql = (q or '').lower()
-    
-    # Check for greetings
-    if any(w in ql for w in ['xin chào', 'chào', 'hello', 'hi', 'halo', 'bay', 'hế lô']):
-        return 'greeting'
+
+def compose_answer(intent: str, hits: List[Dict], query: str, confidence_level: str, is_scenario: bool = False,
+                   scenario_context: Optional[Dict] = None, q_lower: Optional[str] = None) -> Tuple[str, str]:
+    """Dynamically compose answer based on intent and hits (AI-like generation).
     
-    # Article-specific queries
-    if re.search(r"\bđi[eê]u\b|\bdieu\b", ql):
-        return 'article'
+    For scenarios: includes reasoning, comparison, and practical advice.
+    `q_lower` is `query.lower()`, if already computed.
     
-    # Definition queries
-    if any(w in ql for w in ['là gì', 'định nghĩa', 'được hiểu', 'được gọi', 'có nghĩa', 'tức là', 'khái niệm', 'ý nghĩa']):
-        return 'definition'
+    Returns: (answer: str, updated_confidence_level: str)
+    """
+    if not hits:
+        return NO_RESULT_TEMPLATES[random.randrange(_NO_RESULT_N)], confidence_level
     
-    # Time/Duration/Limit queries
-    if any(w in ql for w in ['bao lâu', 'thời hạn', 'khi nào', 'tối đa', 'tối thiểu', 'bao giờ', 'mấy năm', 'mấy tháng', 'mấy ngày']):
-        return 'time_limit'
+    # Hit text is flattened at most once, and only the views a branch reads
+    flat = _FlatHits(hits)
+    if q_lower is None:
+        q_lower = query.lower()
     
-    # Procedure/process queries
-    if any(w in ql for w in ['thủ tục', 'hồ sơ', 'nộp', 'xin', 'cách thức', 'làm sao', 'cách nào', 'bước', 'quy trình', 'process']):
-        return 'procedure'
+    # Build context-aware intro
+    intro = CONFIDENCE_PREFIXES.get(confidence_level, "Mình tìm được thông tin sau:")
     
-    # Penalty/violation queries
-    if any(w in ql for w in ['phạt', 'xử phạt', 'mức phạt', 'vi phạm', 'hình phạt', 'xử lý', 'hậu quả']):
-        return 'penalty'
+    # If this is a scenario query, build comprehensive response
+    if is_scenario and scenario_context:
+        return _compose_scenario(query, q_lower, hits, flat, confidence_level, intro, scenario_context)
+    
+    handler = _INTENT_HANDLERS.get(intent)
+    if handler is not None:
+        result = handler(query, q_lower, hits, flat, confidence_level, intro)
+        if result is not None:
+            return result
+    return _compose_general(query, q_lower, hits, flat, confidence_level, intro)
+
+
+def detect_intent(q: str, q_lower: Optional[str] = None) -> str:
+    """Detect user intent from query with multi-level matching (`q_lower` is `q.lower()`, if already computed)."""
+    ql = q_lower if q_lower is not None else (q or '').lower()
     
-    # WHO/actor queries
-    if any(w in ql for w in ['ai', 'người', 'cơ quan', 'chủ thể', 'có quyền', 'phải', 'tổ chức', 'doanh nghiệp']):
-        return 'who'
+    # Checked in priority order: the first intent with any keyword in the query wins
+    for pattern, intent in _INTENT_PATTERNS:
+        if pattern.search(ql):
+            return intent
     
     return 'general'
 
 
+def _retrieve_and_compose(q: str, k: int, intent: str, mode: Optional[str], is_scenario: bool,
+                          scenario_context: Optional[Dict], q_lower: Optional[str] = None) -> Optional[Tuple[str, float, List[str]]]:
+    """Retrieve passages and compose the answer; returns (answer, conf_score, sources) or None if no hits."""
+    # Retrieve relevant documents
+    hits = retrieve(q, k=k, mode=mode)
+    if not hits:
+        return None
+
+    # Calculate confidence
+    scores = [h.get('score', 0) for h in hits]
+    confidence_level, conf_score = calculate_confidence(scores, q, hits, q_lower)
+    
+    # Collect sources
+    sources = []
+    for h in hits[:3]:
+        url = h.get('url') or h.get('nguon') or ''
+
+        # Try to extract article number and sub-number from multiple possible fields
+        article_num = h.get('dieu_so') or h.get('dieu') or None
+        sub = h.get('dieu_so_phu') or h.get('khoan') or h.get('khoản') or None
+
+        # Try parsing from section or doc_id if not present
+        if not article_num:
+            sec = str(h.get('section') or '')
+            m = _SECTION_ARTICLE_RE.search(sec)
+            if m:
+                article_num = m.group(1)
+        if not article_num:
+            docid = str(h.get('doc_id') or '')
+            m = _DOC_ID_NUM_RE.search(docid)
+            if m:
+                article_num = m.group(1)
+
+        title = h.get('title') or h.get('tieu_de_luat') or h.get('tieu_de') or ''
+
+        parts = []
+        if article_num:
+            parts.append(f"Điều {article_num}")
+        if sub:
+            parts.append(f"khoản {sub}")
+        if title:
+            parts.append(title)
+
+        src_label = ' - '.join(parts) if parts else (url or title)
+        if url:
+            # append URL for traceability
+            src_label = f"{src_label} — {url}" if src_label else url
+
+        sources.append(src_label)
+    
+    # ============ GENERATE ANSWER ============
+    # Generate answer using AI-like composition with scenario analysis
+    answer, updated_confidence_level = compose_answer(
+        intent, hits, q, confidence_level,
+        is_scenario=is_scenario,
+        scenario_context=scenario_context,
+        q_lower=q_lower
+    )
+    
+    # Update confidence if it was downgraded during composition
+    if updated_confidence_level != confidence_level:
+        confidence_level = updated_confidence_level
+        # Recalculate conf_score based on new level
+        conf_score = _CONF_LEVEL_SCORES.get(confidence_level, 0.35)
+
+    return answer, conf_score, sources
+
+
 def answer_question(query: str, k: int = 5, session_id: str = None, user_id: str = "anonymous") -> Dict:
     """Advanced answer generation with reasoning, learning, and sentiment analysis.
     
@@ -796,7 +979,11 @@ def answer_question(query: str, k: int = 5, session_id: str = None, user_id: str
     """
     q = (query or "").strip()
     
-    # Get engines
+    # Get engines (imported on the first question, not when the app starts)
+    from chatbot.learning_engine import get_learning_engine
+    from chatbot.sentiment_analyzer import get_sentiment_analyzer
+    from chatbot.conversation_manager import get_conversation_manager
+    from chatbot.nlg_engine import get_nlg_engine
     learning_engine = get_learning_engine()
     sentiment_analyzer = get_sentiment_analyzer()
     conversation_manager = get_conversation_manager()
@@ -822,18 +1009,20 @@ def answer_question(query: str, k: int = 5, session_id: str = None, user_id: str
     
     # ============ SCENARIO & INTENT DETECTION ============
     # Detect if this is a scenario query (practical situation)
-    is_scenario = detect_scenario_query(q)
+    # (the query is lowercased once here and reused by every helper below)
+    q_lower = q.lower()
+    is_scenario = detect_scenario_query(q, q_lower)
     scenario_context = None
     
     if is_scenario:
-        scenario_context = extract_scenario_context(q)
+        scenario_context = extract_scenario_context(q, q_lower)
         intent = 'scenario'
     else:
-        intent = detect_intent(q)
+        intent = detect_intent(q, q_lower)
     
     # Handle greetings
     if intent == 'greeting':
-        answer = random.choice(GREETING_RESPONSES)
+        answer = GREETING_RESPONSES[random.randrange(_GREETING_N)]
         if session_id:
             conversation_manager.add_message(session_id, "user", q)
             conversation_manager.add_message(session_id, "bot", answer)
@@ -877,92 +1066,49 @@ def answer_question(query: str, k: int = 5, session_id: str = None, user_id: str
     elif intent in ('definition', 'who', 'procedure', 'penalty'):
         mode = 'keyword'
 
-    # Retrieve relevant documents
-    hits = retrieve(q, k=k, mode=mode)
-    if not hits:
-        no_result_answer = random.choice(NO_RESULT_TEMPLATES)
-        
-        if session_id:
-            conversation_manager.add_message(session_id, "user", q, {"sentiment": sentiment.value})
-            conversation_manager.add_message(session_id, "bot", no_result_answer)
-        
-        return {
-            "answer": no_result_answer,
-            "sources": [],
-            "sentiment": sentiment.value
-        }
-
-    # Calculate confidence
-    scores = [h.get('score', 0) for h in hits]
-    confidence_level, conf_score = calculate_confidence(scores, q, hits)
-    
-    # Collect sources
-    sources = []
-    for h in hits[:3]:
-        url = h.get('url') or h.get('nguon') or ''
+    # ============ RETRIEVE & COMPOSE (fuzzy + semantic cache) ============
+    # Re-typed or paraphrased versions of an earlier question reuse its composed answer:
+    # normalized text / SimHash first (no model), then the embedding cache
+    fuzzy_cache = get_fuzzy_cache()
+    sem_cache = get_semantic_cache()
+    cache_ns = (intent, k, (scenario_context or {}).get('action'), (scenario_context or {}).get('object'))
+    composed = fuzzy_cache.get(q, cache_ns) if fuzzy_cache is not None else None
+    q_emb = None
+    if composed is None and sem_cache is not None:
+        q_emb = sem_cache.embed(q)
+        composed = sem_cache.get(q_emb, cache_ns)
+        if composed is not None and fuzzy_cache is not None:
+            fuzzy_cache.put(q, cache_ns, composed)
 
-        # Try to extract article number and sub-number from multiple possible fields
-        article_num = h.get('dieu_so') or h.get('dieu') or None
-        sub = h.get('dieu_so_phu') or h.get('khoan') or h.get('khoản') or None
-
-        # Try parsing from section or doc_id if not present
-        if not article_num:
-            sec = str(h.get('section') or '')
-            m = re.search(r"[Đd]i[eê]u\s*(\d+)", sec)
-            if m:
-                article_num = m.group(1)
-        if not article_num:
-            docid = str(h.get('doc_id') or '')
-            m = re.search(r"#(\d+)", docid)
-            if m:
-                article_num = m.group(1)
-
-        title = h.get('title') or h.get('tieu_de_luat') or h.get('tieu_de') or ''
-
-        parts = []
-        if article_num:
-            parts.append(f"Điều {article_num}")
-        if sub:
-            parts.append(f"khoản {sub}")
-        if title:
-            parts.append(title)
-
-        src_label = ' - '.join(parts) if parts else (url or title)
-        if url:
-            # append URL for traceability
-            src_label = f"{src_label} — {url}" if src_label else url
-
-        sources.append(src_label)
-    
-    # ============ GENERATE ANSWER ============
-    # Generate answer using AI-like composition with scenario analysis
-    answer, updated_confidence_level = compose_answer(
-        intent, hits, q, confidence_level,
-        is_scenario=is_scenario,
-        scenario_context=scenario_context
-    )
-    
-    # Update confidence if it was downgraded during composition
-    if updated_confidence_level != confidence_level:
-        confidence_level = updated_confidence_level
-        # Recalculate conf_score based on new level
-        if confidence_level == 'very_high':
-            conf_score = 0.95
-        elif confidence_level == 'high':
-            conf_score = 0.75
-        elif confidence_level == 'medium':
-            conf_score = 0.55
-        else:  # low
-            conf_score = 0.35
+    if composed is None:
+        composed = _retrieve_and_compose(q, k, intent, mode, is_scenario, scenario_context, q_lower)
+        if composed is None:
+            no_result_answer = NO_RESULT_TEMPLATES[random.randrange(_NO_RESULT_N)]
+            
+            if session_id:
+                conversation_manager.add_message(session_id, "user", q, {"sentiment": sentiment.value})
+                conversation_manager.add_message(session_id, "bot", no_result_answer)
+            
+            return {
+                "answer": no_result_answer,
+                "sources": [],
+                "sentiment": sentiment.value
+            }
+        if fuzzy_cache is not None:
+            fuzzy_cache.put(q, cache_ns, composed)
+        if sem_cache is not None:
+            sem_cache.put(q_emb, cache_ns, composed)
+    answer, conf_score, sources = composed
     
     # ============ APPLY TONE BASED ON SENTIMENT ============
-    # Thêm tone prefix nếu cần
-    if response_tone.get("greeting"):
-        answer = f"{response_tone['greeting']}\n\n{answer}"
-    
-    # Thêm suffix
-    if response_tone.get("suffix"):
-        answer = f"{answer}\n\n{response_tone['suffix']}"
+    # Thêm tone prefix/suffix nếu cần (one string build, the answer is copied once)
+    greeting, suffix = response_tone.get("greeting"), response_tone.get("suffix")
+    if greeting and suffix:
+        answer = f"{greeting}\n\n{answer}\n\n{suffix}"
+    elif greeting:
+        answer = f"{greeting}\n\n{answer}"
+    elif suffix:
+        answer = f"{answer}\n\n{suffix}"
     
     # ============ ADD EMOJI & FORMATTING ============
     answer = nlg_engine.add_emojis(answer)
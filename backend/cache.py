@@ -0,0 +1,102 @@
+# file: backend/cache.py
+"""Redis hot cache for /api/search and /api/chat responses.
+
+The client is created lazily on first use. If the `redis` package is missing
+or the server is unreachable, caching is disabled and callers fall through to
+the normal retrieval path.
+"""
+import hashlib
+import json
+import re
+import time
+from config import REDIS_URL, CACHE_TTL
+
+VERSION_KEY = b"lawadv:cache_version"
+# The version is re-read from Redis at most every VERSION_TTL seconds instead of
+# on every request; invalidate() updates it in this process at once, other
+# processes pick it up within VERSION_TTL
+VERSION_TTL = 1.0
+
+client = None
+_disabled = False
+_version = None  # (version bytes, time.monotonic() when read)
+
+
+def get_client():
+    """Return a shared Redis client (connection-pooled) or None if unavailable."""
+    global client, _disabled
+    if client is not None or _disabled:
+        return client
+    try:
+        import redis
+        pool = redis.ConnectionPool.from_url(REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+        r = redis.Redis(connection_pool=pool, decode_responses=False)
+        r.ping()
+        client = r
+        print("✅ Connected to Redis cache:", REDIS_URL)
+    except Exception as e:
+        print("⚠️ Redis not available, response cache disabled:", e)
+        _disabled = True
+    return client
+
+
+def normalize_query(q: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries share a key."""
+    return re.sub(r"\s+", " ", (q or "").strip().lower())
+
+
+def make_key(prefix: str, *parts) -> bytes:
+    """Build a compact cache key: `<prefix>:<version>:<sha256(parts)[:16]>`."""
+    r = get_client()
+    version = _current_version(r) if r is not None else b"0"
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    digest = hashlib.sha256(raw.encode("utf-8")).digest()[:16]
+    return prefix.encode() + b":" + version + b":" + digest
+
+
+def _current_version(r) -> bytes:
+    global _version
+    now = time.monotonic()
+    if _version is not None and now - _version[1] < VERSION_TTL:
+        return _version[0]
+    try:
+        _version = (r.get(VERSION_KEY) or b"0", now)
+    except Exception:
+        return _version[0] if _version is not None else b"0"
+    return _version[0]
+
+
+def get_json(key: bytes):
+    """Return the cached value for `key`, or None on miss / Redis error."""
+    r = get_client()
+    if r is None:
+        return None
+    try:
+        raw = r.get(key)
+        return json.loads(raw) if raw is not None else None
+    except Exception as e:
+        print("⚠️ Redis get error:", e)
+        return None
+
+
+def set_json(key: bytes, value, ttl: int = CACHE_TTL):
+    """Store `value` under `key` with a TTL; errors are logged and ignored."""
+    r = get_client()
+    if r is None:
+        return
+    try:
+        r.setex(key, ttl, json.dumps(value, ensure_ascii=False).encode("utf-8"))
+    except Exception as e:
+        print("⚠️ Redis set error:", e)
+
+
+def invalidate():
+    """Invalidate all cached responses by bumping the key version prefix."""
+    r = get_client()
+    if r is None:
+        return
+    global _version
+    try:
+        _version = (str(r.incr(VERSION_KEY)).encode(), time.monotonic())
+    except Exception as e:
+        print("⚠️ Redis invalidate error:", e)
@@ -1,14 +1,73 @@
 # file: backend/db.py
-from pymongo import MongoClient, TEXT
+from pymongo import MongoClient, TEXT, InsertOne
+from pymongo.errors import OperationFailure, DuplicateKeyError
 from tinydb import TinyDB
 from config import MONGO_URI, DB_NAME, COLLECTION
 import os
+import json
+import hashlib
 import atexit
+import threading
 
 USE_MONGO = True
 client = None
 coll = None
 db_tiny = None
+# TinyDB has no unique index: the duplicate check and the insert run under this lock
+_tiny_lock = threading.Lock()
+
+TEXT_INDEX_NAME = "text_text_title_text"
+TEXT_INDEX_KEYS = [("tieu_de_luat", TEXT),
+                   ("noi_dung.tieu_de", TEXT),
+                   ("noi_dung.noi_dung", TEXT),
+                   ("section", TEXT),
+                   ("text", TEXT)]
+# Text indexes from earlier versions (a collection can only have one)
+_OLD_TEXT_INDEXES = (TEXT_INDEX_NAME, "law_text_index")
+
+
+def _ensure_text_index(coll):
+    """Create the text index; a no-op when it already exists with the same keys.
+
+    Only when an older text index conflicts is it dropped and rebuilt, so
+    worker restarts never trigger a full text re-index.
+    """
+    try:
+        coll.create_index(TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, default_language='english')
+        return
+    except OperationFailure as e:
+        print("⚠️ Text index conflicts with an existing one, rebuilding:", e)
+    for name in _OLD_TEXT_INDEXES:
+        try:
+            coll.drop_index(name)
+        except OperationFailure:
+            pass
+    coll.create_index(TEXT_INDEX_KEYS, name=TEXT_INDEX_NAME, default_language='english')
+    print("✅ Text index created.")
+
+
+def _ensure_hash_index(coll):
+    """Unique index on content_hash, so concurrent inserts of the same passage cannot both succeed.
+
+    An older non-unique index of the same name is dropped and rebuilt.
+    """
+    try:
+        coll.create_index("content_hash", name="content_hash_idx", sparse=True, unique=True)
+        return
+    except OperationFailure as e:
+        # Existing duplicates (E11000) must be cleaned up first; only an option conflict is rebuilt
+        if e.code not in (85, 86):  # IndexOptionsConflict, IndexKeySpecsConflict
+            raise
+        print("⚠️ content_hash index conflicts with an existing one, rebuilding:", e)
+    coll.drop_index("content_hash_idx")
+    coll.create_index("content_hash", name="content_hash_idx", sparse=True, unique=True)
+
+
+def ensure_indexes(coll):
+    """Create the indexes keyword search and ingestion rely on (idempotent)."""
+    _ensure_text_index(coll)
+    _ensure_hash_index(coll)
+    coll.create_index([("tieu_de_luat", 1), ("doc_id", 1)], name="law_passage_idx")
 
 
 def ensure_connection():
@@ -25,17 +84,7 @@ def ensure_connection():
 
         # --- Xử lý index MongoDB text ---
         try:
-            for idx in coll.list_indexes():
-                if idx.get("name") in ["text_text_title_text", "law_text_index"]:
-                    coll.drop_index(idx["name"]) if idx.get("name") else None
-            coll.create_index(
-                [("tieu_de_luat", TEXT),
-                 ("noi_dung.tieu_de", TEXT),
-                 ("noi_dung.noi_dung", TEXT)],
-                name="text_text_title_text",
-                default_language='english'
-            )
-            print("✅ Text index created.")
+            ensure_indexes(coll)
         except Exception as e:
             print("⚠️ MongoDB index error:", e)
 
@@ -46,12 +95,7 @@ def ensure_connection():
         USE_MONGO = False
         os.makedirs("data", exist_ok=True)
         # Ensure TinyDB uses UTF-8 to correctly read Vietnamese text
-        from tinydb.storages import JSONStorage
-
-        class UTF8Storage(JSONStorage):
-            def __init__(self, path, **kwargs):
-                kwargs['encoding'] = 'utf-8'
-                super().__init__(path, **kwargs)
+        from backend.tinydb_storage import UTF8Storage
 
         db_tiny = TinyDB("data/tinydb.json", storage=UTF8Storage)
 
@@ -72,13 +116,40 @@ def close_client():
 atexit.register(close_client)
 
 
+def content_hash(p) -> str:
+    """Truncated SHA-256 (16 bytes, hex) of a passage's content, used for dedup."""
+    text = p.get("text")
+    if not isinstance(text, str):
+        text = json.dumps({k: v for k, v in p.items() if k not in ("_id", "content_hash")},
+                          ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).digest()[:16].hex()
+
+
 def insert_passage(p):
-    """Insert một đoạn luật."""
+    """Insert một đoạn luật (bỏ qua nếu nội dung đã tồn tại). Returns True if inserted.
+
+    `p` is not modified: a copy carrying `content_hash` is stored.
+    """
     ensure_connection()
+    doc = dict(p)
+    h = doc.setdefault("content_hash", content_hash(doc))
     if USE_MONGO and coll is not None:
-        coll.insert_one(p)
+        try:
+            # The unique content_hash index rejects a duplicate atomically
+            coll.insert_one(doc)
+        except DuplicateKeyError:
+            return False
+        doc.pop("_id", None)
     else:
-        db_tiny.insert(p)
+        from tinydb import where
+        with _tiny_lock:
+            if db_tiny.contains(where("content_hash") == h):
+                return False
+            db_tiny.insert(doc)
+    # Picked up by indexer.update_tfidf() instead of a full rebuild
+    from backend import indexer
+    indexer.queue_passage(doc)
+    return True
 
 
 def find_by_id(_id):
@@ -90,13 +161,54 @@ def find_by_id(_id):
         return db_tiny.search(where("doc_id") == _id)
 
 
-def text_search(query, limit=10):
+# Fields text_search() returns from MongoDB. Law documents embed every article
+# in `noi_dung`, so only the first `max_articles` of them are sent back.
+TEXT_SEARCH_FIELDS = ("doc_id", "title", "section", "text", "url", "tieu_de_luat", "nguon", "dieu_so")
+
+
+# Passages per bulk_write when ingesting a law
+INGEST_BULK_SIZE = 1000
+
+
+def replace_law_passages(collection, law_doc):
+    """Replace a law in MongoDB with one document per article; returns the passage count.
+
+    Passages are normalized exactly as `indexer.fetch_all_passages()` would
+    (which then passes them through as-is) and carry `tieu_de_luat`, so a
+    re-ingest removes both these and older whole-law documents.
+    """
+    return replace_laws_passages(collection, [law_doc])
+
+
+def replace_laws_passages(collection, law_docs):
+    """`replace_law_passages` for many laws: one delete for all of them, then unordered bulk inserts.
+
+    If the same law appears more than once, the last copy wins.
+    """
+    from backend.indexer import passages_from_doc
+    laws = {d['tieu_de_luat']: d for d in law_docs}
+    passages = []
+    for title, law_doc in laws.items():
+        for p in passages_from_doc(law_doc):
+            p['tieu_de_luat'] = title
+            passages.append(p)
+    collection.delete_many({"tieu_de_luat": {"$in": list(laws)}})
+    for i in range(0, len(passages), INGEST_BULK_SIZE):
+        collection.bulk_write([InsertOne(p) for p in passages[i:i + INGEST_BULK_SIZE]], ordered=False)
+    collection.create_index([("tieu_de_luat", 1), ("doc_id", 1)], name="law_passage_idx")
+    return len(passages)
+
+
+def text_search(query, limit=10, max_articles=3):
     """Search theo keyword."""
     ensure_connection()
     if USE_MONGO and coll is not None:
+        projection = {f: 1 for f in TEXT_SEARCH_FIELDS}
+        projection["noi_dung"] = {"$slice": max_articles}
+        projection["score"] = {"$meta": "textScore"}
         cursor = coll.find(
             {"$text": {"$search": query}},
-            {"score": {"$meta": "textScore"}}
+            projection
         ).sort([("score", {"$meta": "textScore"})]).limit(limit)
         return list(cursor)
     else:
@@ -1,12 +1,131 @@
 # file: backend/indexer.py
 import os
 import joblib
-from sklearn.feature_extraction.text import TfidfVectorizer
-from config import DATA_DIR, EMBEDDING_MODEL, USE_EMBEDDINGS
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from config import (DATA_DIR, EMBEDDING_MODEL, EMBEDDING_ONNX_PATH, EMBEDDING_BATCH_SIZE, USE_EMBEDDINGS, TFIDF_REBUILD_RATIO, TFIDF_INT8, INT8_TOP_TERMS,
+                    FAISS_HNSW_MIN, FAISS_IVFPQ_MIN, FAISS_SQ8, TFIDF_HASHING, TFIDF_HASH_FEATURES)
 import numpy as np
 import json
+import time
 os.makedirs(DATA_DIR, exist_ok=True)
 
+TFIDF_PATH = os.path.join(DATA_DIR, "tfidf.joblib")
+TFIDF_META_PATH = os.path.join(DATA_DIR, "tfidf_meta.json")
+PENDING_PATH = os.path.join(DATA_DIR, "tfidf_pending.jsonl")
+DOC_TOKENS_PATH = os.path.join(DATA_DIR, "tfidf_doc_tokens.joblib")
+INT8_PATH = os.path.join(DATA_DIR, "tfidf_int8.joblib")
+# Dense n_terms x n_docs int8 matrix written by earlier versions
+LEGACY_INT8_PATH = os.path.join(DATA_DIR, "tfidf_int8.npy")
+INT8_SCALE_PATH = os.path.join(DATA_DIR, "tfidf_int8_scale.npy")
+FAISS_PATH = os.path.join(DATA_DIR, "faiss.index")
+EMB_PATH = os.path.join(DATA_DIR, "embeddings.npy")
+EMB_DOCS_PATH = os.path.join(DATA_DIR, "embeddings_docs.json")
+EMB_META_PATH = os.path.join(DATA_DIR, "embeddings_meta.json")
+EMB_INT8_PATH = os.path.join(DATA_DIR, "embeddings_int8.npy")
+EMB_SCALE_PATH = os.path.join(DATA_DIR, "embeddings_scale.npy")
+
+# Use a token pattern that includes unicode word characters to handle Vietnamese
+TOKEN_PATTERN = r"(?u)\b\w+\b"
+NGRAM_RANGE = (1, 2)
+# Below this many passages, process start-up costs more than it saves
+PARALLEL_MIN_DOCS = 2000
+TOKENIZE_CHUNKSIZE = 256
+# Terms in more than this fraction of passages get no weight
+MAX_DF = 0.85
+
+_analyzer = None
+# Last fetch_all_passages() result, keyed by a fingerprint of the source
+_PASSAGE_CACHE = None  # (fingerprint, passages)
+
+
+def _source_fingerprint(use_mongo, coll):
+    """Cheap identity of the passage source: Mongo (count, newest _id) or the TinyDB file mtime.
+
+    Ingestion only deletes and inserts (never updates in place), so any change
+    to the collection changes the count or the newest ObjectId.
+    """
+    try:
+        if use_mongo and coll is not None:
+            n = coll.count_documents({})
+            if n:
+                newest = coll.find_one({}, {'_id': 1}, sort=[('_id', -1)])
+                return ('mongo', n, newest and newest['_id'])
+        return ('tinydb', os.path.getmtime('data/tinydb.json'))
+    except Exception:
+        return None
+
+
+def passages_from_doc(doc):
+    """Normalize one stored document into passages (one per article/section).
+
+    A document that already looks like a passage (has a `text` string) is
+    returned as-is.
+    """
+    if not isinstance(doc, dict):
+        return []
+
+    # If document already looks like a passage
+    if 'text' in doc and isinstance(doc.get('text'), str):
+        return [doc] if doc['text'].strip() else []
+
+    passages = []
+    title_luat = doc.get('tieu_de_luat') or doc.get('title') or doc.get('tieu_de') or ''
+    nguon = doc.get('nguon') or doc.get('url') or ''
+    noi_dung = doc.get('noi_dung') or []
+
+    if isinstance(noi_dung, list):
+        # Per-document parts of every passage, computed once
+        dieu_so = doc.get('dieu_so')
+        dieu_label = f"Điều {dieu_so}" if dieu_so else ''
+        has_dieu_so = 'dieu_so' in doc
+        for i, art in enumerate(noi_dung, start=1):
+            # art can be a dict (with 'noi_dung') or a plain string
+            art_so = dieu_so
+            if isinstance(art, dict):
+                # Scraped laws number each article (art['dieu_so']); older
+                # documents carry a single dieu_so for the whole document
+                art_so = art.get('dieu_so', dieu_so)
+                text = art.get('noi_dung') or art.get('text') or ''
+                # Build a human-friendly section label
+                section = art.get('tieu_de')
+                if not section:
+                    phu = art.get('dieu_so_phu')
+                    if phu:
+                        section = f"{dieu_label} {phu}" if dieu_label else str(phu)
+                    else:
+                        section = dieu_label or f'Doạn {i}'
+            else:
+                text = art
+                section = f'Doạn {i}'
+
+            text = str(text)
+            if not text.strip():
+                continue
+
+            passage = {
+                'doc_id': f"{title_luat}#{dieu_so if has_dieu_so else i}#{i}",
+                'title': title_luat,
+                'section': section,
+                'text': text,
+                'url': nguon
+            }
+            if art_so is not None:
+                # Exact article lookup (search.article_index) keys on this
+                passage['dieu_so'] = art_so
+            passages.append(passage)
+    else:
+        # fallback: store doc as a single passage
+        text = json.dumps(doc, ensure_ascii=False)
+        passages.append({
+            'doc_id': doc.get('doc_id') or doc.get('_id') or title_luat,
+            'title': title_luat,
+            'section': '',
+            'text': text,
+            'url': nguon
+        })
+    return passages
+
 
 def fetch_all_passages():
     """Return a list of normalized passages for indexing.
@@ -14,7 +133,9 @@ def fetch_all_passages():
     Handles both MongoDB and TinyDB backends. Supports documents where
     `noi_dung` is a list of strings or a list of dicts (with keys like
     'noi_dung', 'dieu_so_phu', 'dieu_so', 'tieu_de'). Skips empty texts.
+    The result is reused until the source changes, so treat it as read-only.
     """
+    global _PASSAGE_CACHE
     passages = []
     # Lazy import backend.db to ensure connection logic runs
     try:
@@ -26,6 +147,10 @@ def fetch_all_passages():
         USE_MONGO = False
         coll = None
 
+    fingerprint = _source_fingerprint(USE_MONGO, coll)
+    if fingerprint is not None and _PASSAGE_CACHE is not None and _PASSAGE_CACHE[0] == fingerprint:
+        return _PASSAGE_CACHE[1]
+
     raw_docs = []
     if USE_MONGO and coll is not None:
         try:
@@ -35,112 +160,467 @@ def fetch_all_passages():
     if not raw_docs:
         # Fallback to TinyDB with UTF-8 storage
         from tinydb import TinyDB
-        from tinydb.storages import JSONStorage
-
-        class UTF8Storage(JSONStorage):
-            def __init__(self, path, **kwargs):
-                kwargs['encoding'] = 'utf-8'
-                super().__init__(path, **kwargs)
+        from backend.tinydb_storage import UTF8Storage
 
         dbt = TinyDB('data/tinydb.json', storage=UTF8Storage)
         raw_docs = dbt.all()
 
     # Normalize raw_docs into a list of passages (one per article/section)
     for doc in raw_docs:
-        if not isinstance(doc, dict):
-            continue
+        passages.extend(passages_from_doc(doc))
 
-        # If document already looks like a passage
-        if 'text' in doc and isinstance(doc.get('text'), str):
-            if doc['text'].strip():
-                passages.append(doc)
-            continue
+    _PASSAGE_CACHE = (fingerprint, passages) if fingerprint is not None else None
+    return passages
 
-        title_luat = doc.get('tieu_de_luat') or doc.get('title') or doc.get('tieu_de') or ''
-        nguon = doc.get('nguon') or doc.get('url') or ''
-        noi_dung = doc.get('noi_dung') or []
-
-        if isinstance(noi_dung, list):
-            for i, art in enumerate(noi_dung, start=1):
-                # art can be a dict (with 'noi_dung') or a plain string
-                if isinstance(art, dict):
-                    text = art.get('noi_dung') or art.get('text') or ''
-                    # Build a human-friendly section label
-                    sec_parts = []
-                    if doc.get('dieu_so'):
-                        sec_parts.append(f"Điều {doc.get('dieu_so')}")
-                    if art.get('dieu_so_phu'):
-                        sec_parts.append(str(art.get('dieu_so_phu')))
-                    section = art.get('tieu_de') or ' '.join(sec_parts) or f'Doạn {i}'
-                else:
-                    text = str(art)
-                    section = f'Doạn {i}'
-
-                if not text or not str(text).strip():
-                    continue
-
-                passages.append({
-                    'doc_id': f"{title_luat}#{doc.get('dieu_so', i)}#{i}",
-                    'title': title_luat,
-                    'section': section,
-                    'text': str(text),
-                    'url': nguon
-                })
-        else:
-            # fallback: store doc as a single passage
-            text = json.dumps(doc, ensure_ascii=False)
-            passages.append({
-                'doc_id': doc.get('doc_id') or doc.get('_id') or title_luat,
-                'title': title_luat,
-                'section': '',
-                'text': text,
-                'url': nguon
-            })
 
-    return passages
+def analyze_text(doc):
+    """TF-IDF analyzer: word 1-2 grams of raw text, or a list already tokenized by it."""
+    global _analyzer
+    if isinstance(doc, list):
+        return doc
+    if _analyzer is None:
+        _analyzer = TfidfVectorizer(ngram_range=NGRAM_RANGE, token_pattern=TOKEN_PATTERN).build_analyzer()
+    return _analyzer(doc)
 
 
-def build_tfidf():
-    docs = fetch_all_passages()
-    texts = [d.get('text', '') for d in docs if d.get('text') and len(str(d.get('text')).strip()) > 3]
+def _tokenize_chunk(texts):
+    return [analyze_text(t) for t in texts]
+
+
+def tokenize_all(texts):
+    """Tokenize passages, fanning out over all cores for large corpora."""
+    if len(texts) < PARALLEL_MIN_DOCS or (os.cpu_count() or 1) < 2:
+        return _tokenize_chunk(texts)
+    chunks = [texts[i:i + TOKENIZE_CHUNKSIZE] for i in range(0, len(texts), TOKENIZE_CHUNKSIZE)]
+    with ProcessPoolExecutor() as ex:
+        return [toks for chunk in ex.map(_tokenize_chunk, chunks) for toks in chunk]
+
+
+def _indexable(p):
+    text = p.get('text')
+    return bool(text) and len(str(text).strip()) > 3
+
+
+def build_tfidf(passages=None):
+    """Fit TF-IDF on `passages` (default: everything from `fetch_all_passages()`).
+
+    The pending queue is claimed before the passages are read; queued passages
+    the new index does not contain (e.g. `passages` was read before they were
+    inserted) are queued again, as is the whole claim if the build fails.
+    """
+    claimed, pending = _claim_pending()
+    try:
+        docs = _build_tfidf(passages if passages is not None else fetch_all_passages())
+    except BaseException:
+        _finish_pending(claimed, pending)
+        raise
+    built = {str(d['text']) for d in docs}
+    _finish_pending(claimed, [p for p in pending if _indexable(p) and str(p['text']) not in built])
+    print("TF-IDF index built.")
+
+
+def _build_tfidf(passages):
+    """Fit and save the TF-IDF index; returns the indexed docs."""
+    # One pass keeps docs and texts row-aligned with X (passages too short to index are dropped from both)
+    docs, texts = [], []
+    for d in passages:
+        if _indexable(d):
+            docs.append(d)
+            texts.append(d['text'])
     if not texts:
         raise ValueError("No text documents available for TF-IDF indexing.")
 
-    # Use a token pattern that includes unicode word characters to handle Vietnamese
-    vec = TfidfVectorizer(max_df=0.85, min_df=1, ngram_range=(1, 2), token_pattern=r"(?u)\b\w+\b")
-    X = vec.fit_transform(texts)
-    joblib.dump((vec, X, docs), os.path.join(DATA_DIR, "tfidf.joblib"))
-    print("TF-IDF index built.")
+    if TFIDF_HASHING:
+        vec, X = _fit_hashed_tfidf(tokenize_all(texts))
+    else:
+        vec = TfidfVectorizer(max_df=MAX_DF, min_df=1, analyzer=analyze_text)
+        X = vec.fit_transform(tokenize_all(texts))
+    # Write to a temp file and atomically swap it in so concurrent searches
+    # keep reading the previous index until the new one is complete.
+    _dump_tfidf(vec, X, docs, doc_token_sets(texts))
+    _save_meta({"n_base": X.shape[0], "n_delta": 0})
+    return docs
 
 
-def build_embeddings():
+def _smooth_idf(n, df):
+    """sklearn's smoothed IDF: ln((1 + n) / (1 + df)) + 1."""
+    return np.log((1 + n) / (1 + df)) + 1
+
+
+def _fit_hashed_tfidf(tokens):
+    """TF-IDF over hashed features: (HashingVectorizer with `idf_` attached, l2-normalized X).
+
+    Same weighting as TfidfVectorizer(max_df=MAX_DF): smoothed IDF, terms in
+    more than MAX_DF of the passages weighted 0. No vocabulary is stored.
+    """
+    from sklearn.preprocessing import normalize
+    vec = HashingVectorizer(analyzer=analyze_text, n_features=TFIDF_HASH_FEATURES,
+                            alternate_sign=False, norm=None)
+    counts = vec.transform(tokens).tocsr()
+    n = counts.shape[0]
+    df = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = _smooth_idf(n, df)
+    idf[df > MAX_DF * n] = 0
+    vec.idf_ = idf.astype(np.float32)  # one weight per hash bucket, most of them unused
+    X = normalize(counts.multiply(idf).tocsr(), norm='l2', copy=False)
+    X.eliminate_zeros()
+    return vec, X
+
+
+def doc_token_sets(texts):
+    """Normalized token set of each passage, as used by search's keyword boost (pyvi runs here, once)."""
+    from backend.search import normalize_text
+    return [frozenset(normalize_text(str(t)).split()) for t in texts]
+
+
+def _load_doc_tokens(X):
+    """Token sets saved with the index `X`, or None if missing or saved for another index."""
+    try:
+        saved = joblib.load(DOC_TOKENS_PATH)
+    except Exception:
+        return None
+    if saved.get('n') != X.shape[0] or saved.get('nnz') != X.nnz:
+        return None
+    return saved['tokens']
+
+
+def _dump_tfidf(vec, X, docs, doc_tokens=None):
+    # float32 CSR: search memory-maps X's arrays straight from tfidf.joblib, so
+    # this halves the pages a cold worker faults in (scores do not need float64)
+    X = X.tocsr().astype(np.float32, copy=False)
+    if doc_tokens is not None:
+        # Keyed by (rows, nnz) so search never pairs them with another index
+        joblib.dump({'n': X.shape[0], 'nnz': X.nnz, 'tokens': doc_tokens}, DOC_TOKENS_PATH)
+    if TFIDF_INT8:
+        if isinstance(vec, HashingVectorizer):
+            # The term-major int8 copy would be n_features x n_docs
+            print("⚠️ TFIDF_INT8 is ignored for a hashed TF-IDF index")
+        else:
+            _save_int8_index(X)
+    tmp_path = TFIDF_PATH + ".tmp"
+    joblib.dump((vec, X, docs), tmp_path)
+    os.replace(tmp_path, TFIDF_PATH)
+    _reload_search()
+
+
+def _reload_search():
+    """Make this process's search module pick up the files just written right away."""
+    from backend.search import reload_models
+    reload_models()
+
+
+def _save_int8_index(X, top_terms=INT8_TOP_TERMS):
+    """Save an int8 copy of X for approximate scoring.
+
+    Each passage keeps only its `top_terms` heaviest terms, is re-normalized
+    and quantized with its own scale. Only those entries are stored, as a
+    term-major (n_terms x n_docs) int8 CSR matrix, so a query only reads the
+    rows of its own terms. Files are swapped in with os.replace: running
+    workers keep memory-mapping the old ones until they reload.
+    """
+    from scipy.sparse import csr_matrix
+    X = X.tocsr()
+    n_docs, n_terms = X.shape
+    scales = np.zeros(n_docs, dtype=np.float32)
+    terms, docs, data = [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=np.int8)]
+    for i in range(n_docs):
+        idx = X.indices[X.indptr[i]:X.indptr[i + 1]]
+        vals = X.data[X.indptr[i]:X.indptr[i + 1]]
+        if len(vals) > top_terms:
+            keep = np.argpartition(-vals, top_terms)[:top_terms]
+            idx, vals = idx[keep], vals[keep]
+        norm = np.linalg.norm(vals)
+        if norm == 0:
+            continue
+        vals = vals / norm
+        scales[i] = vals.max() / 127
+        terms.append(idx)
+        docs.append(np.full(len(idx), i, dtype=np.int32))
+        data.append(np.round(vals / scales[i]).astype(np.int8))
+    XqT = csr_matrix((np.concatenate(data), (np.concatenate(terms), np.concatenate(docs))),
+                     shape=(n_terms, n_docs), dtype=np.int8)
+    XqT.eliminate_zeros()
+    tmp_path = INT8_SCALE_PATH + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, scales)
+    os.replace(tmp_path, INT8_SCALE_PATH)
+    tmp_path = INT8_PATH + ".tmp"
+    joblib.dump(XqT, tmp_path)
+    os.replace(tmp_path, INT8_PATH)
+    if os.path.exists(LEGACY_INT8_PATH):
+        os.remove(LEGACY_INT8_PATH)
+
+
+def _load_meta():
+    try:
+        with open(TFIDF_META_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _save_meta(meta):
+    with open(TFIDF_META_PATH, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def queue_passage(p):
+    """Remember a newly inserted passage so `update_tfidf` can index it later."""
+    with open(PENDING_PATH, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(p, ensure_ascii=False, default=str) + "\n")
+
+
+def _claim_pending():
+    """Move the pending queue to a private file and return (that path or None, its passages).
+
+    Passages queued from now on start a new queue file, so deleting the claimed
+    file once they are indexed never drops one that was not read.
+    """
+    claimed = f"{PENDING_PATH}.{os.getpid()}-{time.time_ns()}"
+    try:
+        os.replace(PENDING_PATH, claimed)
+    except FileNotFoundError:
+        return None, []
+    with open(claimed, 'r', encoding='utf-8') as f:
+        return claimed, [json.loads(line) for line in f if line.strip()]
+
+
+def _finish_pending(claimed, requeue=()):
+    """Queue `requeue` again and delete the claimed queue file."""
+    for p in requeue:
+        queue_passage(p)
+    if claimed is not None:
+        os.remove(claimed)
+
+
+def update_tfidf(passages=None):
+    """Add passages to the existing TF-IDF index without refitting.
+
+    New documents are vectorized with the fitted vocabulary, document
+    frequencies and IDF are updated, and existing rows are re-weighted by
+    column scaling (no re-tokenization). Terms unseen at fit time are ignored
+    until the next full rebuild (a hashed index has no vocabulary, so it
+    indexes them right away), which happens automatically once the delta
+    exceeds TFIDF_REBUILD_RATIO of the base corpus. With no `passages`, the
+    pending queue is claimed and, if the update fails, queued again.
+    """
+    claimed = None
+    if passages is None:
+        claimed, passages = _claim_pending()
+    try:
+        _update_tfidf(passages)
+    except BaseException:
+        if claimed is not None:
+            _finish_pending(claimed, passages)
+        raise
+    _finish_pending(claimed)
+
+
+def _update_tfidf(passages):
+    new_docs = [p for p in passages if _indexable(p)]
+    if not new_docs:
+        return
+    if not os.path.exists(TFIDF_PATH):
+        build_tfidf()
+        return
+
+    meta = _load_meta()
+    vec, X, docs = joblib.load(TFIDF_PATH)
+    # Skip passages already indexed (queued again, or picked up by a full rebuild)
+    indexed = {str(d.get('text')) for d in docs}
+    new_docs = [d for d in {str(d['text']): d for d in new_docs}.values() if str(d['text']) not in indexed]
+    if not new_docs:
+        return
+    n_base = meta.get('n_base', X.shape[0])
+    n_delta = meta.get('n_delta', 0) + len(new_docs)
+    if n_delta > TFIDF_REBUILD_RATIO * max(1, n_base):
+        build_tfidf()
+        return
+
+    from scipy.sparse import vstack, diags
+    from sklearn.preprocessing import normalize
+
+    old_idf = vec.idf_
+    new_texts = [str(d['text']) for d in new_docs]
+    if isinstance(vec, HashingVectorizer):
+        X_new = normalize(vec.transform(new_texts).multiply(old_idf).tocsr(), norm='l2', copy=False)
+    else:
+        X_new = vec.transform(new_texts)
+    X_all = vstack([X, X_new]).tocsr()
+
+    # Recompute smoothed IDF from updated document frequencies
+    n = X_all.shape[0]
+    df = np.bincount(X_all.indices, minlength=X_all.shape[1])
+    new_idf = _smooth_idf(n, df)
+    new_idf[old_idf == 0] = 0  # hashed terms cut by MAX_DF stay cut
+    vec.idf_ = new_idf.astype(old_idf.dtype, copy=False)
+
+    # Rows are l2(tf * old_idf); rescale columns and renormalize
+    scale = np.divide(new_idf, old_idf, out=np.zeros_like(new_idf), where=old_idf > 0)
+    X_all = normalize(X_all @ diags(scale), norm='l2', copy=False)
+
+    old_tokens = _load_doc_tokens(X)
+    if old_tokens is not None:
+        doc_tokens = old_tokens + doc_token_sets(new_texts)
+    else:
+        doc_tokens = doc_token_sets([d.get('text', '') for d in docs] + new_texts)
+    _dump_tfidf(vec, X_all, docs + new_docs, doc_tokens)
+    _save_meta({"n_base": n_base, "n_delta": n_delta})
+    print(f"TF-IDF index updated (+{len(new_docs)} passages).")
+
+
+def build_embeddings(passages=None):
+    """Embed `passages` (default: everything from `fetch_all_passages()`) and build the faiss index.
+
+    Passages already embedded by the previous build with the same model and
+    encoder keep their vectors; only new or changed passages are encoded.
+    """
     if not USE_EMBEDDINGS:
         print("Embeddings disabled in config.")
         return
-    try:
-        from sentence_transformers import SentenceTransformer
-    except Exception as e:
-        print("SentenceTransformer not available:", e)
+    docs = passages if passages is not None else fetch_all_passages()
+    if not docs:
+        print("No passages to embed.")
         return
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    docs = fetch_all_passages()
-    texts = [d['text'] for d in docs]
-    embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-    joblib.dump((embeddings, docs), os.path.join(DATA_DIR, "embeddings.joblib"))
+    model, encoder = _get_passage_encoder()
+    if model is None:
+        return
+    old_rows, old_vecs = _load_previous_embeddings(encoder)
+    rows = [old_rows.get(_embedding_key(d)) for d in docs]
+    new_idx = [i for i, r in enumerate(rows) if r is None]
+    reused = [i for i, r in enumerate(rows) if r is not None]
+    if new_idx:
+        fresh = model.encode([docs[i]['text'] for i in new_idx], batch_size=EMBEDDING_BATCH_SIZE,
+                             show_progress_bar=True, convert_to_numpy=True, normalize_embeddings=True)
+        embeddings = np.empty((len(docs), fresh.shape[1]), dtype=np.float32)
+        embeddings[new_idx] = fresh
+    else:
+        embeddings = np.empty((len(docs), old_vecs.shape[1]), dtype=np.float32)
+    if reused:
+        embeddings[reused] = old_vecs[[rows[i] for i in reused]]
+    print(f"Embeddings: {len(new_idx)} encoded, {len(reused)} reused.")
+    _dump_embeddings(embeddings, docs, encoder)
     # optional: build faiss index (if faiss installed)
     try:
         import faiss
-        dim = embeddings.shape[1]
-        index = faiss.IndexFlatIP(dim)
-        faiss.normalize_L2(embeddings)
-        index.add(embeddings)
-        faiss.write_index(index, os.path.join(DATA_DIR, "faiss.index"))
-        print("Faiss index built.")
+        index = _build_faiss_index(embeddings)
+        faiss.write_index(index, FAISS_PATH)
+        print(f"Faiss index built ({type(index).__name__}).")
     except Exception as e:
         print("Faiss not available:", e)
+    _reload_search()
     print("Embeddings built.")
 
 
+_PASSAGE_ENCODER = None
+
+
+def _get_passage_encoder():
+    """(encoder, kind): the int8 ONNX encoder when EMBEDDING_ONNX_PATH exists, else the
+    sentence-transformer; (None, None) if neither loads. The kind is recorded with the
+    embeddings so queries are encoded the same way."""
+    global _PASSAGE_ENCODER
+    from backend.search import get_embedding_model, ENCODER_ONNX_INT8, ENCODER_TORCH
+    if _PASSAGE_ENCODER is None and EMBEDDING_ONNX_PATH and os.path.exists(EMBEDDING_ONNX_PATH):
+        try:
+            _PASSAGE_ENCODER = (get_embedding_model(EMBEDDING_MODEL, ENCODER_ONNX_INT8), ENCODER_ONNX_INT8)
+        except Exception as e:
+            print("⚠️ ONNX encoder not available, using sentence-transformers:", e)
+    if _PASSAGE_ENCODER is not None:
+        return _PASSAGE_ENCODER
+    try:
+        # reused across builds in this process
+        return get_embedding_model(EMBEDDING_MODEL, ENCODER_TORCH), ENCODER_TORCH
+    except Exception as e:
+        print("SentenceTransformer not available:", e)
+        return None, None
+
+
+def _dump_embeddings(embeddings, docs, encoder):
+    """Save normalized embeddings as float16 .npy (memory-mapped at query time) and docs as JSON.
+
+    An int8 copy with one scale per row is saved too, for the exact scan used
+    when there is no faiss index. Every file is swapped in whole through a temp
+    file. Search reloads when the docs, meta or float16 vector file changes;
+    the vectors go last, so the final reload of a build sees all of it, meta
+    (model and encoder for queries) included.
+    """
+    tmp_path = EMB_DOCS_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(docs, f, ensure_ascii=False, default=str)
+    os.replace(tmp_path, EMB_DOCS_PATH)
+    scales = np.abs(embeddings).max(axis=1) / 127
+    scales[scales == 0] = 1
+    tmp_path = EMB_SCALE_PATH + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, scales.astype(np.float32))
+    os.replace(tmp_path, EMB_SCALE_PATH)
+    tmp_path = EMB_INT8_PATH + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, np.round(embeddings / scales[:, None]).astype(np.int8))
+    os.replace(tmp_path, EMB_INT8_PATH)
+    tmp_path = EMB_META_PATH + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"model": EMBEDDING_MODEL, "encoder": encoder, "n": len(docs)}, f)
+    os.replace(tmp_path, EMB_META_PATH)
+    tmp_path = EMB_PATH + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.save(f, embeddings.astype(np.float16))
+    os.replace(tmp_path, EMB_PATH)
+
+
+def _embedding_key(doc):
+    return str(doc.get('doc_id', '')), str(doc.get('text', ''))
+
+
+def _load_previous_embeddings(encoder):
+    """({(doc_id, text): row}, vectors) from the last build with the current model and
+    encoder kind, or ({}, None)."""
+    try:
+        with open(EMB_META_PATH, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Builds before the encoder kind was recorded always used sentence-transformers
+        if meta.get('model') != EMBEDDING_MODEL or meta.get('encoder', 'torch') != encoder:
+            return {}, None
+        with open(EMB_DOCS_PATH, 'r', encoding='utf-8') as f:
+            old_docs = json.load(f)
+        old_vecs = np.load(EMB_PATH, mmap_mode='r')
+    except Exception:
+        return {}, None
+    if old_vecs.shape[0] != len(old_docs):
+        return {}, None
+    return {_embedding_key(d): i for i, d in enumerate(old_docs)}, old_vecs
+
+
+def _build_faiss_index(embeddings):
+    """Inner-product index over L2-normalized embeddings, sized to the corpus.
+
+    Small corpora get an exact flat index; larger ones an HNSW graph (over
+    8-bit scalar-quantized vectors with FAISS_SQ8), and past FAISS_IVFPQ_MIN
+    passages a trained IVF-PQ index (sqrt(N) lists, 8-bit codes).
+    """
+    import faiss
+    n, dim = embeddings.shape
+    if n > FAISS_IVFPQ_MIN:
+        nlist = int(np.sqrt(n))
+        # PQ sub-quantizers must divide dim; aim for 4 dims each
+        m = max(d for d in range(1, dim // 4 + 1) if dim % d == 0)
+        quantizer = faiss.IndexFlatIP(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+        index.train(embeddings)
+    elif n > FAISS_HNSW_MIN:
+        if FAISS_SQ8:
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)  # per-dimension ranges of the quantizer
+        else:
+            index = faiss.IndexHNSWFlat(dim, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+    else:
+        index = faiss.IndexFlatIP(dim)
+    index.add(embeddings)
+    return index
+
+
 if __name__ == "__main__":
     build_tfidf()
     if USE_EMBEDDINGS:
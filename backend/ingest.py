@@ -22,6 +22,11 @@ try:
 except Exception:
     MONGO_AVAILABLE = False
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # target file
 LAW_FILE = LAW_FILE or "văn_bản_pháp_luật_2024.json"
 scraper_dir = Path(__file__).parent.parent / 'scraper' / 'data'
@@ -42,8 +47,10 @@ if not src.exists():
         raise SystemExit(1)
 
 print(f"Reading law file: {src}")
-text = src.read_text(encoding='utf-8')
-data = json.loads(text)
+# Decode straight from UTF-8 bytes (no intermediate str copy of the file)
+raw = src.read_bytes()
+data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+del raw
 
 # Prepare document
 doc = {
@@ -61,10 +68,10 @@ if MONGO_AVAILABLE and MONGO_URI:
         client.server_info()
         db = client[DB_NAME]
         col = db[COLLECTION]
-        # Remove old versions
-        col.delete_many({"tieu_de_luat": doc['tieu_de_luat']})
-        col.insert_one(doc)
-        print(f"Inserted into MongoDB: {DB_NAME}.{COLLECTION}")
+        # Remove old versions, store one document per article
+        from backend.db import replace_law_passages
+        n = replace_law_passages(col, doc)
+        print(f"Inserted {n} passages into MongoDB: {DB_NAME}.{COLLECTION}")
     except Exception as e:
         print("MongoDB not available or error:", e)
         MONGO_AVAILABLE = False
@@ -72,12 +79,7 @@ if MONGO_AVAILABLE and MONGO_URI:
 if not MONGO_AVAILABLE:
     # Write to TinyDB fallback
     from tinydb import TinyDB
-    from tinydb.storages import JSONStorage
-
-    class UTF8Storage(JSONStorage):
-        def __init__(self, path, **kwargs):
-            kwargs['encoding'] = 'utf-8'
-            super().__init__(path, **kwargs)
+    from backend.tinydb_storage import UTF8Storage
 
     os.makedirs(DATA_DIR, exist_ok=True)
     tiny_path = TINYDB_PATH or os.path.join(DATA_DIR, "tinydb.json")
@@ -91,12 +93,13 @@ if not MONGO_AVAILABLE:
 # Rebuild TF-IDF index
 print('Rebuilding TF-IDF index...')
 try:
-    from backend.indexer import build_tfidf, build_embeddings
-    build_tfidf()
+    from backend.indexer import fetch_all_passages, build_tfidf, build_embeddings
+    passages = fetch_all_passages()  # one DB scan shared by both indexes
+    build_tfidf(passages=passages)
     print('TF-IDF rebuild done.')
     if os.getenv('USE_EMBEDDINGS', 'False').lower() in ('true', '1', 'yes'):
         try:
-            build_embeddings()
+            build_embeddings(passages=passages)
         except Exception as e:
             print('Embeddings rebuild failed:', e)
 except Exception as e:
@@ -19,25 +19,68 @@ try:
 except Exception:
     MONGO_AVAILABLE = False
 
-from tinydb import TinyDB
-from tinydb.storages import JSONStorage
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-class UTF8Storage(JSONStorage):
-    def __init__(self, path, **kwargs):
-        kwargs['encoding'] = 'utf-8'
-        super().__init__(path, **kwargs)
+from tinydb import TinyDB, where
+from backend.tinydb_storage import UTF8Storage
 
 
 def load_json(path: Path):
     try:
-        txt = path.read_text(encoding='utf-8')
-        return json.loads(txt)
+        # Decode straight from UTF-8 bytes (no intermediate str copy of the file)
+        raw = path.read_bytes()
+        return orjson.loads(raw) if orjson is not None else json.loads(raw)
     except Exception as e:
         print(f"Skipping {path} (error reading JSON): {e}")
         return None
 
 
-def ingest_doc(doc: dict, collection=None, tiny_table=None):
+# Below this many files, process start-up costs more than parallel parsing saves
+PARALLEL_MIN_FILES = 4
+
+
+def iter_loaded(files):
+    """Yield (path, parsed JSON or None) in order; large batches are parsed in a process pool."""
+    workers = min(len(files), os.cpu_count() or 1)
+    if len(files) < PARALLEL_MIN_FILES or workers < 2:
+        for f in files:
+            yield f, load_json(f)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        # Law files are large and few: one file per task balances best
+        yield from zip(files, ex.map(load_json, files))
+
+
+# Laws queued per MongoDB flush (one delete_many + bulk inserts per flush).
+# TinyDB rewrites its whole file on every change, so it is flushed once, at the end.
+INGEST_LAW_BATCH = 100
+
+
+def flush_laws(pending: dict, collection=None, tiny_table=None) -> bool:
+    """Write the queued laws (title -> doc) to MongoDB or TinyDB and empty the queue."""
+    if not pending:
+        return True
+    try:
+        if collection is not None:
+            from backend.db import replace_laws_passages
+            replace_laws_passages(collection, list(pending.values()))
+        else:
+            # Two file writes in total: drop the old copies, append the new ones
+            tiny_table.remove(where('tieu_de_luat').one_of(list(pending)))
+            tiny_table.insert_multiple(pending.values())
+        return True
+    except Exception as e:
+        print("Mongo insert error:" if collection is not None else "TinyDB insert error:", e)
+        return False
+    finally:
+        pending.clear()
+
+
+def ingest_doc(doc: dict, pending: dict, collection=None):
     # Normalize document fields
     doc_out = {
         "tieu_de_luat": doc.get('tieu_de_luat') or doc.get('tieu_de') or doc.get('title') or 'Unnamed Law',
@@ -47,22 +90,13 @@ def ingest_doc(doc: dict, collection=None, tiny_table=None):
         "noi_dung": doc.get('noi_dung', [])
     }
 
-    if collection is not None:
-        try:
-            collection.delete_many({"tieu_de_luat": doc_out['tieu_de_luat']})
-            collection.insert_one(doc_out)
-            return True
-        except Exception as e:
-            print("Mongo insert error:", e)
-            return False
-    else:
-        try:
-            tiny_table.remove(lambda r: r.get('tieu_de_luat') == doc_out['tieu_de_luat'])
-            tiny_table.insert(doc_out)
-            return True
-        except Exception as e:
-            print("TinyDB insert error:", e)
-            return False
+    # Queued, a later copy of the same law replacing the earlier one; Mongo
+    # stores one document per article (see db.replace_laws_passages)
+    pending.pop(doc_out['tieu_de_luat'], None)
+    pending[doc_out['tieu_de_luat']] = doc_out
+    if collection is not None and len(pending) >= INGEST_LAW_BATCH:
+        return flush_laws(pending, collection=collection)
+    return True
 
 
 def main():
@@ -102,8 +136,9 @@ def main():
         print(f"Using TinyDB for ingest: {tiny_path}")
 
     processed = 0
-    for f in files:
-        d = load_json(f)
+    pending = {}  # laws waiting for the next flush
+    # Files are parsed ahead in worker processes while this loop queues and writes
+    for f, d in iter_loaded(files):
         if not d:
             continue
         # If file contains a list of documents, ingest each
@@ -111,7 +146,7 @@ def main():
             any_ok = False
             for item in d:
                 if isinstance(item, dict):
-                    ok = ingest_doc(item, collection=collection, tiny_table=tiny_table)
+                    ok = ingest_doc(item, pending, collection=collection)
                     any_ok = any_ok or ok
             if any_ok:
                 print(f"Ingested list file: {f}")
@@ -119,24 +154,37 @@ def main():
             else:
                 print(f"No suitable docs found in list file: {f}")
         elif isinstance(d, dict):
-            ok = ingest_doc(d, collection=collection, tiny_table=tiny_table)
+            ok = ingest_doc(d, pending, collection=collection)
             if ok:
                 print(f"Ingested: {f}")
                 processed += 1
         else:
             print(f"Skipping {f}: unexpected JSON root type: {type(d)}")
+    if not flush_laws(pending, collection=collection, tiny_table=tiny_table):
+        print("Some laws from the last batch were not written.")
 
     print(f"Ingested {processed}/{len(files)} files.")
 
+    if tiny_table is not None:
+        # Keyword fallback: normalize the rows and build their inverted index now,
+        # not on the first search
+        try:
+            from backend.search import save_keyword_index
+            save_keyword_index()
+            print("Keyword index saved.")
+        except Exception as e:
+            print("Keyword index build failed:", e)
+
     # Rebuild index once
     print("Rebuilding TF-IDF index...")
     try:
-        from backend.indexer import build_tfidf, build_embeddings
-        build_tfidf()
+        from backend.indexer import fetch_all_passages, build_tfidf, build_embeddings
+        passages = fetch_all_passages()  # one DB scan shared by both indexes
+        build_tfidf(passages=passages)
         print("TF-IDF rebuild done.")
         if os.getenv('USE_EMBEDDINGS', 'False').lower() in ('true', '1', 'yes'):
             try:
-                build_embeddings()
+                build_embeddings(passages=passages)
                 print('Embeddings rebuild done.')
             except Exception as e:
                 print('Embeddings rebuild failed:', e)
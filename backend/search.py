@@ -7,16 +7,19 @@ Tự động đồng bộ với cấu hình trong .env và ingest.py
 import os
 import re
 import json
+import importlib.util
+import time
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
-from tinydb import TinyDB, Query
-from config import TINYDB_PATH, DATA_DIR, MONGO_URI, DB_NAME, COLLECTION, DEFAULT_LANGUAGE
+from tinydb import TinyDB
+from config import (TINYDB_PATH, DATA_DIR, MONGO_URI, DB_NAME, COLLECTION, DEFAULT_LANGUAGE, TFIDF_INT8,
+                    FAISS_EF_SEARCH, FAISS_NPROBE, EMBEDDING_MODEL, EMBEDDING_ONNX_PATH,
+                    QUERY_EMB_CACHE_SIZE, INDEX_CHECK_SECONDS)
 
-try:
-    from pymongo import MongoClient
-    from pymongo.errors import PyMongoError
-    USE_MONGO = True
-except ImportError:
-    USE_MONGO = False
+# pymongo takes ~80 ms to import: only check it is installed here and import
+# it on the first connect_mongo() call
+USE_MONGO = importlib.util.find_spec("pymongo") is not None
 
 # ===== LOAD CONFIG =====
 load_dotenv()
@@ -30,34 +33,131 @@ COLLECTION = COLLECTION or os.getenv("MONGO_COLLECTION", "laws")
 DEFAULT_LANGUAGE = DEFAULT_LANGUAGE or os.getenv("DEFAULT_LANGUAGE", "english")
 
 
+TFIDF_PATH = os.path.join(DATA_DIR, "tfidf.joblib")
+DOC_TOKENS_PATH = os.path.join(DATA_DIR, "tfidf_doc_tokens.joblib")
+INT8_PATH = os.path.join(DATA_DIR, "tfidf_int8.joblib")
+INT8_SCALE_PATH = os.path.join(DATA_DIR, "tfidf_int8_scale.npy")
+EMB_PATH = os.path.join(DATA_DIR, "embeddings.npy")
+EMB_DOCS_PATH = os.path.join(DATA_DIR, "embeddings_docs.json")
+EMB_META_PATH = os.path.join(DATA_DIR, "embeddings_meta.json")
+EMB_INT8_PATH = os.path.join(DATA_DIR, "embeddings_int8.npy")
+EMB_SCALE_PATH = os.path.join(DATA_DIR, "embeddings_scale.npy")
+FAISS_PATH = os.path.join(DATA_DIR, "faiss.index")
+# Normalized texts + inverted index of the TinyDB rows for the keyword fallback
+KEYWORD_INDEX_PATH = os.path.join(DATA_DIR, "tinydb_keyword_index.joblib")
+
+QUERY_EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+# Encoder kinds recorded in EMB_META_PATH: queries must be embedded like the passages
+ENCODER_TORCH = "torch"
+ENCODER_ONNX_INT8 = "onnx-int8"
+
+# mtimes of the index files (path -> mtime or None if missing), re-read at most
+# every INDEX_CHECK_SECONDS instead of stat'ing them on every query
+_FILE_MTIMES = {}
+_FILE_MTIMES_AT = 0.0
+# Loaded TF-IDF index (mtime, vec, X, docs) and IDF vector, shared across queries
+_TFIDF = None
+_IDF = None
+# Optional int8 term-major copy of the doc matrix and its per-doc scales
+_INT8 = None
+_INT8_SCALE = None
+# Encoders, loaded once per process ((model name, encoder kind) -> model)
+_EMB_MODELS = {}
+_EMB_MODELS_LOCK = threading.Lock()
+# Recent query embeddings, least recently used first: (model name, encoder kind, query) -> float32 vector
+_QUERY_EMB_CACHE = OrderedDict()
+_QUERY_EMB_CACHE_LOCK = threading.Lock()
+# Serializes index (re)loads so concurrent first requests load the files once
+_INDEX_LOAD_LOCK = threading.Lock()
+# Loaded passage embeddings (mtimes, emb_vecs, docs, faiss index or None, model name, encoder kind)
+_EMB = None
+# int8 copy of the embeddings and per-row scales for the exact scan, or None
+_EMB_INT8 = None
+# Rows of the float16 embedding matrix upcast to float32 at a time when scanning
+EMB_SCAN_BLOCK = 65536
+# (law title lowercased, article number) -> indices of the TF-IDF docs of that
+# article, from each passage's `dieu_so` field: (docs, index, law titles)
+_ARTICLE_INDEX = None
+_ARTICLE_QUERY_RE = re.compile(r"\b[Đd]i[eêề]u\s*\.?\s*(\d+)\b", re.IGNORECASE)
+# Normalized token set per TF-IDF doc, precomputed by the indexer or filled in as
+# docs are ranked: (docs, [frozenset or None])
+_DOC_TOKENS = None
+# TinyDB "laws" rows for the keyword fallback:
+# (mtime, rows, normalized text per row or None, inverted index or None)
+_KEYWORD_ROWS = None
+# Mongo collection for keyword search, connected once per process (pymongo pools
+# the sockets); while Mongo is down, reconnects are retried at most every
+# MONGO_RETRY_SECONDS instead of paying the selection timeout on every query
+_MONGO_COL = None
+_MONGO_LOCK = threading.Lock()
+_MONGO_RETRY_AT = 0.0
+MONGO_RETRY_SECONDS = 30
+
+
 # ===================== HELPER =====================
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_VI_TOKENIZER = False  # pyvi ViTokenizer, None if unavailable; False until first use
+
+
+def _vi_tokenizer():
+    global _VI_TOKENIZER
+    if _VI_TOKENIZER is False:
+        try:
+            from pyvi import ViTokenizer
+            _VI_TOKENIZER = ViTokenizer
+        except Exception:
+            _VI_TOKENIZER = None
+    return _VI_TOKENIZER
+
+
 def normalize_text(text: str):
     """Chuẩn hóa text để tìm kiếm: bỏ dấu câu, viết thường"""
     if not text:
         return ""
     # Try to use pyvi ViTokenizer for better Vietnamese tokenization if available
-    try:
-        from pyvi import ViTokenizer
-        tokenized = ViTokenizer.tokenize(text)
-        # remove punctuation and lower
-        return re.sub(r"[^\w\s]", "", tokenized.lower())
-    except Exception:
-        # fallback: remove punctuation and lowercase
-        return re.sub(r"[^\w\s]", "", text.lower())
+    tokenizer = _vi_tokenizer()
+    if tokenizer is not None:
+        try:
+            # remove punctuation and lower
+            return _PUNCT_RE.sub("", tokenizer.tokenize(text).lower())
+        except Exception:
+            pass
+    # fallback: remove punctuation and lowercase
+    return _PUNCT_RE.sub("", text.lower())
 
 
 def connect_mongo():
-    """Kết nối MongoDB"""
-    try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
-        # Use the configured DB_NAME and COLLECTION variables
-        db = client[DB_NAME]
-        col = db[COLLECTION]
-        client.admin.command("ping")
-        return col
-    except Exception as e:
-        print(f"⚠️ MongoDB không khả dụng ({e}), fallback TinyDB.")
+    """Kết nối MongoDB (một client dùng chung cho mọi truy vấn)"""
+    global _MONGO_COL, _MONGO_RETRY_AT
+    if _MONGO_COL is not None or not USE_MONGO:
+        return _MONGO_COL
+    if time.monotonic() < _MONGO_RETRY_AT:
         return None
+    with _MONGO_LOCK:
+        if _MONGO_COL is not None:
+            return _MONGO_COL
+        if time.monotonic() < _MONGO_RETRY_AT:
+            return None
+        client = None
+        try:
+            from pymongo import MongoClient
+            client = MongoClient(MONGO_URI, maxPoolSize=50, serverSelectionTimeoutMS=2000)
+            client.admin.command("ping")
+            # Use the configured DB_NAME and COLLECTION variables
+            col = client[DB_NAME][COLLECTION]
+            # $text needs the text index; without it every query errors out on a fresh database
+            try:
+                from backend.db import ensure_indexes
+                ensure_indexes(col)
+            except Exception as e:
+                print("⚠️ MongoDB index error:", e)
+            _MONGO_COL = col
+        except Exception as e:
+            if client is not None:
+                client.close()
+            _MONGO_RETRY_AT = time.monotonic() + MONGO_RETRY_SECONDS
+            print(f"⚠️ MongoDB không khả dụng ({e}), fallback TinyDB.")
+    return _MONGO_COL
 
 
 # ===================== SEARCH CORE =====================
@@ -68,6 +168,7 @@ def search_keyword(query, limit=10):
 
     # --- MongoDB search ---
     if mongo_col is not None:   # <-- sửa ở đây
+        from pymongo.errors import PyMongoError
         try:
             results = mongo_col.find(
                 {"$text": {"$search": q_norm}},
@@ -78,111 +179,558 @@ def search_keyword(query, limit=10):
             print("⚠️ Mongo search error:", e)
 
     # --- Fallback TinyDB search (use unified TINYDB_PATH with UTF-8) ---
-    from tinydb.storages import JSONStorage
-
-    class UTF8Storage(JSONStorage):
-        def __init__(self, path, **kwargs):
-            kwargs['encoding'] = 'utf-8'
-            super().__init__(path, **kwargs)
-
-    db = TinyDB(TINYDB_PATH, storage=UTF8Storage)
-    table = db.table("laws")
-    q = Query()
-    data = table.all()
+    data, norms, inv = _keyword_rows()
     results = []
 
-    for item in data:
-        text = " ".join(
-            [item.get("tieu_de_luat", ""), json.dumps(item.get("noi_dung", ""), ensure_ascii=False)]
-        )
-        if q_norm in normalize_text(text):
-            results.append(item)
+    for i in _keyword_candidates(q_norm, inv, len(data)):
+        norm = norms[i]
+        if norm is None:
+            # Normalized once per row and file version, on first use
+            norm = norms[i] = normalize_text(_keyword_text(data[i]))
+        if q_norm in norm:
+            results.append(data[i])
             if len(results) >= limit:
                 break
 
     return results
+
+
+def _keyword_text(item):
+    """Text of a TinyDB "laws" row that the keyword fallback matches against."""
+    return " ".join([item.get("tieu_de_luat", ""), json.dumps(item.get("noi_dung", ""), ensure_ascii=False)])
+
+
+def build_keyword_index(norms):
+    """Inverted index (token -> ascending row ids) over normalized row texts."""
+    inv = {}
+    for i, norm in enumerate(norms):
+        for t in set(norm.split()):
+            inv.setdefault(t, []).append(i)
+    return inv
+
+
+def _keyword_candidates(q_norm, inv, n):
+    """Row ids, in row order, that can contain `q_norm` as a substring.
+
+    Inner query tokens must be whole tokens of the row; the first and last
+    may be cut (the row token ends / starts with them), so they match every
+    vocabulary term that does. Without an index every row is a candidate.
+    """
+    q_tokens = q_norm.split()
+    if inv is None or not q_tokens:
+        return range(n)
+    if len(q_tokens) == 1:
+        t = q_tokens[0]
+        reqs = [[ids for term, ids in inv.items() if t in term]]
+    else:
+        first, last = q_tokens[0], q_tokens[-1]
+        reqs = [[inv.get(t, ())] for t in q_tokens[1:-1]]
+        reqs.append([ids for term, ids in inv.items() if term.endswith(first)])
+        reqs.append([ids for term, ids in inv.items() if term.startswith(last)])
+    # Smallest set first, so the intersection shrinks early
+    sets = sorted((set().union(*postings) for postings in reqs), key=len)
+    return sorted(sets[0].intersection(*sets[1:]))
+
+
+def _keyword_rows():
+    """TinyDB "laws" rows, their normalized texts (or None) and inverted index (or None),
+    re-read only when the file changes.
+
+    The ingest script saves texts and index next to TinyDB (`save_keyword_index`);
+    when that file is missing or stale, the index is built here on first use.
+    """
+    global _KEYWORD_ROWS
+    mtime = _mtime(TINYDB_PATH)
+    if _KEYWORD_ROWS is None or _KEYWORD_ROWS[0] != mtime:
+        from backend.tinydb_storage import UTF8Storage
+        # Read-only: the search path never creates or writes the file
+        rows = TinyDB(TINYDB_PATH, storage=UTF8Storage, access_mode='r').table("laws").all()
+        norms, inv = [None] * len(rows), None
+        saved = _load_keyword_index(mtime, len(rows))
+        if saved is not None:
+            norms, inv = saved['norms'], saved['inv']
+        _KEYWORD_ROWS = (mtime, rows, norms, inv)
+    mtime, rows, norms, inv = _KEYWORD_ROWS
+    if inv is None and rows:
+        for i, norm in enumerate(norms):
+            if norm is None:
+                norms[i] = normalize_text(_keyword_text(rows[i]))
+        inv = build_keyword_index(norms)
+        _KEYWORD_ROWS = (mtime, rows, norms, inv)
+    return rows, norms, inv
+
+
+def _load_keyword_index(mtime, n):
+    """The saved keyword index if it was built from this version of the TinyDB file."""
+    if mtime is None or not os.path.exists(KEYWORD_INDEX_PATH):
+        return None
+    try:
+        import joblib
+        saved = joblib.load(KEYWORD_INDEX_PATH)
+    except Exception as e:
+        print("⚠️ Keyword index unreadable, rebuilding:", e)
+        return None
+    if saved.get('mtime') != mtime or saved.get('n') != n:
+        return None
+    return saved
+
+
+def save_keyword_index():
+    """Normalize the TinyDB rows and write their inverted index; run after ingesting."""
+    import joblib
+    reload_models()  # stamp the index with the file just written, not a cached mtime
+    rows, norms, inv = _keyword_rows()
+    mtime = _KEYWORD_ROWS[0]
+    if mtime is None:
+        return
+    joblib.dump({'mtime': mtime, 'n': len(rows), 'norms': norms, 'inv': inv}, KEYWORD_INDEX_PATH)
+
+
 # ===================== ADVANCED RETRIEVAL (TF-IDF / Embeddings) =====================
+def _mtime(path):
+    """mtime of an index file (None if missing), cached for INDEX_CHECK_SECONDS."""
+    global _FILE_MTIMES, _FILE_MTIMES_AT
+    now = time.monotonic()
+    if now - _FILE_MTIMES_AT >= INDEX_CHECK_SECONDS:
+        _FILE_MTIMES, _FILE_MTIMES_AT = {}, now
+    mtimes = _FILE_MTIMES
+    if path not in mtimes:
+        try:
+            mtimes[path] = os.path.getmtime(path)
+        except OSError:
+            mtimes[path] = None
+    return mtimes[path]
+
+
+def reload_models():
+    """Look at the index files again on the next query (call after rebuilding them)."""
+    global _FILE_MTIMES_AT
+    _FILE_MTIMES_AT = 0.0
+
+
+def load_tfidf():
+    """Load (vec, X, docs) once and reuse it; reload only when the file changes."""
+    global _TFIDF, _IDF, _INT8, _INT8_SCALE
+    mtime = _mtime(TFIDF_PATH)
+    if mtime is None:
+        raise FileNotFoundError(TFIDF_PATH)
+    if _TFIDF is None or _TFIDF[0] != mtime:
+        with _INDEX_LOAD_LOCK:
+            if _TFIDF is None or _TFIDF[0] != mtime:  # another thread may have loaded it
+                import joblib
+                import numpy as np
+                # Arrays (including the CSR data/indices/indptr) are memory-mapped, so
+                # worker processes share the OS page cache instead of private copies
+                vec, X, docs = joblib.load(TFIDF_PATH, mmap_mode='r')
+                # IDF from the same bundle, so it always matches X
+                _IDF = np.asarray(vec.idf_, dtype=np.float32)
+                _INT8 = _INT8_SCALE = None
+                if TFIDF_INT8 and os.path.exists(INT8_PATH) and os.path.exists(INT8_SCALE_PATH):
+                    XqT = joblib.load(INT8_PATH, mmap_mode='r')
+                    if XqT.shape == (X.shape[1], X.shape[0]):
+                        _INT8, _INT8_SCALE = XqT, np.load(INT8_SCALE_PATH)
+                _TFIDF = (mtime, vec, X, docs)
+    return _TFIDF[1:]
+
+
+def load_embeddings():
+    """Load (emb_vecs, docs, index) once and reuse it; reload only when the files change.
+
+    `emb_vecs` is the normalized float16 matrix, memory-mapped so the OS page
+    cache owns it. `index` is the faiss index built by `build_embeddings()`, or
+    None if faiss or the index file is unavailable (callers then scan `emb_vecs`).
+    """
+    global _EMB, _EMB_INT8
+    # The meta names the model and encoder queries are embedded with: reload with it too
+    mtimes = (_mtime(EMB_PATH), _mtime(EMB_DOCS_PATH), _mtime(FAISS_PATH), _mtime(EMB_META_PATH))
+    for path, mtime in zip((EMB_PATH, EMB_DOCS_PATH), mtimes):
+        if mtime is None:
+            raise FileNotFoundError(path)
+    if _EMB is None or _EMB[0] != mtimes:
+        with _INDEX_LOAD_LOCK:
+            if _EMB is None or _EMB[0] != mtimes:  # another thread may have loaded it
+                import numpy as np
+                emb_vecs = np.load(EMB_PATH, mmap_mode='r')
+                with open(EMB_DOCS_PATH, 'r', encoding='utf-8') as f:
+                    docs = json.load(f)
+                if emb_vecs.shape[0] != len(docs):
+                    raise ValueError("embeddings and embedding docs are out of sync; rebuild embeddings")
+                index = None
+                if mtimes[2] is not None:
+                    try:
+                        import faiss
+                        index = faiss.read_index(FAISS_PATH)
+                        if index.ntotal != len(docs):
+                            index = None
+                        elif hasattr(index, 'hnsw'):
+                            index.hnsw.efSearch = FAISS_EF_SEARCH
+                        elif hasattr(index, 'nprobe'):
+                            index.nprobe = FAISS_NPROBE
+                    except Exception as e:
+                        print("⚠️ Faiss index not loaded:", e)
+                        index = None
+                _EMB_INT8 = None
+                if index is None and os.path.exists(EMB_INT8_PATH) and os.path.exists(EMB_SCALE_PATH):
+                    q_vecs = np.load(EMB_INT8_PATH, mmap_mode='r')
+                    scales = np.load(EMB_SCALE_PATH)
+                    if q_vecs.shape == emb_vecs.shape and scales.shape[0] == q_vecs.shape[0]:
+                        _EMB_INT8 = (q_vecs, scales)
+                model_name, encoder = EMBEDDING_MODEL, ENCODER_TORCH
+                try:
+                    with open(EMB_META_PATH, 'r', encoding='utf-8') as f:
+                        meta = json.load(f)
+                    model_name = meta.get('model') or EMBEDDING_MODEL
+                    encoder = meta.get('encoder') or ENCODER_TORCH
+                except (OSError, ValueError):
+                    pass
+                _EMB = (mtimes, emb_vecs, docs, index, model_name, encoder)
+    return _EMB[1:4]
+
+
+def embedding_encoder():
+    """(model name, encoder kind) the passage embeddings were built with (queries must use the same)."""
+    load_embeddings()
+    return _EMB[4:6]
+
+
+def scan_embeddings(emb_vecs, q_emb, scales=None):
+    """Cosine scores of every passage: `emb_vecs` (normalized float16) against normalized `q_emb`.
+
+    `q_emb` is one vector (dim,) or a batch of columns (dim, n). With `scales`,
+    `emb_vecs` is the int8 copy and row i is scaled by `scales[i]` (half the
+    bytes of float16, and cheaper to upcast). Only one block of rows is upcast
+    to float32 at a time.
+    """
+    import numpy as np
+    q_emb = np.asarray(q_emb, dtype=np.float32)
+    blocks = []
+    for i in range(0, emb_vecs.shape[0], EMB_SCAN_BLOCK):
+        sims = np.asarray(emb_vecs[i:i + EMB_SCAN_BLOCK], dtype=np.float32) @ q_emb
+        if scales is not None:
+            block_scales = scales[i:i + EMB_SCAN_BLOCK]
+            sims *= block_scales if sims.ndim == 1 else block_scales[:, None]
+        blocks.append(sims)
+    return np.concatenate(blocks)
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first: O(N) selection, then sort only those."""
+    import numpy as np
+    if k < len(scores):
+        idxs = np.argpartition(-scores, k)[:k]
+        return idxs[np.argsort(-scores[idxs])]
+    return np.argsort(-scores)
+
+
+def semantic_search(Q, k):
+    """Top-k passages (cosine > 0.1) for each row of the normalized query matrix `Q` (n, dim)."""
+    import numpy as np
+    emb_vecs, docs, index = load_embeddings()
+    if index is not None:
+        # Index holds L2-normalized vectors, so inner product == cosine
+        D, I = index.search(np.ascontiguousarray(Q, dtype=np.float32), k)
+        return [[{"score": float(s), **docs[i]} for s, i in zip(d, ix) if i >= 0 and s > 0.1]
+                for d, ix in zip(D, I)]
+    # (n_docs, n): one GEMM for the whole batch
+    if _EMB_INT8 is not None:
+        S = scan_embeddings(_EMB_INT8[0], np.asarray(Q).T, _EMB_INT8[1])
+    else:
+        S = scan_embeddings(emb_vecs, np.asarray(Q).T)
+    results = []
+    for sims in S.T:
+        idxs = top_k_indices(sims, k)
+        results.append([{"score": float(sims[i]), **docs[i]} for i in idxs if sims[i] > 0.1])
+    return results
+
+
+class OnnxEncoder:
+    """Int8 ONNX Runtime stand-in for `SentenceTransformer.encode` (mean pooling, as all-MiniLM-*)."""
+
+    def __init__(self, onnx_path):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+        # The tokenizer is saved next to the model by tools/export_onnx.py
+        self.tokenizer = AutoTokenizer.from_pretrained(os.path.dirname(onnx_path))
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider")
+                     if p in ort.get_available_providers()]
+        self.session = ort.InferenceSession(onnx_path, providers=providers)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=64, show_progress_bar=False, convert_to_numpy=True,
+               normalize_embeddings=True):
+        import numpy as np
+        out = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(texts[start:start + batch_size], padding=True, truncation=True,
+                                 max_length=256, return_tensors="np")
+            feed = {k: v.astype(np.int64) for k, v in enc.items() if k in self.input_names}
+            tokens = self.session.run(None, feed)[0]  # (batch, seq, dim)
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            vecs = (tokens * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            if normalize_embeddings:
+                vecs /= np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12
+            out.append(vecs.astype(np.float32))
+            if show_progress_bar:
+                print(f"  encoded {min(start + batch_size, len(texts))}/{len(texts)}")
+        return np.concatenate(out)
+
+
+def get_embedding_model(name=QUERY_EMBEDDING_MODEL, encoder=ENCODER_TORCH):
+    """Load an encoder on first use and reuse it (one instance per model name and kind).
+
+    `ENCODER_ONNX_INT8` is the int8 export of EMBEDDING_MODEL at
+    EMBEDDING_ONNX_PATH (tools/export_onnx.py); anything else a sentence-transformer.
+    """
+    key = (name, encoder)
+    model = _EMB_MODELS.get(key)
+    if model is None:
+        with _EMB_MODELS_LOCK:
+            model = _EMB_MODELS.get(key)
+            if model is None:
+                if encoder == ENCODER_ONNX_INT8:
+                    model = OnnxEncoder(EMBEDDING_ONNX_PATH)
+                else:
+                    from sentence_transformers import SentenceTransformer
+                    model = SentenceTransformer(name)
+                _EMB_MODELS[key] = model
+    return model
+
+
+def encode_queries(queries, batch_size=32, model_name=QUERY_EMBEDDING_MODEL, encoder=ENCODER_TORCH):
+    """L2-normalized float32 embeddings (n, dim) of `queries`.
+
+    Queries embedded recently come from an LRU cache (`QUERY_EMB_CACHE_SIZE`);
+    the rest are encoded together in one `model.encode` call.
+    """
+    import numpy as np
+    queries = list(queries)
+    if not queries or QUERY_EMB_CACHE_SIZE <= 0:
+        embs = get_embedding_model(model_name, encoder).encode(queries, batch_size=batch_size,
+                                                      convert_to_numpy=True, normalize_embeddings=True)
+        return np.asarray(embs, dtype=np.float32)
+
+    out = [None] * len(queries)
+    missing = {}  # query -> positions in `queries`
+    with _QUERY_EMB_CACHE_LOCK:
+        for i, q in enumerate(queries):
+            key = (model_name, encoder, q)
+            emb = _QUERY_EMB_CACHE.get(key)
+            if emb is None:
+                missing.setdefault(q, []).append(i)
+            else:
+                _QUERY_EMB_CACHE.move_to_end(key)
+                out[i] = emb
+    if missing:
+        embs = get_embedding_model(model_name, encoder).encode(list(missing), batch_size=batch_size,
+                                                      convert_to_numpy=True, normalize_embeddings=True)
+        embs = np.asarray(embs, dtype=np.float32)
+        with _QUERY_EMB_CACHE_LOCK:
+            for (q, positions), emb in zip(missing.items(), embs):
+                # Own copy: a row view would keep the whole batch array alive
+                emb = emb.copy()
+                for i in positions:
+                    out[i] = emb
+                _QUERY_EMB_CACHE[(model_name, encoder, q)] = emb
+            while len(_QUERY_EMB_CACHE) > QUERY_EMB_CACHE_SIZE:
+                _QUERY_EMB_CACHE.popitem(last=False)
+    return np.stack(out)
+
+
+def vectorize_queries(vec, queries):
+    """TF-IDF query vectors as raw term counts times the cached IDF, l2-normalized."""
+    from sklearn.feature_extraction.text import CountVectorizer
+    from sklearn.preprocessing import normalize
+    if hasattr(vec, 'vocabulary_'):
+        tf = CountVectorizer.transform(vec, queries)
+    else:
+        # Hashed index (TFIDF_HASHING): the vectorizer is stateless and returns raw counts
+        tf = vec.transform(queries)
+    return normalize(tf.multiply(_IDF).tocsr(), norm='l2', copy=False)
+
+
+def score_tfidf(X, Q):
+    """Cosine scores of every doc against each query row of Q, shape (n_docs, n_queries).
+
+    Uses the int8 index when it is enabled and loaded: every query is quantized
+    with its own scale and the whole batch is scored with one sparse product
+    against the term-major int8 matrix (only the query terms' rows are read,
+    accumulated in int32), then dequantized.
+    """
+    if _INT8 is None:
+        return (X @ Q.T).toarray()
+    import numpy as np
+    Q = Q.tocsr()
+    q_scale = np.zeros(Q.shape[0], dtype=np.float32)
+    nonempty = np.diff(Q.indptr) > 0
+    q_scale[nonempty] = np.maximum.reduceat(Q.data, Q.indptr[:-1][nonempty]) / 127
+    Qq = Q.copy()
+    Qq.data = np.round(Q.data / np.repeat(q_scale, np.diff(Q.indptr))).astype(np.int32)
+    acc = (Qq @ _INT8).toarray()  # (n_queries, n_docs) int32
+    return acc.T.astype(np.float32) * _INT8_SCALE[:, None] * q_scale[None, :]
+
+
+def _rank_tfidf(query, scores, docs, k):
+    """Blend normalized TF-IDF scores with query-token overlap and return the top-k docs.
+
+    Scores stay in a dense array; candidates are visited in descending TF-IDF
+    order and the scan stops once even a full token match (+0.3) could not
+    beat the current k-th best, so only the top-k docs are copied into dicts.
+    """
+    import heapq
+    import numpy as np
+
+    scores = np.asarray(scores, dtype=np.float64).ravel()
+    # Normalize TF-IDF scores
+    if scores.max() > 0:
+        norm_scores = scores / (scores.max() + 1e-12)
+    else:
+        norm_scores = scores
+
+    # compute keyword-match score to boost exact matches
+    q_norm = normalize_text(query)
+    q_tokens = frozenset(q_norm.split())
+    doc_tokens = _doc_token_sets(docs)
+
+    pos = np.flatnonzero(norm_scores > 0)
+    # stable sort: ties keep document order, as in the full sort below
+    order = pos[np.argsort(-norm_scores[pos], kind='stable')]
+
+    ranked = []  # (final_score, doc index)
+    best = []    # min-heap of the k best final scores so far
+    for i in order.tolist():
+        s = float(norm_scores[i])
+        if len(best) >= k and 0.7 * s + 0.3 < best[0]:
+            break
+        if q_tokens:
+            text_tokens = doc_tokens[i]
+            if text_tokens is None:
+                text_tokens = doc_tokens[i] = frozenset(normalize_text(docs[i].get('text') or '').split())
+            # fraction of query tokens present in doc
+            match_frac = len(q_tokens & text_tokens) / len(q_tokens)
+        else:
+            match_frac = 0.0
+        # final score: weighted sum (70% tfidf + 30% match)
+        final_score = 0.7 * s + 0.3 * float(match_frac)
+        ranked.append((final_score, i))
+        if len(best) < k:
+            heapq.heappush(best, final_score)
+        elif final_score > best[0]:
+            heapq.heapreplace(best, final_score)
+
+    ranked.sort(key=lambda x: (-x[0], x[1]))
+    out = []
+    for final_score, i in ranked[:k]:
+        doc = docs[i].copy()
+        doc['score'] = float(final_score)
+        out.append(doc)
+    return out
+
+
+def _doc_token_sets(docs):
+    """Normalized token sets of `docs`, from the indexer's tfidf_doc_tokens.joblib when it
+    matches the loaded index, else a memo filled as docs are ranked; reset when another
+    index is loaded."""
+    global _DOC_TOKENS
+    if _DOC_TOKENS is None or _DOC_TOKENS[0] is not docs:
+        tokens = None
+        if _TFIDF is not None and _TFIDF[3] is docs and os.path.exists(DOC_TOKENS_PATH):
+            X = _TFIDF[2]
+            try:
+                import joblib
+                saved = joblib.load(DOC_TOKENS_PATH)
+                if saved.get('n') == X.shape[0] and saved.get('nnz') == X.nnz:
+                    tokens = list(saved['tokens'])
+            except Exception as e:
+                print("⚠️ Precomputed doc tokens not loaded:", e)
+        _DOC_TOKENS = (docs, tokens if tokens is not None else [None] * len(docs))
+    return _DOC_TOKENS[1]
+
+
+def article_index(docs):
+    """Map (law title lowercased, article number) -> doc indices for `docs`, built once per loaded index.
+
+    Only the passage's own `dieu_so` counts: "Điều N" mentioned in a title or
+    text (amendments citing other articles) is not an article of that law.
+    Returns (index, law titles in order of first appearance).
+    """
+    global _ARTICLE_INDEX
+    if _ARTICLE_INDEX is None or _ARTICLE_INDEX[0] is not docs:
+        index = {}
+        for i, d in enumerate(docs):
+            try:
+                no = int(d['dieu_so'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            index.setdefault(((d.get('title') or '').lower(), no), []).append(i)
+        titles = list(dict.fromkeys(title for title, _ in index))
+        _ARTICLE_INDEX = (docs, index, titles)
+    return _ARTICLE_INDEX[1:]
+
+
+def lookup_article(docs, query, k=10):
+    """Passages of the article named in `query` ("Điều 42"), restricted to the laws
+    whose title the query mentions (all laws if it names none); [] if none found."""
+    m = _ARTICLE_QUERY_RE.search(query)
+    if not m:
+        return []
+    no = int(m.group(1))
+    index, titles = article_index(docs)
+    q_lower = query.lower()
+    named = [t for t in titles if t and t in q_lower]
+    out = []
+    for title in named or titles:
+        for i in index.get((title, no), ()):
+            doc = docs[i].copy()
+            doc['score'] = 1.0
+            out.append(doc)
+            if len(out) >= k:
+                return out
+    return out
+
+
+def search_article(query, k=10):
+    """Exact lookup of the article named in `query` in the TF-IDF docs; [] if none is named or found."""
+    if not _ARTICLE_QUERY_RE.search(query) or _mtime(TFIDF_PATH) is None:
+        return []
+    _, _, docs = load_tfidf()
+    return lookup_article(docs, query, k)
+
+
 def retrieve(query, k=10, mode=None):
     """
     Hàm trung tâm: thử tìm theo embeddings (nếu có),
     rồi TF-IDF, cuối cùng fallback về keyword.
     """
     try:
-        from sklearn.metrics.pairwise import cosine_similarity
         import joblib
         import numpy as np
     except ImportError:
         return search_keyword(query, k)
 
-    # Đường dẫn model
-    TFIDF_PATH = os.path.join(DATA_DIR, "tfidf.joblib")
-    EMB_PATH = os.path.join(DATA_DIR, "embeddings.joblib")
-
-    # If mode requests article search, try fast article lookup
+    # If mode requests article search, try the exact article lookup first
     if mode and str(mode).lower() in ("article", "by_article", "dieu"):
-        # try to extract article number
-        m = re.search(r"\b[Đd]i[eê]u\s*\.?\s*(\d+)\b", query)
-        if m:
-            article_no = m.group(1)
-            # scan passages/docs for 'Điều {n}'
-            passages = fetch_all_passages() if 'fetch_all_passages' in globals() else []
-            res = []
-            for p in passages:
-                sec = (p.get('section') or '') + ' ' + (p.get('title') or '')
-                if f"Điều {article_no}" in sec or f"Điều{article_no}" in sec:
-                    p['score'] = 1.0
-                    res.append(p)
+        try:
+            res = search_article(query, k)
             if res:
-                return res[:k]
+                return res
+        except Exception as e:
+            print("⚠️ Article lookup error:", e)
     # Ưu tiên semantic search
-    if os.path.exists(EMB_PATH):
+    if _mtime(EMB_PATH) is not None:
         try:
-            from sentence_transformers import SentenceTransformer
-            emb_vecs, docs = joblib.load(EMB_PATH)
-            model = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
-            q_emb = model.encode([query], convert_to_numpy=True)
-            sims = cosine_similarity(q_emb, emb_vecs)[0]
-            idxs = np.argsort(-sims)[:k]
-            return [{"score": float(sims[i]), **docs[i]} for i in idxs if sims[i] > 0.1]
+            # Queries are embedded with the passages' model and encoder (batched callers use retrieve_batch)
+            model_name, encoder = embedding_encoder()
+            return semantic_search(encode_queries([query], model_name=model_name, encoder=encoder), k)[0]
         except Exception as e:
             print("⚠️ Semantic retrieval error:", e)
 
     # TF-IDF search (improved ranking with keyword matching)
-    if os.path.exists(TFIDF_PATH):
+    if _mtime(TFIDF_PATH) is not None:
         try:
-            vec, X, docs = joblib.load(TFIDF_PATH)
-            qv = vec.transform([query])
-            scores = (X @ qv.T).toarray().ravel()
-            # Normalize TF-IDF scores
-            if scores.max() > 0:
-                norm_scores = scores / (scores.max() + 1e-12)
-            else:
-                norm_scores = scores
-
-            # compute keyword-match score to boost exact matches
-            q_norm = normalize_text(query)
-            q_tokens = set(q_norm.split())
-
-            ranked = []
-            for i, s in enumerate(norm_scores):
-                if s <= 0:
-                    continue
-                doc = docs[i].copy()
-                text = (doc.get('text') or '')
-                text_norm = normalize_text(text)
-                text_tokens = set(text_norm.split())
-                # fraction of query tokens present in doc
-                if q_tokens:
-                    match_frac = sum(1 for t in q_tokens if t in text_tokens) / len(q_tokens)
-                else:
-                    match_frac = 0.0
-                # final score: weighted sum (70% tfidf + 30% match)
-                final_score = 0.7 * float(s) + 0.3 * float(match_frac)
-                doc['score'] = float(final_score)
-                ranked.append((final_score, doc))
-
-            ranked.sort(key=lambda x: x[0], reverse=True)
-            res = [d for _, d in ranked[:k]]
+            vec, X, docs = load_tfidf()
+            qv = vectorize_queries(vec, [query])
+            scores = score_tfidf(X, qv).ravel()
+            res = _rank_tfidf(query, scores, docs, k)
             if res:
                 return res
         except Exception as e:
@@ -195,6 +743,50 @@ def retrieve(query, k=10, mode=None):
     return search_keyword(query, k)
 
 
+def retrieve_batch(queries, k=10, mode=None):
+    """
+    Truy vấn nhiều câu hỏi cùng lúc: vector hóa cả batch và tính điểm TF-IDF
+    bằng một phép nhân ma trận thưa duy nhất. Kết quả giống hệt `retrieve`
+    gọi riêng từng câu; các chế độ không batch được sẽ gọi `retrieve` từng câu.
+    """
+    if not queries:
+        return []
+    try:
+        import joblib
+    except ImportError:
+        return [retrieve(q, k, mode) for q in queries]
+
+    # Article lookup is a per-query path
+    if mode and str(mode).lower() in ("article", "by_article", "dieu"):
+        return [retrieve(q, k, mode) for q in queries]
+
+    # Semantic search: one encode call and one index search / GEMM for the batch
+    if _mtime(EMB_PATH) is not None:
+        try:
+            model_name, encoder = embedding_encoder()
+            return semantic_search(encode_queries(queries, model_name=model_name, encoder=encoder), k)
+        except Exception as e:
+            print("⚠️ Semantic batch retrieval error:", e)
+            return [retrieve(q, k, mode) for q in queries]
+
+    if _mtime(TFIDF_PATH) is None:
+        return [retrieve(q, k, mode) for q in queries]
+
+    try:
+        vec, X, docs = load_tfidf()
+        Q = vectorize_queries(vec, queries)
+        S = score_tfidf(X, Q)  # (n_docs, n_queries)
+    except Exception as e:
+        print("⚠️ TF-IDF batch retrieval error:", e)
+        return [retrieve(q, k, mode) for q in queries]
+
+    results = []
+    for j, q in enumerate(queries):
+        res = _rank_tfidf(q, S[:, j], docs, k)
+        results.append(res if res else search_keyword(q, k))
+    return results
+
+
 # ===================== TEST =====================
 if __name__ == "__main__":
     print("=" * 60)
@@ -0,0 +1,270 @@
+# file: backend/semantic_cache.py
+"""In-process semantic cache for composed chatbot answers.
+
+Paraphrased questions ("Tôi có được mua đất nông nghiệp không?" vs "Mình muốn
+mua đất nông nghiệp, được không?") embed to nearly the same vector, so the
+answer composed for one can be served for the other without re-running
+retrieval and composition. Entries live in a fixed-size matrix of normalized
+query embeddings and, once full, the least recently used slot is overwritten.
+Small caches are searched with one inner-product scan; past
+`SEMANTIC_CACHE_LSH_MIN` entries only the entries sharing a random-hyperplane
+LSH bucket with the query are scored, so lookups stay fast as the cache grows.
+The cache is cleared whenever the TF-IDF index file changes.
+
+`FuzzyQueryCache` sits in front of it and needs no model: re-asking the same
+question with a typo fixed or a trailing "?" added hits an exact lookup on the
+normalized text, or a 64-bit SimHash of its character trigrams within a small
+Hamming distance, before any embedding is computed. Diacritics are kept: in
+Vietnamese a tone mark changes the word ("thuê" rent vs "thuế" tax).
+"""
+import os
+import re
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from backend import search
+from backend.batcher import embed_query
+from config import (SEMANTIC_CACHE, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE,
+                    SEMANTIC_CACHE_LSH_MIN, SEMANTIC_CACHE_LSH_BITS, SEMANTIC_CACHE_LSH_TABLES,
+                    FUZZY_CACHE, FUZZY_CACHE_SIZE, FUZZY_CACHE_MAX_HAMMING)
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def _index_version():
+    """mtime of the TF-IDF index; cached answers are only valid for one index build."""
+    try:
+        return os.path.getmtime(search.TFIDF_PATH)
+    except OSError:
+        return None
+
+
+class SemanticCache:
+    """Cosine-similarity cache: normalized query embedding -> cached value."""
+
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, max_entries: int = SEMANTIC_CACHE_SIZE,
+                 lsh_min: int = SEMANTIC_CACHE_LSH_MIN, lsh_bits: int = SEMANTIC_CACHE_LSH_BITS,
+                 lsh_tables: int = SEMANTIC_CACHE_LSH_TABLES):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.lsh_min = lsh_min
+        self.lsh_bits = lsh_bits
+        self.lsh_tables = lsh_tables
+        self._planes = None           # (tables * bits, dim) random hyperplanes, drawn on first put
+        self._powers = 1 << np.arange(lsh_bits, dtype=np.int64)
+        self._lock = threading.Lock()
+        self._clear(None)
+
+    def _clear(self, version):
+        self._vecs = None             # (max_entries, dim) float32, allocated on first put
+        self._ns = np.full(self.max_entries, -1, dtype=np.int64)
+        self._last_used = np.zeros(self.max_entries, dtype=np.int64)
+        self._values = [None] * self.max_entries
+        self._ns_ids = {}             # namespace -> int id
+        self._keys = np.zeros((self.max_entries, self.lsh_tables), dtype=np.int64)
+        self._buckets = [{} for _ in range(self.lsh_tables)]  # per table: bucket key -> set of slots
+        self._size = 0
+        self._tick = 0
+        self._version = version
+
+    def _check_version(self):
+        """Drop all entries if the index was rebuilt since they were cached."""
+        version = _index_version()
+        if version != self._version:
+            self._clear(version)
+
+    def _lsh_keys(self, emb):
+        """One bucket key per table: the sign bits of `emb` against that table's hyperplanes."""
+        bits = (self._planes @ emb > 0).reshape(self.lsh_tables, self.lsh_bits)
+        return bits.astype(np.int64) @ self._powers
+
+    def _candidates(self, emb):
+        """Slots sharing at least one LSH bucket with `emb`."""
+        slots = set()
+        for table, key in zip(self._buckets, self._lsh_keys(emb).tolist()):
+            slots.update(table.get(key, ()))
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    def embed(self, query: str):
+        """Normalized float32 embedding of `query`; concurrent calls share one encode batch."""
+        return embed_query(query)
+
+    def get(self, emb, namespace):
+        """Cached value for the most similar query in `namespace`, or None."""
+        with self._lock:
+            self._check_version()
+            ns_id = self._ns_ids.get(namespace)
+            if ns_id is None or self._size == 0:
+                return None
+            if self._size >= self.lsh_min:
+                slots = self._candidates(emb)
+                if slots.size == 0:
+                    return None
+                vecs, ns = self._vecs[slots], self._ns[slots]
+            else:
+                slots = None
+                vecs, ns = self._vecs[:self._size], self._ns[:self._size]
+            sims = vecs @ emb
+            sims[ns != ns_id] = -1.0
+            i = int(np.argmax(sims))
+            if sims[i] < self.threshold:
+                return None
+            best = int(slots[i]) if slots is not None else i
+            self._tick += 1
+            self._last_used[best] = self._tick
+            return self._values[best]
+
+    def put(self, emb, namespace, value):
+        """Store `value` for `emb`, evicting the least recently used entry when full."""
+        with self._lock:
+            self._check_version()
+            if self._vecs is None:
+                self._vecs = np.zeros((self.max_entries, emb.shape[0]), dtype=np.float32)
+                rng = np.random.default_rng(0)
+                self._planes = rng.standard_normal((self.lsh_tables * self.lsh_bits, emb.shape[0])).astype(np.float32)
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+                for table, key in zip(self._buckets, self._keys[slot].tolist()):
+                    table[key].discard(slot)
+            keys = self._lsh_keys(emb)
+            for table, key in zip(self._buckets, keys.tolist()):
+                table.setdefault(key, set()).add(slot)
+            self._keys[slot] = keys
+            ns_id = self._ns_ids.setdefault(namespace, len(self._ns_ids))
+            self._tick += 1
+            self._vecs[slot] = emb
+            self._ns[slot] = ns_id
+            self._last_used[slot] = self._tick
+            self._values[slot] = value
+
+
+def _normalize(q: str) -> str:
+    """NFC, lowercase, punctuation dropped and whitespace collapsed."""
+    q = unicodedata.normalize("NFC", q or "").lower()
+    return " ".join(_PUNCT_RE.sub(" ", q).split())
+
+
+_BIT_WEIGHTS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little")
+
+
+def _simhash(norm: str) -> int:
+    """64-bit SimHash over the character trigrams of a normalized (NFC, diacritics kept) query."""
+    text = f" {norm} "
+    grams = {text[i:i + 3] for i in range(max(1, len(text) - 2))}
+    digests = b"".join(hashlib.blake2b(g.encode("utf-8"), digest_size=8).digest() for g in grams)
+    bits = _BIT_WEIGHTS[np.frombuffer(digests, dtype=np.uint8)].reshape(len(grams), 64)
+    votes = bits.sum(axis=0, dtype=np.int32) * 2 > len(grams)
+    return int.from_bytes(np.packbits(votes, bitorder="little").tobytes(), "little")
+
+
+class FuzzyQueryCache:
+    """Normalized-text and SimHash cache: near-identical query text -> cached value.
+
+    Numbers are part of the key, so "Điều 5" never matches "Điều 6" however
+    close their signatures are.
+    """
+
+    def __init__(self, max_entries: int = FUZZY_CACHE_SIZE, max_hamming: int = FUZZY_CACHE_MAX_HAMMING):
+        self.max_entries = max(1, max_entries)
+        self.max_hamming = max_hamming
+        # Pigeonhole: signatures within `max_hamming` bits agree on at least one of
+        # `max_hamming + 1` bands, so only entries sharing a band are compared.
+        self._bands = max_hamming + 1
+        self._band_bits = 64 // self._bands
+        self._lock = threading.Lock()
+        self._clear(None)
+
+    def _clear(self, version):
+        self._entries = OrderedDict()   # (namespace, normalized query) -> (signature, value)
+        self._band_index = [{} for _ in range(self._bands)]  # per band: (namespace, band value) -> set of keys
+        self._version = version
+
+    def _band_keys(self, namespace, sig):
+        mask = (1 << self._band_bits) - 1
+        return [(namespace, (sig >> (b * self._band_bits)) & mask) for b in range(self._bands)]
+
+    def _key(self, norm, namespace):
+        return (namespace, tuple(_DIGITS_RE.findall(norm))), norm
+
+    def get(self, query: str, namespace):
+        """Cached value for the same or a near-duplicate query in `namespace`, or None."""
+        norm = _normalize(query)
+        ns, _ = key = self._key(norm, namespace)
+        with self._lock:
+            version = _index_version()
+            if version != self._version:
+                self._clear(version)
+                return None
+            hit = self._entries.get(key)
+            if hit is None:
+                sig = _simhash(norm)
+                candidates = set()
+                for index, band in zip(self._band_index, self._band_keys(ns, sig)):
+                    candidates.update(index.get(band, ()))
+                best = None
+                for cand in candidates:
+                    dist = (self._entries[cand][0] ^ sig).bit_count()
+                    if dist <= self.max_hamming and (best is None or dist < best[0]):
+                        best = (dist, cand)
+                if best is None:
+                    return None
+                key = best[1]
+                hit = self._entries[key]
+            self._entries.move_to_end(key)
+            return hit[1]
+
+    def put(self, query: str, namespace, value):
+        """Store `value` for `query`, evicting the least recently used entry when full."""
+        norm = _normalize(query)
+        ns, _ = key = self._key(norm, namespace)
+        sig = _simhash(norm)
+        with self._lock:
+            version = _index_version()
+            if version != self._version:
+                self._clear(version)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._unindex(key, old[0])
+            elif len(self._entries) >= self.max_entries:
+                old_key, (old_sig, _) = self._entries.popitem(last=False)
+                self._unindex(old_key, old_sig)
+            self._entries[key] = (sig, value)
+            for index, band in zip(self._band_index, self._band_keys(ns, sig)):
+                index.setdefault(band, set()).add(key)
+
+    def _unindex(self, key, sig):
+        for index, band in zip(self._band_index, self._band_keys(key[0], sig)):
+            keys = index.get(band)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[band]
+
+
+# Global instances
+_semantic_cache = None
+_fuzzy_cache = FuzzyQueryCache() if FUZZY_CACHE else None
+_disabled = not SEMANTIC_CACHE
+
+def get_semantic_cache():
+    """Get the global semantic cache, or None if disabled or sentence-transformers is missing."""
+    global _semantic_cache, _disabled
+    if _semantic_cache is None and not _disabled:
+        try:
+            search.get_embedding_model()
+            _semantic_cache = SemanticCache()
+        except Exception as e:
+            print("⚠️ Semantic cache disabled:", e)
+            _disabled = True
+    return _semantic_cache
+
+
+def get_fuzzy_cache():
+    """Get the global normalized/SimHash query cache, or None if disabled."""
+    return _fuzzy_cache
@@ -0,0 +1,59 @@
+# file: backend/tinydb_storage.py
+"""UTF-8 TinyDB storage backed by orjson.
+
+TinyDB's JSONStorage goes through the stdlib `json` module and, by default,
+escapes every Vietnamese character as `\\uXXXX`. This storage reads and writes
+raw UTF-8 bytes with orjson (falling back to `json` if it is not installed),
+so the TinyDB fallback loads and saves large law documents several times
+faster and the file stays readable. Existing escaped files load unchanged.
+"""
+import json
+import os
+from typing import Any, Dict, Optional
+from tinydb.storages import Storage, touch
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _loads(raw: bytes):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _dumps(data) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+class UTF8Storage(Storage):
+    """Drop-in replacement for JSONStorage(encoding='utf-8')."""
+
+    def __init__(self, path: str, create_dirs: bool = False, access_mode: str = "r+", **kwargs):
+        super().__init__()
+        self.path = path
+        self._writable = any(c in access_mode for c in ("+", "w", "a"))
+        if self._writable:
+            touch(path, create_dirs=create_dirs)
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        try:
+            with open(self.path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return None
+        # Empty file: let TinyDB initialize the database
+        return _loads(raw) if raw.strip() else None
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        if not self._writable:
+            raise IOError(f"Cannot write to the database {self.path}: opened read-only")
+        # Write a temp file and swap it in, so readers never see a half-written file
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_dumps(data))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
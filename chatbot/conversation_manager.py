@@ -14,6 +14,42 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from collections import defaultdict
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Redis sessions expire after this many seconds of inactivity
+SESSION_TTL = int(os.getenv("SESSION_TTL", 24 * 3600))
+# Session files: new messages are appended to <id>.jsonl; the full <id>.json
+# snapshot is rewritten (and the log emptied) every this many messages
+SESSION_SNAPSHOT_EVERY = int(os.getenv("SESSION_SNAPSHOT_EVERY", 20))
+
+
+def _dumps(obj, indent: bool = False) -> bytes:
+    """UTF-8 JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def _loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+# Detect topics based on keywords
+_TOPIC_KEYWORDS = {
+    "đất": ["đất", "land", "thửa", "mảnh"],
+    "quyền": ["quyền", "rights", "chủ quyền"],
+    "luật": ["luật", "pháp luật", "law", "legal"],
+    "mua bán": ["mua", "bán", "chuyển nhượng", "buy", "sell"],
+    "cho thuê": ["thuê", "khoán", "rent", "lease"],
+    "xây dựng": ["xây", "dựng", "construct", "building"],
+    "bồi thường": ["bồi", "thường", "compensation"],
+    "vi phạm": ["vi phạm", "violation", "infringement"]
+}
+
 
 class ConversationManager:
     """Quản lý lịch sử và context của cuộc trò chuyện"""
@@ -23,8 +59,15 @@ class ConversationManager:
         self.conversations_dir = os.path.join(data_dir, "conversations")
         os.makedirs(self.conversations_dir, exist_ok=True)
         
-        # Conversation sessions in memory (session_id -> conversation_data)
+        # Conversation sessions in memory (session_id -> conversation_data).
+        # When Redis is reachable sessions live there instead, so that all
+        # worker processes share them (see _get_redis), and nothing is kept here:
+        # a local copy would go stale as other workers add turns.
         self.active_sessions = {}
+        # user_id -> session_ids of in-memory sessions (Redis keeps a set per user)
+        self._by_user = defaultdict(list)
+        self._redis = None
+        self._redis_checked = False
     
     def create_session(self, user_id: str, session_name: str = "") -> str:
         """Tạo session trò chuyện mới"""
@@ -42,7 +85,19 @@ class ConversationManager:
             "summary": ""
         }
         
-        self.active_sessions[session_id] = session
+        r = self._get_redis()
+        if r is None:
+            self.active_sessions[session_id] = session
+            self._by_user[user_id].append(session_id)
+        else:
+            try:
+                key = self._user_key(user_id)
+                pipe = r.pipeline()
+                pipe.sadd(key, session_id)
+                pipe.expire(key, SESSION_TTL)
+                pipe.execute()
+            except Exception as e:
+                print(f"⚠️ Redis session write error: {e}")
         self._save_session(session)
         
         return session_id
@@ -50,10 +105,10 @@ class ConversationManager:
     def add_message(self, session_id: str, role: str, content: str, 
                    metadata: Dict = None) -> Dict:
         """Thêm message vào conversation"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return {"error": "Session not found"}
         
-        session = self.active_sessions[session_id]
         
         message = {
             "timestamp": datetime.now().isoformat(),
@@ -64,16 +119,16 @@ class ConversationManager:
         }
         
         session["messages"].append(message)
-        self._save_session(session)
+        self._save_message(session, message)
         
         return message
     
     def get_context_window(self, session_id: str, window_size: int = 5) -> Dict:
         """Lấy context từ những messages trước đó"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return {}
         
-        session = self.active_sessions[session_id]
         messages = session["messages"]
         
         # Lấy last N messages
@@ -99,27 +154,27 @@ class ConversationManager:
     
     def update_session_context(self, session_id: str, context_key: str, context_value):
         """Update context key trong session"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return
         
-        session = self.active_sessions[session_id]
         session["context"][context_key] = context_value
         self._save_session(session)
     
     def is_follow_up(self, session_id: str) -> bool:
         """Check if current query là follow-up question"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return False
         
-        session = self.active_sessions[session_id]
         return len(session["messages"]) > 2  # Có ít nhất 1 pair Q&A trước đó
     
     def get_last_bot_answer(self, session_id: str) -> Optional[str]:
         """Lấy câu trả lời cuối cùng của bot"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return None
         
-        session = self.active_sessions[session_id]
         for msg in reversed(session["messages"]):
             if msg["role"] == "bot":
                 return msg["content"]
@@ -128,19 +183,29 @@ class ConversationManager:
     
     def get_previous_queries(self, session_id: str, limit: int = 5) -> List[str]:
         """Lấy các query trước đó"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return []
         
-        session = self.active_sessions[session_id]
-        queries = [msg["content"] for msg in session["messages"] if msg["role"] == "user"]
-        return queries[-limit:]
+        if limit <= 0:
+            queries = [msg["content"] for msg in session["messages"] if msg["role"] == "user"]
+            return queries[-limit:]
+        # Walk back from the newest message and stop after `limit` user turns
+        queries = []
+        for msg in reversed(session["messages"]):
+            if msg["role"] == "user":
+                queries.append(msg["content"])
+                if len(queries) == limit:
+                    break
+        queries.reverse()
+        return queries
     
     def generate_session_summary(self, session_id: str) -> str:
         """Tạo tóm tắt session"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return ""
         
-        session = self.active_sessions[session_id]
         messages = session["messages"]
         
         # Tạo tóm tắt dựa trên user questions
@@ -160,10 +225,10 @@ class ConversationManager:
     
     def tag_session(self, session_id: str, tag: str):
         """Thêm tag cho session (để phân loại)"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return
         
-        session = self.active_sessions[session_id]
         if tag not in session["tags"]:
             session["tags"].append(tag)
             self._save_session(session)
@@ -172,21 +237,13 @@ class ConversationManager:
                             tag: str = "", limit: int = 10) -> List[Dict]:
         """Tìm kiếm conversations"""
         results = []
+        keyword_lower = keyword.lower()
         
-        for session in self.active_sessions.values():
-            if session["user_id"] != user_id:
-                continue
-            
+        for session in self._iter_user_sessions(user_id):
             # Filter by keyword
-            if keyword:
-                keyword_lower = keyword.lower()
-                found = False
-                for msg in session["messages"]:
-                    if keyword_lower in msg["content"].lower():
-                        found = True
-                        break
-                if not found:
-                    continue
+            if keyword_lower and not any(keyword_lower in msg["content"].lower()
+                                         for msg in session["messages"]):
+                continue
             
             # Filter by tag
             if tag and tag not in session["tags"]:
@@ -200,15 +257,17 @@ class ConversationManager:
                 "tags": session["tags"],
                 "message_count": len(session["messages"])
             })
+            if len(results) >= limit:
+                break
         
-        return results[:limit]
+        return results
     
     def get_conversation_stats(self, session_id: str) -> Dict:
         """Lấy thống kê của session"""
-        if session_id not in self.active_sessions:
+        session = self._get_session(session_id)
+        if session is None:
             return {}
         
-        session = self.active_sessions[session_id]
         messages = session["messages"]
         
         user_msgs = [m for m in messages if m["role"] == "user"]
@@ -231,28 +290,10 @@ class ConversationManager:
     
     def _extract_topics(self, messages: List[Dict]) -> List[str]:
         """Extract topics từ messages"""
-        topics = set()
-        
-        for msg in messages:
-            content_lower = msg["content"].lower()
-            
-            # Detect topics based on keywords
-            topic_keywords = {
-                "đất": ["đất", "land", "thửa", "mảnh"],
-                "quyền": ["quyền", "rights", "chủ quyền"],
-                "luật": ["luật", "pháp luật", "law", "legal"],
-                "mua bán": ["mua", "bán", "chuyển nhượng", "buy", "sell"],
-                "cho thuê": ["thuê", "khoán", "rent", "lease"],
-                "xây dựng": ["xây", "dựng", "construct", "building"],
-                "bồi thường": ["bồi", "thường", "compensation"],
-                "vi phạm": ["vi phạm", "violation", "infringement"]
-            }
-            
-            for topic, keywords in topic_keywords.items():
-                if any(kw in content_lower for kw in keywords):
-                    topics.add(topic)
-        
-        return list(topics)
+        # All messages lowercased once; keywords never contain a newline
+        text = "\n".join(msg["content"] for msg in messages).lower()
+        return [topic for topic, keywords in _TOPIC_KEYWORDS.items()
+                if any(kw in text for kw in keywords)]
     
     def _detect_continuity(self, messages: List[Dict]) -> bool:
         """Detect if messages are continuous (related)"""
@@ -288,22 +329,174 @@ class ConversationManager:
         else:
             return f"{int(duration / 3600)} giờ"
     
+    def _get_redis(self):
+        """Lazily connect to Redis; returns None (in-memory mode) if unavailable"""
+        if self._redis_checked:
+            return self._redis
+        self._redis_checked = True
+        try:
+            import redis
+            from config import REDIS_URL
+            r = redis.Redis.from_url(REDIS_URL, socket_timeout=0.2, socket_connect_timeout=0.2)
+            r.ping()
+            self._redis = r
+        except Exception as e:
+            print(f"⚠️ Redis session store not available, using in-memory sessions: {e}")
+            self._redis = None
+        return self._redis
+
+    @staticmethod
+    def _redis_key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    def _get_session(self, session_id: str) -> Optional[Dict]:
+        """Lấy session từ Redis hoặc bộ nhớ, rồi từ file (snapshot + log)"""
+        if not session_id:
+            return None
+        r = self._get_redis()
+        if r is not None:
+            try:
+                fields = r.hgetall(self._redis_key(session_id))
+                if b"meta" in fields:
+                    session = _loads(fields.pop(b"meta"))
+                    turns = sorted(fields.items(), key=lambda kv: int(kv[0].split(b":", 1)[1]))
+                    session["messages"] = [_loads(v) for _, v in turns]
+                    return session
+            except Exception as e:
+                print(f"⚠️ Redis session read error: {e}")
+                return self._load_session(session_id)
+            # Expired (SESSION_TTL) or never in Redis: the files hold the full history
+            session = self._load_session(session_id)
+            if session is not None:
+                self._restore_redis(r, session)
+            return session
+
+        session = self.active_sessions.get(session_id)
+        if session is None:
+            # Restore sessions persisted before a restart
+            session = self._load_session(session_id)
+            if session is not None:
+                self.active_sessions[session_id] = session
+                self._by_user[session["user_id"]].append(session_id)
+        return session
+
+    def _restore_redis(self, r, session: Dict):
+        """Ghi lại toàn bộ session (meta + mọi turn) vào Redis sau khi hash đã hết hạn"""
+        try:
+            key = self._redis_key(session["session_id"])
+            user_key = self._user_key(session["user_id"])
+            meta = {k: v for k, v in session.items() if k != "messages"}
+            pipe = r.pipeline()
+            pipe.hset(key, mapping={"meta": _dumps(meta),
+                                    **{f"turn:{m['message_id']}": _dumps(m) for m in session["messages"]}})
+            pipe.expire(key, SESSION_TTL)
+            pipe.sadd(user_key, session["session_id"])
+            pipe.expire(user_key, SESSION_TTL)
+            pipe.execute()
+        except Exception as e:
+            print(f"⚠️ Redis session write error: {e}")
+
+    @staticmethod
+    def _user_key(user_id: str) -> str:
+        return f"user_sessions:{user_id}"
+
+    def _iter_user_sessions(self, user_id: str):
+        """Duyệt sessions của một user (chỉ các session của user đó)"""
+        r = self._get_redis()
+        if r is None:
+            session_ids = list(self._by_user.get(user_id, ()))
+        else:
+            try:
+                session_ids = sorted(s.decode() for s in r.smembers(self._user_key(user_id)))
+            except Exception as e:
+                print(f"⚠️ Redis session read error: {e}")
+                session_ids = []
+        for session_id in session_ids:
+            session = self._get_session(session_id)
+            if session is not None and session["user_id"] == user_id:
+                yield session
+
+    def _save_message(self, session: Dict, message: Dict):
+        """Lưu một turn mới (Redis: ghi đồng bộ một field của hash trước khi trả lời)"""
+        r = self._get_redis()
+        if r is not None:
+            try:
+                key = self._redis_key(session["session_id"])
+                pipe = r.pipeline()
+                pipe.hset(key, f"turn:{message['message_id']}", _dumps(message))
+                pipe.expire(key, SESSION_TTL)
+                pipe.execute()
+            except Exception as e:
+                print(f"⚠️ Redis session write error: {e}")
+        if len(session["messages"]) % SESSION_SNAPSHOT_EVERY == 0:
+            self._save_session_file(session)
+        else:
+            self._append_message_file(session, message)
+
     def _save_session(self, session: Dict):
-        """Lưu session vào file"""
+        """Lưu session (metadata vào Redis nếu có, toàn bộ vào file)"""
+        r = self._get_redis()
+        if r is not None:
+            try:
+                key = self._redis_key(session["session_id"])
+                meta = {k: v for k, v in session.items() if k != "messages"}
+                pipe = r.pipeline()
+                pipe.hset(key, "meta", _dumps(meta))
+                pipe.expire(key, SESSION_TTL)
+                pipe.execute()
+            except Exception as e:
+                print(f"⚠️ Redis session write error: {e}")
+        self._save_session_file(session)
+
+    def _session_paths(self, session_id: str):
+        base = os.path.join(self.conversations_dir, session_id)
+        return base + ".json", base + ".jsonl"
+
+    def _save_session_file(self, session: Dict):
+        """Lưu snapshot đầy đủ của session vào file và xóa log các message đã nằm trong snapshot"""
+        try:
+            session_file, log_file = self._session_paths(session['session_id'])
+            tmp_file = session_file + ".tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(_dumps(session, indent=True))
+            os.replace(tmp_file, session_file)
+            if os.path.exists(log_file):
+                os.remove(log_file)
+        except Exception as e:
+            print(f"⚠️ Error saving session: {e}")
+
+    def _append_message_file(self, session: Dict, message: Dict):
+        """Ghi thêm một message vào log của session (không ghi lại toàn bộ session)"""
         try:
-            session_file = os.path.join(self.conversations_dir, f"{session['session_id']}.json")
-            with open(session_file, 'w', encoding='utf-8') as f:
-                json.dump(session, f, ensure_ascii=False, indent=2)
+            _, log_file = self._session_paths(session['session_id'])
+            with open(log_file, 'ab') as f:
+                f.write(_dumps(message) + b"\n")
         except Exception as e:
             print(f"⚠️ Error saving session: {e}")
     
     def _load_session(self, session_id: str) -> Optional[Dict]:
-        """Load session từ file"""
+        """Load session từ file (snapshot, rồi các message trong log)"""
         try:
-            session_file = os.path.join(self.conversations_dir, f"{session_id}.json")
-            if os.path.exists(session_file):
-                with open(session_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            session_file, log_file = self._session_paths(session_id)
+            if not os.path.exists(session_file):
+                return None
+            with open(session_file, 'rb') as f:
+                session = _loads(f.read())
+            if os.path.exists(log_file):
+                last_id = session["messages"][-1]["message_id"] if session["messages"] else 0
+                with open(log_file, 'rb') as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        try:
+                            message = _loads(line)
+                        except ValueError:
+                            break  # torn last line
+                        # Messages already in the snapshot may still be in the log
+                        if message["message_id"] > last_id:
+                            session["messages"].append(message)
+                            last_id = message["message_id"]
+            return session
         except Exception as e:
             print(f"⚠️ Error loading session: {e}")
         return None
@@ -316,6 +509,9 @@ class ConversationManager:
             created_at = datetime.fromisoformat(session["created_at"])
             if created_at < cutoff_date:
                 del self.active_sessions[session_id]
+                user_sessions = self._by_user.get(session["user_id"])
+                if user_sessions and session_id in user_sessions:
+                    user_sessions.remove(session_id)
 
 
 # Global instance
@@ -10,10 +10,79 @@ Tính năng:
 
 import json
 import os
+import atexit
+import functools
+import gzip
+import heapq
+import io
+import queue
+import threading
+import time
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from collections import defaultdict, Counter
+from itertools import chain
+from uuid import uuid4
 import re
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Queued feedback is applied in batches of up to this many items...
+FEEDBACK_BATCH_SIZE = 100
+# ...or whatever arrived within this many seconds of the first item
+FEEDBACK_BATCH_WAIT = 0.05
+# New interactions and feedback are appended to an NDJSON log; it is folded into
+# the JSON snapshot once it holds more records than this fraction of the
+# interactions (and at least LOG_COMPACT_MIN records)
+LOG_COMPACT_RATIO = 0.25
+LOG_COMPACT_MIN = 100
+# feedback_stats / patterns / synonyms are rewritten at most every SAVE_INTERVAL
+# seconds or SAVE_MAX_PENDING changes (and at exit); the interaction log is
+# still appended on every change
+SAVE_INTERVAL = 2.0
+SAVE_MAX_PENDING = 100
+# Answers kept per learned pattern (oldest dropped first)
+PATTERN_MAX_ANSWERS = 20
+# export_learned_data writes gzip-compressed JSON at this level
+EXPORT_GZIP_LEVEL = 6
+
+
+def _dumps(obj, indent: bool = False) -> bytes:
+    """UTF-8 JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+        return orjson.dumps(obj, option=option)
+    return json.dumps(obj, ensure_ascii=False, indent=2 if indent else None).encode('utf-8')
+
+
+def _loads(raw):
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+# Stand-in for tokens with no learned pattern
+_NO_PATTERN = {"frequency": 0}
+
+# Bỏ các ký tự đặc biệt nhưng giữ từ
+_NORM_RE = re.compile(r'[^\w\sàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ]')
+# Bỏ các stop words phổ biến
+_STOP_WORDS = frozenset({'các', 'và', 'hay', 'là', 'được', 'để', 'trong', 'ở', 'về', 'từ', 'với',
+                         'như', 'cái', 'cái gì', 'gì', 'ai', 'không', 'có', 'bạn', 'tôi', 'mình'})
+
+
+@functools.lru_cache(maxsize=4096)
+def _normalize(query: str) -> str:
+    """Viết thường, bỏ ký tự đặc biệt (memoised: the same query is tokenized per call site)."""
+    return _NORM_RE.sub('', query.lower()).strip()
+
+
+@functools.lru_cache(maxsize=4096)
+def _tokens(text: str) -> Tuple[str, ...]:
+    """Từ của text (bỏ stop words và từ <= 2 ký tự)."""
+    return tuple(t for t in _normalize(text).split() if t not in _STOP_WORDS and len(t) > 2)
 
 
 class LearningEngine:
@@ -22,16 +91,100 @@ class LearningEngine:
     def __init__(self, data_dir: str = "data"):
         self.data_dir = data_dir
         self.learning_file = os.path.join(data_dir, "learned_interactions.json")
+        self.learning_log = os.path.join(data_dir, "learned_interactions.ndjson")
         self.patterns_file = os.path.join(data_dir, "learned_patterns.json")
         self.synonyms_file = os.path.join(data_dir, "learned_synonyms.json")
         self.feedback_file = os.path.join(data_dir, "feedback_stats.json")
         
         os.makedirs(data_dir, exist_ok=True)
         
-        # Tải dữ liệu hiện có
-        self.interactions = self._load_json(self.learning_file, [])
-        self.patterns = self._load_json(self.patterns_file, {})
+        # Guards in-memory state and file writes shared with the feedback worker
+        self._lock = threading.RLock()
+        self._feedback_queue = queue.SimpleQueue()
+        self._feedback_worker = None
+        # File path -> attribute holding its data, for files with unsaved changes
+        self._dirty = {}
+        self._pending_changes = 0
+        self._last_save = time.monotonic()
+        atexit.register(self.flush)
+        
+        # Dữ liệu trên đĩa được tải khi truy cập lần đầu (xem __getattr__)
+    
+    # Attributes loaded from disk on first access -> the loader that sets them
+    _LAZY_ATTRS = {
+        **dict.fromkeys(("interactions", "_log_records", "_learned_tokens", "_token_index",
+                         "_learned_len", "_positions", "_rating_sum", "_rating_count"),
+                        "_load_interaction_state"),
+        "patterns": "_load_patterns",
+        "_pattern_answers": "_load_patterns",
+        "synonyms": "_load_synonyms",
+        "feedback_stats": "_load_feedback_stats",
+    }
+    
+    def __getattr__(self, name):
+        # Only called for attributes not set yet: load their group once, under the lock
+        loader = type(self)._LAZY_ATTRS.get(name)
+        if loader is None:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        with self._lock:
+            if name not in self.__dict__:
+                getattr(self, loader)()
+        return self.__dict__[name]
+    
+    def _load_interaction_state(self):
+        """Tải interactions và dựng các index trên chúng"""
+        self._log_records = 0
+        interactions = self._load_interactions()
+        
+        # Built in locals and published at the end, interactions last: lock-free
+        # readers either see complete indexes or fall into __getattr__ and wait
+        learned_tokens = {}
+        postings = defaultdict(set)
+        learned_len = np.zeros(max(64, len(interactions)), dtype=np.int32)
+        positions = {}
+        rating_sum = rating_count = 0
+        for pos, inter in enumerate(interactions):
+            positions.setdefault(inter["id"], pos)
+            rating = inter.get("rating", 0)
+            if rating > 0:
+                rating_sum += rating
+                rating_count += 1
+            # Chỉ lấy những câu trả lời được đánh giá tốt
+            tokens = frozenset(inter.get("query_tokens", [])) if rating >= 4 else frozenset()
+            if tokens:
+                learned_tokens[pos] = tokens
+                learned_len[pos] = len(tokens)
+                for token in tokens:
+                    postings[token].add(pos)
+        
+        # Inverted index over well-rated interactions (rating >= 4), so similar-answer
+        # lookups only score interactions sharing a token with the query.
+        # Values are replaced, never mutated, so readers need no lock.
+        self._learned_tokens = learned_tokens  # position in self.interactions -> frozenset of query tokens
+        self._token_index = {token: frozenset(p) for token, p in postings.items()}  # token -> frozenset of positions
+        # Token count per position (0 when not learned), for vectorized Jaccard; set
+        # before a position is added to _token_index (and zeroed only after it is
+        # removed), so every position a reader finds is in range
+        self._learned_len = learned_len
+        # Interaction id -> position (first one wins, as the old linear scan did), and
+        # the running sum/count of positive ratings behind feedback_stats["avg_rating"]
+        self._positions = positions
+        self._rating_sum = rating_sum
+        self._rating_count = rating_count
+        self.interactions = interactions
+        if self._log_records is None:
+            self.compact()
+    
+    def _load_patterns(self):
+        patterns = self._load_json(self.patterns_file, {})
+        # token -> set of its pattern's answers, for O(1) duplicate checks
+        self._pattern_answers = {token: set(p.get("answers", ())) for token, p in patterns.items()}
+        self.patterns = patterns
+    
+    def _load_synonyms(self):
         self.synonyms = self._load_json(self.synonyms_file, {})
+    
+    def _load_feedback_stats(self):
         self.feedback_stats = self._load_json(self.feedback_file, {
             "total_interactions": 0,
             "positive_feedback": 0,
@@ -40,12 +193,18 @@ class LearningEngine:
             "most_asked": []
         })
     
+    def _count_rating(self, rating, sign: int):
+        """Add (sign=1) or remove (sign=-1) a rating from the running average"""
+        if rating > 0:
+            self._rating_sum += sign * rating
+            self._rating_count += sign
+    
     def _load_json(self, filepath: str, default=None):
         """Load JSON file or return default"""
         try:
             if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                with open(filepath, 'rb') as f:
+                    return _loads(f.read())
         except Exception as e:
             print(f"⚠️ Error loading {filepath}: {e}")
         return default if default is not None else {}
@@ -53,11 +212,88 @@ class LearningEngine:
     def _save_json(self, filepath: str, data):
         """Save data to JSON file"""
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            with open(filepath, 'wb') as f:
+                f.write(_dumps(data))
         except Exception as e:
             print(f"⚠️ Error saving {filepath}: {e}")
     
+    def _load_interactions(self) -> List[Dict]:
+        """Snapshot, then the records appended to the log since it was written"""
+        interactions = self._load_json(self.learning_file, [])
+        if not os.path.exists(self.learning_log):
+            return interactions
+        by_id = {inter["id"]: inter for inter in interactions}
+        try:
+            with open(self.learning_log, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = _loads(line)
+                    except ValueError:
+                        # Torn last line: rewrite the snapshot so appends do not follow it
+                        self._log_records = None
+                        break
+                    self._log_records += 1
+                    if "add" in record:
+                        inter = record["add"]
+                        # Already in the snapshot if a compaction was interrupted
+                        if inter["id"] not in by_id:
+                            by_id[inter["id"]] = inter
+                            interactions.append(inter)
+                    elif "feedback" in record:
+                        patch = record["feedback"]
+                        inter = by_id.get(patch["id"])
+                        if inter is not None:
+                            inter.update(patch)
+        except Exception as e:
+            print(f"⚠️ Error loading {self.learning_log}: {e}")
+        return interactions
+    
+    def _append_log(self, records: List[Dict]):
+        """Ghi thêm các record vào log (không ghi lại toàn bộ interactions)"""
+        try:
+            with open(self.learning_log, 'ab') as f:
+                f.write(b"".join(_dumps(r) + b"\n" for r in records))
+        except Exception as e:
+            print(f"⚠️ Error saving {self.learning_log}: {e}")
+            return
+        self._log_records += len(records)
+        if self._log_records > max(LOG_COMPACT_MIN, len(self.interactions) * LOG_COMPACT_RATIO):
+            self.compact()
+    
+    def compact(self):
+        """Ghi snapshot đầy đủ của interactions và xóa log"""
+        with self._lock:
+            try:
+                tmp_file = self.learning_file + ".tmp"
+                with open(tmp_file, 'wb') as f:
+                    f.write(_dumps(self.interactions))
+                os.replace(tmp_file, self.learning_file)
+                if os.path.exists(self.learning_log):
+                    os.remove(self.learning_log)
+                self._log_records = 0
+            except Exception as e:
+                print(f"⚠️ Error saving {self.learning_file}: {e}")
+    
+    def _mark_dirty(self, filepath: str, attr: str):
+        """Ghi nhận file cần lưu; chỉ ghi khi đủ thời gian hoặc đủ số thay đổi"""
+        with self._lock:
+            self._dirty[filepath] = attr
+            self._pending_changes += 1
+            if (self._pending_changes >= SAVE_MAX_PENDING
+                    or time.monotonic() - self._last_save >= SAVE_INTERVAL):
+                self.flush()
+    
+    def flush(self):
+        """Ghi ngay mọi file còn thay đổi chưa lưu"""
+        with self._lock:
+            for filepath, attr in self._dirty.items():
+                self._save_json(filepath, getattr(self, attr))
+            self._dirty.clear()
+            self._pending_changes = 0
+            self._last_save = time.monotonic()
+    
     def record_interaction(self, query: str, answer: str, sources: List[str], 
                           user_id: str = "anonymous", metadata: Dict = None) -> str:
         """Ghi nhận một tương tác (câu hỏi + câu trả lời)"""
@@ -75,42 +311,110 @@ class LearningEngine:
             "query_tokens": self._tokenize(query)
         }
         
-        self.interactions.append(interaction)
-        self._save_json(self.learning_file, self.interactions)
-        
-        # Update stats
-        self.feedback_stats["total_interactions"] += 1
-        self._save_json(self.feedback_file, self.feedback_stats)
+        with self._lock:
+            self._positions.setdefault(interaction["id"], len(self.interactions))
+            self.interactions.append(interaction)
+            self._append_log([{"add": interaction}])
+            
+            # Update stats
+            self.feedback_stats["total_interactions"] += 1
+            self._mark_dirty(self.feedback_file, "feedback_stats")
         
         return interaction["id"]
     
     def submit_feedback(self, interaction_id: str, rating: int, feedback_text: str = "", 
                        is_helpful: bool = None):
         """Người dùng feedback câu trả lời (rating 1-5, true/false)"""
-        for inter in self.interactions:
-            if inter["id"] == interaction_id:
-                inter["rating"] = rating
-                inter["feedback"] = feedback_text
-                inter["feedback_timestamp"] = datetime.now().isoformat()
-                
-                # Update stats
-                if rating >= 4:
-                    self.feedback_stats["positive_feedback"] += 1
-                elif rating <= 2:
-                    self.feedback_stats["negative_feedback"] += 1
-                
-                # Update average rating
-                ratings = [i.get("rating", 0) for i in self.interactions if i.get("rating", 0) > 0]
-                if ratings:
-                    self.feedback_stats["avg_rating"] = sum(ratings) / len(ratings)
-                
-                # Extract learned patterns from positive feedback
-                if rating >= 4:
-                    self._learn_from_positive(inter)
-                
-                self._save_json(self.learning_file, self.interactions)
-                self._save_json(self.feedback_file, self.feedback_stats)
+        with self._lock:
+            inter = self._apply_feedback(interaction_id, rating, feedback_text)
+            if inter is not None:
+                self._save_feedback_state([inter], learned=rating >= 4)
+    
+    def submit_feedback_async(self, interaction_id: str, rating: int, feedback_text: str = ""):
+        """Xếp hàng feedback và trả về ngay; worker nền ghi file theo batch"""
+        if self._feedback_worker is None:
+            with self._lock:
+                if self._feedback_worker is None:
+                    self._feedback_worker = threading.Thread(
+                        target=self._feedback_loop, name="feedback-writer", daemon=True)
+                    self._feedback_worker.start()
+                    atexit.register(self.flush_feedback)
+        self._feedback_queue.put((interaction_id, rating, feedback_text))
+    
+    def flush_feedback(self):
+        """Áp dụng ngay mọi feedback còn trong hàng đợi"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._feedback_queue.get_nowait())
+            except queue.Empty:
                 break
+        self._apply_feedback_batch(batch)
+    
+    def _feedback_loop(self):
+        while True:
+            batch = [self._feedback_queue.get()]
+            deadline = time.monotonic() + FEEDBACK_BATCH_WAIT
+            while len(batch) < FEEDBACK_BATCH_SIZE:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._feedback_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._apply_feedback_batch(batch)
+    
+    def _apply_feedback_batch(self, batch: List[Tuple]):
+        """Áp dụng một batch feedback và ghi file một lần"""
+        if not batch:
+            return
+        with self._lock:
+            learned = False
+            updated = []
+            for interaction_id, rating, feedback_text in batch:
+                inter = self._apply_feedback(interaction_id, rating, feedback_text)
+                if inter is not None:
+                    updated.append(inter)
+                    learned = learned or rating >= 4
+            if updated:
+                self._save_feedback_state(updated, learned)
+    
+    def _apply_feedback(self, interaction_id: str, rating: int, feedback_text: str) -> Optional[Dict]:
+        """Cập nhật feedback trong bộ nhớ; trả về interaction, hoặc None nếu không tìm thấy"""
+        pos = self._positions.get(interaction_id)
+        if pos is None:
+            return None
+        inter = self.interactions[pos]
+        self._count_rating(inter.get("rating", 0), -1)
+        inter["rating"] = rating
+        inter["feedback"] = feedback_text
+        inter["feedback_timestamp"] = datetime.now().isoformat()
+        self._update_learned_index(pos, inter)
+        
+        # Update stats
+        if rating >= 4:
+            self.feedback_stats["positive_feedback"] += 1
+        elif rating <= 2:
+            self.feedback_stats["negative_feedback"] += 1
+        
+        # Update average rating
+        self._count_rating(rating, 1)
+        if self._rating_count:
+            self.feedback_stats["avg_rating"] = self._rating_sum / self._rating_count
+        
+        # Extract learned patterns from positive feedback
+        if rating >= 4:
+            self._learn_from_positive(inter)
+        return inter
+    
+    def _save_feedback_state(self, updated: List[Dict], learned: bool):
+        """Ghi feedback mới vào log, stats (và patterns nếu có học thêm) ra file"""
+        self._append_log([{"feedback": {key: inter.get(key) for key in ("id", "rating", "feedback", "feedback_timestamp")}}
+                          for inter in updated])
+        self._mark_dirty(self.feedback_file, "feedback_stats")
+        if learned:
+            self._mark_dirty(self.patterns_file, "patterns")
     
     def _learn_from_positive(self, interaction: Dict):
         """Học từ những feedback tích cực"""
@@ -118,48 +422,80 @@ class LearningEngine:
         answer = interaction["answer"]
         tokens = interaction["query_tokens"]
         
+        snippet = answer[:500]  # Limit answer length
+        
         # Tăng tần suất của các từ khóa
         for token in tokens:
-            if token not in self.patterns:
-                self.patterns[token] = {
+            pattern = self.patterns.get(token)
+            if pattern is None:
+                pattern = self.patterns[token] = {
                     "frequency": 0,
                     "answers": [],
                     "success_rate": 0.0
                 }
-            self.patterns[token]["frequency"] += 1
+            pattern["frequency"] += 1
             
-            # Lưu trữ pattern của câu trả lời
-            if answer not in self.patterns[token]["answers"]:
-                self.patterns[token]["answers"].append(answer[:500])  # Limit answer length
-        
-        self._save_json(self.patterns_file, self.patterns)
+            # Lưu trữ pattern của câu trả lời (giữ PATTERN_MAX_ANSWERS câu mới nhất)
+            seen = self._pattern_answers.setdefault(token, set())
+            if snippet not in seen:
+                seen.add(snippet)
+                answers = pattern["answers"]
+                answers.append(snippet)
+                if len(answers) > PATTERN_MAX_ANSWERS:
+                    seen.discard(answers.pop(0))
+    
+    def _update_learned_index(self, pos: int, inter: Dict):
+        """Thêm/bỏ interaction ở vị trí `pos` khỏi inverted index theo rating hiện tại"""
+        old = self._learned_tokens.pop(pos, frozenset())
+        for token in old:
+            self._token_index[token] = self._token_index[token] - {pos}
+        # Chỉ lấy những câu trả lời được đánh giá tốt
+        tokens = frozenset(inter.get("query_tokens", [])) if inter.get("rating", 0) >= 4 else frozenset()
+        # Length before postings: readers index _learned_len with every position
+        # they find in _token_index, so it must already cover `pos`
+        if pos >= len(self._learned_len):
+            grown = np.zeros(max(pos + 1, 2 * len(self._learned_len)), dtype=np.int32)
+            grown[:len(self._learned_len)] = self._learned_len
+            self._learned_len = grown
+        self._learned_len[pos] = len(tokens)
+        if tokens:
+            self._learned_tokens[pos] = tokens
+            for token in tokens:
+                self._token_index[token] = self._token_index.get(token, frozenset()) | {pos}
     
     def find_similar_learned_answers(self, query: str, top_k: int = 3) -> List[Dict]:
         """Tìm các câu trả lời tương tự từ những câu hỏi đã được học"""
         query_tokens = set(self._tokenize(query))
+        if not query_tokens:
+            return []
         
-        similar = []
-        for inter in self.interactions:
-            if inter.get("rating", 0) >= 4:  # Chỉ lấy những câu trả lời được đánh giá tốt
-                inter_tokens = set(inter.get("query_tokens", []))
-                
-                # Tính độ tương tự Jaccard
-                if query_tokens and inter_tokens:
-                    intersection = len(query_tokens & inter_tokens)
-                    union = len(query_tokens | inter_tokens)
-                    similarity = intersection / union if union > 0 else 0
-                    
-                    if similarity > 0.3:  # Threshold
-                        similar.append({
-                            "similarity": similarity,
-                            "query": inter["query"],
-                            "answer": inter["answer"],
-                            "rating": inter.get("rating", 0)
-                        })
+        # Interactions without a shared token have similarity 0; counting each
+        # candidate's occurrences across the query tokens' postings gives |A∩B|
+        postings = [self._token_index.get(token, ()) for token in query_tokens]
+        n = sum(map(len, postings))
+        if not n:
+            return []
+        positions, intersection = np.unique(
+            np.fromiter(chain.from_iterable(postings), dtype=np.int64, count=n), return_counts=True)
+        lengths = self._learned_len[positions]
         
-        # Sort by similarity
-        similar.sort(key=lambda x: x["similarity"], reverse=True)
-        return similar[:top_k]
+        # Tính độ tương tự Jaccard: |A∩B| / (|A| + |B| - |A∩B|)
+        union = len(query_tokens) + lengths - intersection
+        similarity = intersection / np.maximum(union, 1)
+        keep = (similarity > 0.3) & (lengths > 0)  # Threshold
+        positions, similarity = positions[keep], similarity[keep]
+        
+        # Sort by similarity (ties: older interaction first)
+        similar = []
+        for i in np.lexsort((positions, -similarity))[:top_k].tolist():
+            inter = self.interactions[int(positions[i])]
+            similar.append({
+                "similarity": float(similarity[i]),
+                "query": inter["query"],
+                "answer": inter["answer"],
+                "rating": inter.get("rating", 0)
+            })
+        return similar
     
     def get_synonyms(self, word: str) -> List[str]:
         """Lấy từ đồng nghĩa đã học hoặc mặc định"""
@@ -187,17 +523,18 @@ class LearningEngine:
     
     def record_synonym_pair(self, word1: str, word2: str):
         """Ghi nhận cặp từ đồng nghĩa"""
-        if word1 not in self.synonyms:
-            self.synonyms[word1] = []
-        if word2 not in self.synonyms[word1]:
-            self.synonyms[word1].append(word2)
-        
-        if word2 not in self.synonyms:
-            self.synonyms[word2] = []
-        if word1 not in self.synonyms[word2]:
-            self.synonyms[word2].append(word1)
-        
-        self._save_json(self.synonyms_file, self.synonyms)
+        with self._lock:
+            if word1 not in self.synonyms:
+                self.synonyms[word1] = []
+            if word2 not in self.synonyms[word1]:
+                self.synonyms[word1].append(word2)
+            
+            if word2 not in self.synonyms:
+                self.synonyms[word2] = []
+            if word1 not in self.synonyms[word2]:
+                self.synonyms[word2].append(word1)
+            
+            self._mark_dirty(self.synonyms_file, "synonyms")
     
     def get_learning_stats(self) -> Dict:
         """Lấy thống kê học tập"""
@@ -222,85 +559,75 @@ class LearningEngine:
                     suggestions.append(f"  {idx}. Câu hỏi tương tự: '{sim['query']}' "
                                      f"(được đánh giá {sim['rating']}/5)")
         
-        # Gợi ý dựa trên patterns
-        query_tokens = self._tokenize(query)
-        related_patterns = []
-        
-        for token in query_tokens:
-            if token in self.patterns:
-                freq = self.patterns[token]["frequency"]
-                if freq > 2:
-                    related_patterns.append((token, freq))
+        # Gợi ý dựa trên patterns (top 3 by frequency; ties keep query order)
+        related_patterns = heapq.nlargest(
+            3,
+            ((token, freq) for token in _tokens(query)
+             if (freq := self.patterns.get(token, _NO_PATTERN)["frequency"]) > 2),
+            key=lambda p: p[1])
         
         if related_patterns:
-            related_patterns.sort(key=lambda x: x[1], reverse=True)
-            suggestions.append(f"🔑 Các từ khóa chính: {', '.join([p[0] for p in related_patterns[:3]])}")
+            suggestions.append(f"🔑 Các từ khóa chính: {', '.join([p[0] for p in related_patterns])}")
         
         return suggestions
     
     def _normalize_query(self, query: str) -> str:
         """Chuẩn hóa query: viết thường, bỏ dấu"""
-        query = query.lower()
-        # Bỏ các ký tự đặc biệt nhưng giữ từ
-        query = re.sub(r'[^\w\sàáảãạăằắẳẵặâầấẩẫậèéẻẽẹêềếểễệìíỉĩịòóỏõọôồốổỗộơờớởỡợùúủũụưừứửữựỳýỷỹỵđ]', '', query)
-        return query.strip()
+        return _normalize(query)
     
     def _tokenize(self, text: str) -> List[str]:
         """Tách từ từ text"""
-        text = self._normalize_query(text)
-        # Bỏ các stop words phổ biến
-        stop_words = {'các', 'và', 'hay', 'là', 'được', 'để', 'trong', 'ở', 'về', 'từ', 'với', 
-                     'như', 'cái', 'cái gì', 'gì', 'ai', 'không', 'có', 'bạn', 'tôi', 'mình'}
-        
-        tokens = text.split()
-        return [t for t in tokens if t not in stop_words and len(t) > 2]
+        return list(_tokens(text))
     
     def _generate_id(self) -> str:
         """Tạo ID unique cho interaction"""
-        import uuid
-        return str(uuid.uuid4())[:8]
+        return uuid4().hex[:8]  # same 8 hex digits as str(uuid4())[:8]
     
     def get_top_questions(self, limit: int = 10) -> List[Dict]:
         """Lấy những câu hỏi được hỏi nhiều nhất"""
         question_counts = Counter()
+        first_seen = {}  # normalized query -> first interaction asking it
         for inter in self.interactions:
             normalized = inter.get("query_normalized", "")
             if normalized:
                 question_counts[normalized] += 1
-        
-        top = question_counts.most_common(limit)
+                first_seen.setdefault(normalized, inter)
         
         result = []
-        for normalized_q, count in top:
-            # Tìm câu hỏi gốc tương ứng
-            for inter in self.interactions:
-                if inter.get("query_normalized") == normalized_q:
-                    result.append({
-                        "question": inter["query"],
-                        "count": count,
-                        "avg_rating": inter.get("rating", 0)
-                    })
-                    break
+        for normalized_q, count in question_counts.most_common(limit):
+            # Câu hỏi gốc tương ứng
+            inter = first_seen[normalized_q]
+            result.append({
+                "question": inter["query"],
+                "count": count,
+                "avg_rating": inter.get("rating", 0)
+            })
         
         return result
     
     def export_learned_data(self, output_dir: str = "data/learned_exports"):
-        """Export dữ liệu học được để phân tích"""
+        """Export dữ liệu học được để phân tích (nén gzip: *.ndjson.gz / *.json.gz)"""
         os.makedirs(output_dir, exist_ok=True)
         
-        # Export all interactions with high rating
-        high_quality = [i for i in self.interactions if i.get("rating", 0) >= 4]
-        with open(os.path.join(output_dir, "high_quality_qa.json"), 'w', encoding='utf-8') as f:
-            json.dump(high_quality, f, ensure_ascii=False, indent=2)
+        # Export all interactions with high rating as NDJSON, one record per line,
+        # so memory stays flat however many interactions there are
+        path = os.path.join(output_dir, "high_quality_qa.ndjson.gz")
+        with gzip.open(path, 'wb', compresslevel=EXPORT_GZIP_LEVEL) as raw, \
+                io.BufferedWriter(raw, buffer_size=64 * 1024) as f:
+            for inter in self.interactions:
+                if inter.get("rating", 0) >= 4:
+                    f.write(_dumps(inter))
+                    f.write(b"\n")
         
+        # Patterns and stats stay indented JSON: they are read by people
         # Export patterns
-        with open(os.path.join(output_dir, "patterns.json"), 'w', encoding='utf-8') as f:
-            json.dump(self.patterns, f, ensure_ascii=False, indent=2)
+        with gzip.open(os.path.join(output_dir, "patterns.json.gz"), 'wb', compresslevel=EXPORT_GZIP_LEVEL) as f:
+            f.write(_dumps(self.patterns, indent=True))
         
         # Export stats
         stats = self.get_learning_stats()
-        with open(os.path.join(output_dir, "stats.json"), 'w', encoding='utf-8') as f:
-            json.dump(stats, f, ensure_ascii=False, indent=2)
+        with gzip.open(os.path.join(output_dir, "stats.json.gz"), 'wb', compresslevel=EXPORT_GZIP_LEVEL) as f:
+            f.write(_dumps(stats, indent=True))
         
         print(f"✅ Exported learned data to {output_dir}")
 
@@ -13,139 +13,180 @@ from typing import List, Dict
 import re
 
 
+def _word_alternation(words) -> "re.Pattern":
+    """One case-insensitive regex matching any of `words` as whole words (longest first)."""
+    alternatives = "|".join(map(re.escape, sorted(words, key=len, reverse=True)))
+    return re.compile(rf"\b(?:{alternatives})\b", re.IGNORECASE)
+
+
+# Style rewrites; no replacement contains another key, so one pass over the
+# text gives the same result as applying them one after another
+_INFORMAL_REPLACEMENTS = {
+    "được cho phép": "có thể",
+    "bị cấm": "không được",
+    "điều khoản": "điểm",
+    "theo đó": "vậy thì",
+}
+_FORMAL_REPLACEMENTS = {
+    "vậy thì": "theo đó",
+    "không được": "bị cấm",
+    "có thể": "được cho phép",
+}
+_INFORMAL_RE = _word_alternation(_INFORMAL_REPLACEMENTS)
+_FORMAL_RE = _word_alternation(_FORMAL_REPLACEMENTS)
+_SENT_SPLIT = re.compile(r'[.!?]\s+')
+
+
+def _replace_words(pattern, replacements: Dict[str, str], text: str) -> str:
+    return pattern.sub(lambda m: replacements.get(m.group(0).lower(), m.group(0)), text)
+
+
+# Paraphrase templates
+PARAPHRASE_TEMPLATES = {
+    # Giới thiệu câu trả lời
+    "intro": (
+        "Theo luật định:",
+        "Dựa trên quy định pháp luật:",
+        "Theo đó:",
+        "Điểm quan trọng là:",
+        "Cần lưu ý rằng:",
+        "Theo các tài liệu pháp luật:",
+        "Quy định này nói rằng:",
+        "Cụ thể:",
+        "Chi tiết hơn:",
+        "Để trả lời bạn:",
+    ),
+    
+    # Kết luận/dùng kết
+    "conclusion": (
+        "Tóm lại:",
+        "Do đó:",
+        "Vì vậy:",
+        "Kết luận:",
+        "Như vậy:",
+        "Như bạn thấy:",
+        "Điều này có nghĩa là:",
+        "Nói cách khác:",
+        "Hay nói cách khác:",
+        "Bản chất là:",
+    ),
+    
+    # Giáo dục/giải thích
+    "explanation": (
+        "Để giải thích chi tiết hơn:",
+        "Nói rõ hơn:",
+        "Để dễ hiểu hơn:",
+        "Nói một cách khác:",
+        "Hiểu đơn giản là:",
+        "Về mặt thực tế:",
+        "Ý nghĩa của điều đó là:",
+        "Nói cách khác:",
+    ),
+    
+    # Cảnh báo
+    "warning": (
+        "⚠️ Lưu ý:",
+        "❗ Chú ý:",
+        "‼️ Quan trọng:",
+        "🚨 Cần biết:",
+        "📌 Lưu ý quan trọng:",
+        "💡 Cần chú ý:",
+        "⚠️ Hãy lưu ý:",
+        "Nếu không tuân thủ:",
+    ),
+    
+    # Khuyến nghị
+    "recommendation": (
+        "💡 Tôi đề xuất:",
+        "✓ Bạn nên:",
+        "👉 Khuyến nghị:",
+        "💬 Gợi ý:",
+        "📝 Nên:",
+        "🔔 Đề nghị:",
+    ),
+    
+    # Xác nhận/Phê duyệt
+    "confirmation": (
+        "✓ Đúng, bạn có thể:",
+        "✓ Có, bạn được phép:",
+        "✓ Vâng, điều đó được cho phép:",
+        "✓ Hoàn toàn có thể:",
+        "✓ Được rồi:",
+        "✓ Chắc chắn:",
+    ),
+    
+    # Phủ định
+    "negation": (
+        "✗ Không, bạn không thể:",
+        "✗ Không, điều đó không được phép:",
+        "✗ Không thể:",
+        "✗ Bị cấm:",
+        "✗ Không được:",
+    ),
+}
+
+# Transition words
+TRANSITION_WORDS = {
+    "addition": ("hơn nữa", "ngoài ra", "thêm vào đó", "cùng với", "bên cạnh đó"),
+    "contrast": ("tuy nhiên", "nhưng", "mặc dù", "dù sao", "nhưng mà"),
+    "example": ("ví dụ", "chẳng hạn", "để minh họa", "như"),
+    "result": ("do đó", "vì thế", "kết quả là", "từ đó"),
+    "time": ("sau đó", "rồi", "khi", "lúc", "trong khi"),
+}
+
+# Vietnamese synonyms for common words
+SYNONYMS = {
+    "đất": ("mảnh đất", "thửa đất", "tài sản đất đai", "bất động sản"),
+    "quyền": ("chủ quyền", "quyền hạn", "tài quyền"),
+    "bán": ("chuyển nhượng", "phát hành", "tiêu thụ"),
+    "mua": ("sở hữu", "chiếm hữu"),
+    "cho thuê": ("khoán", "cho sử dụng"),
+    "xây dựng": ("khai thác", "phát triển"),
+    "vi phạm": ("phạm pháp", "infringement"),
+    "xử phạt": ("phạt tiền", "hình phạt"),
+    "thủ tục": ("quy trình", "cách thức"),
+    "giấy phép": ("chứng chỉ", "license"),
+    "cơ quan": ("ban", "sở", "agency"),
+    "người": ("cá nhân", "chủ thể", "bên"),
+    "ngân sách": ("quỹ", "tài chính"),
+    "thuế": ("phí", "lệ phí"),
+}
+
+_SYNONYM_RE = _word_alternation(SYNONYMS)
+
+
 class NLGEngine:
     """Natural Language Generation Engine"""
     
-    def __init__(self):
-        # Paraphrase templates
-        self.paraphrase_templates = {
-            # Giới thiệu câu trả lời
-            "intro": [
-                "Theo luật định:",
-                "Dựa trên quy định pháp luật:",
-                "Theo đó:",
-                "Điểm quan trọng là:",
-                "Cần lưu ý rằng:",
-                "Theo các tài liệu pháp luật:",
-                "Quy định này nói rằng:",
-                "Cụ thể:",
-                "Chi tiết hơn:",
-                "Để trả lời bạn:",
-            ],
-            
-            # Kết luận/dùng kết
-            "conclusion": [
-                "Tóm lại:",
-                "Do đó:",
-                "Vì vậy:",
-                "Kết luận:",
-                "Như vậy:",
-                "Như bạn thấy:",
-                "Điều này có nghĩa là:",
-                "Nói cách khác:",
-                "Hay nói cách khác:",
-                "Bản chất là:",
-            ],
-            
-            # Giáo dục/giải thích
-            "explanation": [
-                "Để giải thích chi tiết hơn:",
-                "Nói rõ hơn:",
-                "Để dễ hiểu hơn:",
-                "Nói một cách khác:",
-                "Hiểu đơn giản là:",
-                "Về mặt thực tế:",
-                "Ý nghĩa của điều đó là:",
-                "Nói cách khác:",
-            ],
-            
-            # Cảnh báo
-            "warning": [
-                "⚠️ Lưu ý:",
-                "❗ Chú ý:",
-                "‼️ Quan trọng:",
-                "🚨 Cần biết:",
-                "📌 Lưu ý quan trọng:",
-                "💡 Cần chú ý:",
-                "⚠️ Hãy lưu ý:",
-                "Nếu không tuân thủ:",
-            ],
-            
-            # Khuyến nghị
-            "recommendation": [
-                "💡 Tôi đề xuất:",
-                "✓ Bạn nên:",
-                "👉 Khuyến nghị:",
-                "💬 Gợi ý:",
-                "📝 Nên:",
-                "🔔 Đề nghị:",
-            ],
-            
-            # Xác nhận/Phê duyệt
-            "confirmation": [
-                "✓ Đúng, bạn có thể:",
-                "✓ Có, bạn được phép:",
-                "✓ Vâng, điều đó được cho phép:",
-                "✓ Hoàn toàn có thể:",
-                "✓ Được rồi:",
-                "✓ Chắc chắn:",
-            ],
-            
-            # Phủ định
-            "negation": [
-                "✗ Không, bạn không thể:",
-                "✗ Không, điều đó không được phép:",
-                "✗ Không thể:",
-                "✗ Bị cấm:",
-                "✗ Không được:",
-            ],
-        }
-        
-        # Transition words
-        self.transition_words = {
-            "addition": ["hơn nữa", "ngoài ra", "thêm vào đó", "cùng với", "bên cạnh đó"],
-            "contrast": ["tuy nhiên", "nhưng", "mặc dù", "dù sao", "nhưng mà"],
-            "example": ["ví dụ", "chẳng hạn", "để minh họa", "như"],
-            "result": ["do đó", "vì thế", "kết quả là", "từ đó"],
-            "time": ["sau đó", "rồi", "khi", "lúc", "trong khi"],
-        }
-        
-        # Vietnamese synonyms for common words
-        self.synonyms = {
-            "đất": ["mảnh đất", "thửa đất", "tài sản đất đai", "bất động sản"],
-            "quyền": ["chủ quyền", "quyền hạn", "tài quyền"],
-            "bán": ["chuyển nhượng", "phát hành", "tiêu thụ"],
-            "mua": ["sở hữu", "chiếm hữu"],
-            "cho thuê": ["khoán", "cho sử dụng"],
-            "xây dựng": ["khai thác", "phát triển"],
-            "vi phạm": ["phạm pháp", "infringement"],
-            "xử phạt": ["phạt tiền", "hình phạt"],
-            "thủ tục": ["quy trình", "cách thức"],
-            "giấy phép": ["chứng chỉ", "license"],
-            "cơ quan": ["ban", "sở", "agency"],
-            "người": ["cá nhân", "chủ thể", "bên"],
-            "ngân sách": ["quỹ", "tài chính"],
-            "thuế": ["phí", "lệ phí"],
-        }
+    # Kept as attributes for callers that read them off the engine
+    paraphrase_templates = PARAPHRASE_TEMPLATES
+    transition_words = TRANSITION_WORDS
+    synonyms = SYNONYMS
     
     def paraphrase(self, text: str, style: str = "formal") -> str:
         """
         Tạo phiên bản khác của text (paraphrase)
         style: "formal", "informal", "technical"
         """
-        paraphrased = text
+        # Technical style keeps the exact legal wording: no synonym pass
+        if style == "technical":
+            return self._make_technical(text)
+        
+        # Replace synonyms in one pass; every occurrence of a word gets the same synonym
+        chosen = {}
+        
+        def pick(m):
+            word = m.group(0).lower()
+            if word not in chosen:
+                syns = SYNONYMS.get(word)
+                chosen[word] = random.choice(syns) if syns else m.group(0)
+            return chosen[word]
         
-        # Replace synonyms
-        for word, syns in self.synonyms.items():
-            if word in paraphrased.lower():
-                synonym = random.choice(syns)
-                paraphrased = re.sub(rf'\b{word}\b', synonym, paraphrased, flags=re.IGNORECASE)
+        paraphrased = _SYNONYM_RE.sub(pick, text)
         
         # Adjust formality
         if style == "informal":
             paraphrased = self._make_informal(paraphrased)
-        elif style == "technical":
-            paraphrased = self._make_technical(paraphrased)
         elif style == "formal":
             paraphrased = self._make_formal(paraphrased)
         
@@ -153,19 +194,19 @@ class NLGEngine:
     
     def generate_intro(self, intro_type: str = "intro") -> str:
         """Generate random intro phrase"""
-        if intro_type in self.paraphrase_templates:
-            return random.choice(self.paraphrase_templates[intro_type])
+        if intro_type in PARAPHRASE_TEMPLATES:
+            return random.choice(PARAPHRASE_TEMPLATES[intro_type])
         return "Theo đó:"
     
     def generate_transition(self, trans_type: str = "addition") -> str:
         """Generate transition word"""
-        if trans_type in self.transition_words:
-            return random.choice(self.transition_words[trans_type])
+        if trans_type in TRANSITION_WORDS:
+            return random.choice(TRANSITION_WORDS[trans_type])
         return ""
     
     def generate_conclusion(self) -> str:
         """Generate random conclusion"""
-        return random.choice(self.paraphrase_templates["conclusion"])
+        return random.choice(PARAPHRASE_TEMPLATES["conclusion"])
     
     def generate_varied_response(self, core_answer: str, variations: int = 3) -> List[str]:
         """
@@ -228,15 +269,8 @@ class NLGEngine:
     
     def generate_bullet_points(self, text: str) -> str:
         """Chuyển đoạn text thành bullet points"""
-        sentences = re.split(r'[.!?]\s+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        bullet_points = []
-        for sent in sentences:
-            if sent:
-                bullet_points.append(f"• {sent.strip()}")
-        
-        return "\n".join(bullet_points)
+        sentences = (s.strip() for s in _SENT_SPLIT.split(text))
+        return "\n".join([f"• {sent}" for sent in sentences if sent])
     
     def generate_numbered_list(self, items: List[str]) -> str:
         """Tạo numbered list"""
@@ -263,32 +297,11 @@ class NLGEngine:
     
     def _make_informal(self, text: str) -> str:
         """Chuyển text sang informal style"""
-        replacements = {
-            "được cho phép": "có thể",
-            "bị cấm": "không được",
-            "điều khoản": "điểm",
-            "theo đó": "vậy thì",
-        }
-        
-        result = text
-        for formal, informal in replacements.items():
-            result = re.sub(rf'\b{formal}\b', informal, result, flags=re.IGNORECASE)
-        
-        return result
+        return _replace_words(_INFORMAL_RE, _INFORMAL_REPLACEMENTS, text)
     
     def _make_formal(self, text: str) -> str:
         """Chuyển text sang formal style"""
-        replacements = {
-            "vậy thì": "theo đó",
-            "không được": "bị cấm",
-            "có thể": "được cho phép",
-        }
-        
-        result = text
-        for informal, formal in replacements.items():
-            result = re.sub(rf'\b{informal}\b', formal, result, flags=re.IGNORECASE)
-        
-        return result
+        return _replace_words(_FORMAL_RE, _FORMAL_REPLACEMENTS, text)
     
     def _make_technical(self, text: str) -> str:
         """Chuyển text sang technical style"""
@@ -297,15 +310,12 @@ class NLGEngine:
     
     def _reorder_sentences(self, text: str) -> str:
         """Sắp xếp lại thứ tự các câu"""
-        sentences = re.split(r'[.!?]\s+', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
+        sentences = [sent for sent in map(str.strip, _SENT_SPLIT.split(text)) if sent]
         
         if len(sentences) > 1:
             # Giữ first sentence, shuffle the rest
-            first = sentences[0]
-            rest = sentences[1:]
-            random.shuffle(rest)
-            return ". ".join([first] + rest) + "."
+            first, *rest = sentences
+            return ". ".join([first, *random.sample(rest, len(rest))]) + "."
         
         return text
     
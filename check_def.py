@@ -1,14 +1,16 @@
-import json
-
 # Load tinydb.json để tìm định nghĩa "Quyền sử dụng đất"
-with open('data/tinydb.json', 'r', encoding='utf-8') as f:
+# (đọc bytes và tìm một lần; chỉ giải mã phần quanh kết quả)
+with open('data/tinydb.json', 'rb') as f:
     content = f.read()
-    
+
+needle = "Quyền sử dụng đất".encode("utf-8")
 print("=== SEARCHING FOR 'Quyền sử dụng đất' ===")
-if "Quyền sử dụng đất" in content:
-    idx = content.find("Quyền sử dụng đất")
-    snippet = content[max(0, idx-100):idx+300]
-    print("Found at position:", idx)
-    print(snippet)
+idx = content.find(needle)
+if idx != -1:
+    # Cửa sổ 100 ký tự trước / 300 ký tự sau (mỗi ký tự tối đa 4 byte UTF-8)
+    before = content[max(0, idx-400):idx].decode("utf-8", errors="ignore")[-100:]
+    after = content[idx:idx+1200].decode("utf-8", errors="ignore")[:300]
+    print("Found at position:", len(content[:idx].decode("utf-8")))
+    print(before + after)
 else:
     print("Not found")
@@ -27,4 +27,59 @@ DEBUG = os.getenv("DEBUG", "True").lower() in ("true", "1", "yes")
 USE_EMBEDDINGS = os.getenv("USE_EMBEDDINGS", "False").lower() in ("true", "1", "yes")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
 TOP_K = int(os.getenv("TOP_K", 5))
+# Int8 ONNX export of EMBEDDING_MODEL (tools/export_onnx.py) used by build_embeddings
+# when onnxruntime is installed; falls back to sentence-transformers (PyTorch).
+# Queries are encoded with whichever one built the embeddings (embeddings_meta.json)
+EMBEDDING_ONNX_PATH = os.getenv("EMBEDDING_ONNX_PATH", os.path.join(os.getenv("DATA_DIR", "data"), "onnx", "model.int8.onnx"))
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+# Query embeddings kept in an in-process LRU (repeated / follow-up queries skip the model)
+QUERY_EMB_CACHE_SIZE = int(os.getenv("QUERY_EMB_CACHE_SIZE", 10000))
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "english")
+
+# Cache (Redis hot cache for API responses; disabled if Redis is unreachable)
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_TTL = int(os.getenv("CACHE_TTL", 120))
+
+# Micro-batching of concurrent retrieval requests
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 8))
+
+# Search re-checks its index files for a rebuild at most this often (seconds)
+INDEX_CHECK_SECONDS = float(os.getenv("INDEX_CHECK_SECONDS", 2))
+
+# Incremental TF-IDF: full rebuild once new passages exceed this fraction of the base index
+TFIDF_REBUILD_RATIO = float(os.getenv("TFIDF_REBUILD_RATIO", 0.5))
+
+# Approximate int8 TF-IDF scoring (top INT8_TOP_TERMS terms per passage, per-row scale)
+TFIDF_INT8 = os.getenv("TFIDF_INT8", "False").lower() in ("true", "1", "yes")
+INT8_TOP_TERMS = int(os.getenv("INT8_TOP_TERMS", 256))
+
+# Hashed TF-IDF features (no vocabulary kept in memory or in tfidf.joblib; new
+# terms are indexed by update_tfidf without a refit). Not combinable with TFIDF_INT8.
+TFIDF_HASHING = os.getenv("TFIDF_HASHING", "False").lower() in ("true", "1", "yes")
+TFIDF_HASH_FEATURES = int(os.getenv("TFIDF_HASH_FEATURES", 2 ** 20))
+
+# Faiss embedding index: exact below FAISS_HNSW_MIN passages, HNSW up to
+# FAISS_IVFPQ_MIN, IVF-PQ above; query-time search breadth for the ANN indexes
+FAISS_HNSW_MIN = int(os.getenv("FAISS_HNSW_MIN", 2000))
+FAISS_IVFPQ_MIN = int(os.getenv("FAISS_IVFPQ_MIN", 50000))
+FAISS_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", 64))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", 16))
+# HNSW tier stores 8-bit scalar-quantized vectors (1 byte/dim instead of 4)
+FAISS_SQ8 = os.getenv("FAISS_SQ8", "True").lower() in ("true", "1", "yes")
+
+# Semantic answer cache: reuse a composed answer for queries whose embedding
+# cosine similarity is >= SEMANTIC_CACHE_THRESHOLD (needs sentence-transformers)
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "False").lower() in ("true", "1", "yes")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 10000))
+# Past SEMANTIC_CACHE_LSH_MIN entries, lookups use random-hyperplane LSH
+# (LSH_TABLES tables of LSH_BITS bits) instead of scanning every entry
+SEMANTIC_CACHE_LSH_MIN = int(os.getenv("SEMANTIC_CACHE_LSH_MIN", 5000))
+SEMANTIC_CACHE_LSH_BITS = int(os.getenv("SEMANTIC_CACHE_LSH_BITS", 12))
+SEMANTIC_CACHE_LSH_TABLES = int(os.getenv("SEMANTIC_CACHE_LSH_TABLES", 8))
+# Model-free fast path checked before the semantic cache: exact match on the
+# normalized query, then SimHash within FUZZY_CACHE_MAX_HAMMING bits (of 64)
+FUZZY_CACHE = os.getenv("FUZZY_CACHE", "False").lower() in ("true", "1", "yes")
+FUZZY_CACHE_SIZE = int(os.getenv("FUZZY_CACHE_SIZE", 10000))
+FUZZY_CACHE_MAX_HAMMING = int(os.getenv("FUZZY_CACHE_MAX_HAMMING", 3))
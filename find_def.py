@@ -1,18 +1,17 @@
-import json
 import re
 
 with open('data/tinydb.json', 'r', encoding='utf-8') as f:
     content = f.read()
 
 # Search for "Quyền sử dụng đất là" or definition pattern
+# (str, not bytes: IGNORECASE must also fold Vietnamese capitals like "QUYỀN")
 patterns = [
     r"Quyền sử dụng đất\s+là\s+[^.]+\.",
     r"quyền sử dụng đất\s+của\s+[^.]+\.",
     r"\"quyền sử dụng đất\"\s+là\s+[^.]+\.",
 ]
 
-for pattern in patterns:
-    matches = re.finditer(pattern, content, re.IGNORECASE)
-    for match in matches:
+for pattern, regex in [(p, re.compile(p, re.IGNORECASE)) for p in patterns]:
+    for match in regex.finditer(content):
         print(f"Pattern: {pattern}")
         print(f"Match: {match.group()}\n")
@@ -207,7 +207,13 @@ async function rebuildIndex() {
   if (!confirm('Rebuild index sẽ mất một chút thời gian. Tiếp tục?')) return;
   
   try {
-    const r = await postJSON('/api/build_index', {});
+    let r = await postJSON('/api/build_index', {});
+    // Rebuild runs in the background; poll until the job finishes
+    while (r.job_id && (r.status === 'accepted' || r.status === 'running')) {
+      await new Promise(res => setTimeout(res, 1000));
+      r = await (await fetch('/api/build_index/' + r.job_id)).json();
+    }
+    if (r.status === 'error') throw r.message;
     alert('✅ ' + (r.message || 'Index đã rebuild thành công'));
   } catch (e) {
     alert('❌ Lỗi: ' + e);
@@ -0,0 +1,44 @@
+# file: gunicorn_conf.py
+"""Production server config: `gunicorn -c gunicorn_conf.py app:app`.
+
+The app is imported once in the master (`preload_app`) and the TF-IDF index
+is loaded there before forking, so every worker shares the same
+(memory-mapped) index pages instead of loading its own copy. Concurrency
+comes from threads in a single worker by default (see `workers`).
+"""
+import os
+from config import HOST, PORT
+
+bind = f"{HOST}:{PORT}"
+preload_app = True
+# One process by default: the learning engine (feedback positions, log
+# compaction) and file-mode conversation sessions are kept in process memory,
+# so with more workers feedback and session updates reaching another worker
+# are lost or stale. Raise WEB_WORKERS only once that state is shared.
+workers = int(os.getenv("WEB_WORKERS", 1))
+# Flask is WSGI: threaded workers let one process serve concurrent requests
+# (and feed the retrieval batcher) without an ASGI wrapper.
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 8))
+keepalive = 30
+timeout = 120
+
+
+def when_ready(server):
+    """Warm the TF-IDF and embedding indexes in the master before workers are forked."""
+    try:
+        from backend import search
+        if os.path.exists(search.TFIDF_PATH):
+            search.load_tfidf()
+            server.log.info("TF-IDF index preloaded")
+    except Exception as e:
+        server.log.warning(f"TF-IDF preload failed: {e}")
+    # Passage embeddings / faiss index too (the model itself loads per worker:
+    # torch does not survive fork well)
+    try:
+        from backend import search
+        if os.path.exists(search.EMB_PATH):
+            search.load_embeddings()
+            server.log.info("Passage embeddings preloaded")
+    except Exception as e:
+        server.log.warning(f"Embedding preload failed: {e}")
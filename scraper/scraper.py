@@ -1,42 +1,92 @@
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
 import re
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 URL = "https://thuvienphapluat.vn/van-ban/Bat-dong-san/Luat-Dat-dai-2024-31-2024-QH15-523642.aspx"
 HEADERS = {"User-Agent": "legal-bot/3.0"}
 
+# Mẫu nhận diện Chương / Mục / Điều, biên dịch một lần cho mọi đoạn văn.
+# Một lần match cho mỗi đoạn; m.lastgroup cho biết loại tiêu đề:
+#   "chuong"            Chương <số La Mã> (không phân biệt hoa thường)
+#   "muc_so" / "muc"    Mục <số> / dòng bắt đầu bằng "Mục " nhưng không có số
+#   "dieu_so" / "dieu"  Điều <số> / dòng bắt đầu bằng "Điều " nhưng không có số
+_HEADER_RE = re.compile(
+    r"(?i:Chương\s+(?P<chuong>[IVXLC]+))"
+    r"|(?P<muc>Mục)\s+(?P<muc_so>\d+)?"
+    r"|(?P<dieu>Điều)\s+(?P<dieu_so>\d+)?"
+)
+_DIEU_PREFIX_RE = re.compile(r"^Điều\s+\d+\.?\s*")
+_SLUG_RE = re.compile(r"\W+")
+
+# Một Session dùng chung: giữ kết nối keep-alive giữa các URL (không bắt tay
+# TCP/TLS lại) và thử lại lỗi mạng / 429 / 5xx với backoff
+_session = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        session = requests.Session()
+        session.headers.update(HEADERS)
+        retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      raise_on_status=False)  # hết lượt thử: raise_for_status() như trước
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
 def fetch_html(path_or_url):
     if path_or_url.startswith("http"):
-        res = requests.get(path_or_url, headers=HEADERS, timeout=15)
+        res = get_session().get(path_or_url, timeout=15)
         res.raise_for_status()
         return res.text
     with open(path_or_url, "r", encoding="utf-8") as f:
         return f.read()
 
 
-def get_content_block(soup):
+# Khối nội dung chính, theo thứ tự ưu tiên (class so khớp từng token như BeautifulSoup)
+CONTENT_BLOCK_XPATHS = [
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' content1 ')]",
+    "//div[@id='content']",
+    "//div[contains(concat(' ', normalize-space(@class), ' '), ' fck ')]",
+]
+
+
+def get_content_block(tree):
     """Lấy khối nội dung chính – chịu được thay đổi layout."""
-    candidates = [
-        ("div", {"class": "content1"}),
-        ("div", {"id": "content"}),
-        ("div", {"class": "fck"}),
-    ]
-    for tag, attrs in candidates:
-        block = soup.find(tag, attrs)
+    for xpath in CONTENT_BLOCK_XPATHS:
+        block = tree.xpath(xpath)
         if block:
-            return block
+            return block[0]
     raise ValueError("Không tìm thấy khối nội dung chính trong HTML.")
 
 
-def parse_law(html):
-    soup = BeautifulSoup(html, "html.parser")
-    title = soup.title.get_text(strip=True) if soup.title else "Văn bản pháp luật"
+def element_text(el):
+    """Text của một thẻ, các đoạn cách nhau một dấu cách (như get_text(" ", strip=True))."""
+    return " ".join(s for s in map(str.strip, el.itertext()) if s)
+
 
-    content = get_content_block(soup)
-    paragraphs = content.find_all("p")
+def parse_law(html, source=URL):
+    # lxml parses in C; paragraphs are walked straight off the tree
+    tree = lxml.html.fromstring(html)
+    title_el = tree.find(".//title")
+    title = "".join(map(str.strip, title_el.itertext())) if title_el is not None else "Văn bản pháp luật"
+
+    content = get_content_block(tree)
+    paragraphs = content.iter("p")
 
     articles = []
     current = None
@@ -46,47 +96,47 @@ def parse_law(html):
     current_ten_muc = None
 
     for p in paragraphs:
-        text = p.get_text(" ", strip=True)
+        text = element_text(p)
         if not text:
             continue
 
+        m = _HEADER_RE.match(text)
+        header = m.lastgroup if m else None
+
         # --- Detect CHƯƠNG ---
-        m_chuong = re.match(r"^Chương\s+([IVXLC]+)", text, re.IGNORECASE)
-        if m_chuong:
-            current_chuong = f"Chương {m_chuong.group(1)}"
+        if header == "chuong":
+            current_chuong = f"Chương {m.group('chuong')}"
             current_ten_chuong = None  # reset tên
             current_muc = None
             current_ten_muc = None
             continue
 
         # --- Detect tên chương ---
-        if current_chuong and not re.match(r"^Mục\s+", text) and not re.match(r"^Điều\s+", text):
+        if current_chuong and header is None:
             # Tên chương là dòng sau Chương
             if current_ten_chuong is None:
                 current_ten_chuong = text
                 continue
 
         # --- Detect MỤC ---
-        m_muc = re.match(r"^Mục\s+(\d+)", text)
-        if m_muc:
-            current_muc = f"Mục {m_muc.group(1)}"
+        if header == "muc_so":
+            current_muc = f"Mục {m.group('muc_so')}"
             current_ten_muc = None
             continue
 
         # --- Detect tên mục ---
-        if current_muc and not re.match(r"^Điều\s+", text):
+        if current_muc and header not in ("dieu", "dieu_so"):
             if current_ten_muc is None:
                 current_ten_muc = text
                 continue
 
         # --- Detect ĐIỀU ---
-        match = re.match(r"^Điều\s+(\d+)", text)
-        if match:
+        if header == "dieu_so":
             if current:
                 articles.append(current)
 
-            so = int(match.group(1))
-            full_title = re.sub(r"^Điều\s+\d+\.?\s*", "", text).strip()
+            so = int(m.group('dieu_so'))
+            full_title = _DIEU_PREFIX_RE.sub("", text).strip()
 
             current = {
                 "chuong": current_chuong,
@@ -101,7 +151,7 @@ def parse_law(html):
 
         # --- Nội dung Điều ---
         if current:
-            clean = re.sub(r"\s+", " ", text).strip()
+            clean = " ".join(text.split())
             current["noi_dung"].append(clean)
 
     if current:
@@ -109,20 +159,18 @@ def parse_law(html):
 
     return {
         "tieu_de_luat": title,
-        "nguon": URL,
+        "nguon": source,
         "tong_so_dieu": len(articles),
         "thoi_gian_scrape": datetime.now().isoformat(),
         "noi_dung": articles
     }
 
-def export_files(data, out_dir="data"):
-    os.makedirs(out_dir, exist_ok=True)
+def law_slug(title):
+    """Tên file từ tiêu đề luật: mỗi cụm ký tự không phải chữ/số thành một dấu '_'."""
+    return _SLUG_RE.sub("_", title).lower()
 
-    base = re.sub(r"\W+", "_", data["tieu_de_luat"]).lower()
-    txt_path = os.path.join(out_dir, base + ".txt")
-    json_path = os.path.join(out_dir, base + ".json")
 
-    # TXT
+def _write_txt(txt_path, data):
     with open(txt_path, "w", encoding="utf-8") as f:
         f.write(f"# {data['tieu_de_luat']}\n# Source: {data['nguon']}\n\n")
         for item in data["noi_dung"]:
@@ -131,14 +179,44 @@ def export_files(data, out_dir="data"):
                 f.write(f"- {line}\n")
             f.write("\n")
 
-    # JSON đẹp
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+
+def _write_json(json_path, data):
+    # JSON đẹp (orjson cho ra đúng từng byte như json.dump(indent=2, ensure_ascii=False))
+    if orjson is not None:
+        with open(json_path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def export_files(data, out_dir="data"):
+    os.makedirs(out_dir, exist_ok=True)
+
+    base = law_slug(data["tieu_de_luat"])
+    txt_path = os.path.join(out_dir, base + ".txt")
+    json_path = os.path.join(out_dir, base + ".json")
+
+    # TXT ghi ở luồng phụ trong khi JSON ghi ở luồng chính (hai file độc lập)
+    with ThreadPoolExecutor(max_workers=1) as ex:
+        txt_done = ex.submit(_write_txt, txt_path, data)
+        _write_json(json_path, data)
+        txt_done.result()
 
     print(f"[✓] Saved TXT → {txt_path}")
     print(f"[✓] Saved JSON → {json_path}")
 
 
+def scrape_all(urls, max_workers=8):
+    """Tải và phân tích nhiều văn bản song song: thời gian chờ mạng chồng lên nhau
+    (các luồng dùng chung Session/connection pool ở trên). Trả về theo thứ tự urls."""
+    def scrape(url):
+        return parse_law(fetch_html(url), source=url)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as ex:
+        return list(ex.map(scrape, urls))
+
+
 def main():
     html = fetch_html("file.html")
     data = parse_law(html)
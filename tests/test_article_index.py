@@ -0,0 +1,44 @@
+from backend.indexer import passages_from_doc
+from backend.search import lookup_article
+
+# Scraper layout (scraper/scraper.py): one dict per article with its own dieu_so
+LAW = {
+    "tieu_de_luat": "Luật Thuế thu nhập cá nhân",
+    "nguon": "https://example.org/luat-thue-tncn",
+    "noi_dung": [
+        {"dieu_so": 6, "tieu_de": "Sửa đổi, bổ sung khoản 1 Điều 14 của Luật Thuế thu nhập cá nhân",
+         "noi_dung": ["Khoản 1 Điều 14 được sửa đổi như sau."]},
+        {"dieu_so": 14, "tieu_de": "Thu nhập chịu thuế từ chuyển nhượng bất động sản",
+         "noi_dung": ["Thu nhập chịu thuế từ chuyển nhượng bất động sản được xác định ..."]},
+    ],
+}
+OTHER_LAW = {
+    "tieu_de_luat": "Luật Đất đai",
+    "nguon": "https://example.org/luat-dat-dai",
+    "noi_dung": [
+        {"dieu_so": 14, "tieu_de": "Căn cứ để giao đất, cho thuê đất",
+         "noi_dung": ["Căn cứ để giao đất ..."]},
+    ],
+}
+
+
+def test_passages_carry_article_number():
+    assert [p["dieu_so"] for p in passages_from_doc(LAW)] == [6, 14]
+
+
+def test_article_query_returns_the_article_itself():
+    docs = passages_from_doc(LAW)
+    hits = lookup_article(docs, "Điều 14 quy định gì?")
+    assert [h["section"] for h in hits] == ["Thu nhập chịu thuế từ chuyển nhượng bất động sản"]
+    assert hits[0]["dieu_so"] == 14
+
+
+def test_article_query_is_restricted_to_the_named_law():
+    docs = passages_from_doc(LAW) + passages_from_doc(OTHER_LAW)
+    assert {h["title"] for h in lookup_article(docs, "Điều 14")} == {LAW["tieu_de_luat"], OTHER_LAW["tieu_de_luat"]}
+    hits = lookup_article(docs, "Điều 14 Luật Đất đai")
+    assert [h["title"] for h in hits] == ["Luật Đất đai"]
+
+
+def test_article_not_in_any_law():
+    assert lookup_article(passages_from_doc(LAW), "Điều 99") == []
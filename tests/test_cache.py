@@ -0,0 +1,38 @@
+import pytest
+
+from backend import cache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.gets = 0
+        self.version = 0
+
+    def get(self, key):
+        self.gets += 1
+        return str(self.version).encode()
+
+    def incr(self, key):
+        self.version += 1
+        return self.version
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    r = FakeRedis()
+    monkeypatch.setattr(cache, "get_client", lambda: r)
+    monkeypatch.setattr(cache, "_version", None)
+    return r
+
+
+def test_version_is_read_once_per_ttl(redis):
+    keys = {cache.make_key("s", "đất đai", 5) for _ in range(10)}
+    assert len(keys) == 1
+    assert redis.gets == 1
+
+
+def test_invalidate_changes_keys_at_once(redis):
+    before = cache.make_key("s", "đất đai", 5)
+    cache.invalidate()
+    assert cache.make_key("s", "đất đai", 5) != before
+    assert redis.gets == 1
@@ -0,0 +1,43 @@
+import itertools
+
+import pytest
+
+import app as app_module
+from backend import cache
+
+
+class FakeLearning:
+    def __init__(self):
+        self.recorded = []
+        self._ids = itertools.count(1)
+
+    def record_interaction(self, query, answer, sources, user_id="anonymous", metadata=None):
+        self.recorded.append((query, metadata))
+        return f"int-{next(self._ids)}"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = {}
+    learning = FakeLearning()
+    monkeypatch.setattr(cache, "get_json", store.get)
+    monkeypatch.setattr(cache, "set_json", lambda key, value, ttl=None: store.__setitem__(key, value))
+
+    def answer_question(q, k=5, session_id=None, user_id="anonymous"):
+        return {"answer": "Trả lời", "sources": ["Luật Đất đai"], "sentiment": "neutral", "urgency": "low",
+                "interaction_id": learning.record_interaction(q, "Trả lời", [], user_id, {})}
+
+    monkeypatch.setattr(app_module, "answer_question", answer_question)
+    monkeypatch.setattr(app_module, "_learning", lambda: learning)
+    return app_module.app.test_client(), learning
+
+
+def test_cache_hit_records_a_new_interaction(client):
+    c, learning = client
+    first = c.post("/api/chat", json={"q": "Thủ tục mua đất cần gì?"}).get_json()
+    second = c.post("/api/chat", json={"q": "Thủ tục mua đất cần gì?"}).get_json()
+    assert second["answer"] == first["answer"]
+    assert len(learning.recorded) == 2
+    assert learning.recorded[1][1]["from_cache"] is True
+    # Feedback on the repeated question goes to its own interaction
+    assert second["interaction_id"] != first["interaction_id"]
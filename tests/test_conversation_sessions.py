@@ -0,0 +1,32 @@
+import pytest
+
+from chatbot.conversation_manager import ConversationManager
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two worker processes' managers sharing one Redis and one data dir."""
+    server = fakeredis.FakeServer()
+    managers = []
+    for _ in range(2):
+        m = ConversationManager(data_dir=str(tmp_path))
+        m._redis, m._redis_checked = fakeredis.FakeRedis(server=server), True
+        managers.append(m)
+    return managers
+
+
+def test_expired_redis_session_is_restored_from_files(workers):
+    a, b = workers
+    session_id = a.create_session("u1")
+    for i in range(3):
+        b.add_message(session_id, "user", f"câu hỏi {i}")
+    a._redis.delete(a._redis_key(session_id))  # SESSION_TTL passed
+
+    message = a.add_message(session_id, "user", "câu hỏi tiếp")
+    assert message["message_id"] == 4
+    contents = [m["content"] for m in b._get_session(session_id)["messages"]]
+    assert contents == ["câu hỏi 0", "câu hỏi 1", "câu hỏi 2", "câu hỏi tiếp"]
+    assert [m["content"] for m in a._load_session(session_id)["messages"]] == contents
+    assert a.active_sessions == {}
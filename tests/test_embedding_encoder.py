@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend import indexer, search
+
+
+@pytest.fixture
+def emb_paths(tmp_path, monkeypatch):
+    for name in ("EMB_PATH", "EMB_DOCS_PATH", "EMB_META_PATH", "EMB_INT8_PATH", "EMB_SCALE_PATH"):
+        path = str(tmp_path / getattr(indexer, name).rsplit("/", 1)[-1])
+        monkeypatch.setattr(indexer, name, path)
+        monkeypatch.setattr(search, name, path)
+    monkeypatch.setattr(search, "FAISS_PATH", str(tmp_path / "faiss.index"))
+    monkeypatch.setattr(search, "_EMB", None)
+    monkeypatch.setattr(search, "INDEX_CHECK_SECONDS", 0)
+    docs = [{"doc_id": "1", "text": "điều 1"}, {"doc_id": "2", "text": "điều 2"}]
+    vecs = np.eye(2, 4, dtype=np.float32)
+    indexer._dump_embeddings(vecs, docs, search.ENCODER_ONNX_INT8)
+    return docs
+
+
+def test_reuse_requires_the_same_encoder(emb_paths):
+    rows, vecs = indexer._load_previous_embeddings(search.ENCODER_ONNX_INT8)
+    assert rows == {("1", "điều 1"): 0, ("2", "điều 2"): 1}
+    assert indexer._load_previous_embeddings(search.ENCODER_TORCH) == ({}, None)
+
+
+def test_queries_use_the_passage_encoder(emb_paths, monkeypatch):
+    used = []
+
+    class Fake:
+        def encode(self, texts, **kwargs):
+            return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+    def fake_model(name, encoder=search.ENCODER_TORCH):
+        used.append((name, encoder))
+        return Fake()
+
+    monkeypatch.setattr(search, "get_embedding_model", fake_model)
+    monkeypatch.setattr(search, "_QUERY_EMB_CACHE", type(search._QUERY_EMB_CACHE)())
+    assert search.embedding_encoder() == (indexer.EMBEDDING_MODEL, search.ENCODER_ONNX_INT8)
+    search.retrieve("điều 1", k=2)
+    assert used == [(indexer.EMBEDDING_MODEL, search.ENCODER_ONNX_INT8)]
+
+
+def test_meta_change_reloads_the_encoder(emb_paths, monkeypatch):
+    assert search.embedding_encoder()[1] == search.ENCODER_ONNX_INT8
+    # A build that only rewrote the meta so far (vectors still being written)
+    meta = indexer.EMB_META_PATH
+    with open(meta, "w", encoding="utf-8") as f:
+        f.write('{"model": "%s", "encoder": "torch", "n": 2}' % indexer.EMBEDDING_MODEL)
+    os.utime(meta, ns=(os.stat(meta).st_mtime_ns + 10**9,) * 2)
+    assert search.embedding_encoder()[1] == search.ENCODER_TORCH
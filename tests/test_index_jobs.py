@@ -0,0 +1,40 @@
+import os
+import time
+import uuid
+
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, "INDEX_JOBS_DIR", str(tmp_path))
+    return app_module.app.test_client()
+
+
+def test_status_is_shared_through_files(client):
+    # Written by whichever web worker ran the job, read by the one polled
+    job_id = str(uuid.uuid4())
+    app_module._write_job(job_id, "running")
+    assert client.get(f"/api/build_index/{job_id}").get_json()["status"] == "running"
+    app_module._write_job(job_id, "ok", "TF-IDF index rebuilt.")
+    assert client.get(f"/api/build_index/{job_id}").get_json() == {
+        "status": "ok", "job_id": job_id, "message": "TF-IDF index rebuilt."}
+
+
+def test_unknown_job_is_404(client):
+    assert client.get(f"/api/build_index/{uuid.uuid4()}").status_code == 404
+    assert client.get("/api/build_index/not-a-job").status_code == 404
+
+
+def test_finished_jobs_expire(client):
+    done, running = str(uuid.uuid4()), str(uuid.uuid4())
+    app_module._write_job(done, "ok")
+    app_module._write_job(running, "running")
+    old = time.time() - app_module.INDEX_JOB_TTL - 1
+    for job_id in (done, running):
+        os.utime(app_module._job_path(job_id), (old, old))
+    app_module._prune_jobs()
+    assert app_module._read_job(done) is None
+    assert app_module._read_job(running)["status"] == "running"
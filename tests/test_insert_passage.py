@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+from tinydb import TinyDB
+
+from backend import db, indexer
+from backend.tinydb_storage import UTF8Storage
+
+
+@pytest.fixture
+def tiny(tmp_path, monkeypatch):
+    monkeypatch.setattr(indexer, "PENDING_PATH", str(tmp_path / "pending.jsonl"))
+    monkeypatch.setattr(db, "USE_MONGO", False)
+    monkeypatch.setattr(db, "coll", None)
+    monkeypatch.setattr(db, "db_tiny", TinyDB(str(tmp_path / "tinydb.json"), storage=UTF8Storage))
+    return db.db_tiny
+
+
+def test_insert_does_not_mutate_the_callers_passage(tiny):
+    p = {"doc_id": "luat#1#1", "text": "Người sử dụng đất có quyền chuyển nhượng."}
+    assert db.insert_passage(p) is True
+    assert "content_hash" not in p
+    assert tiny.all()[0]["content_hash"] == db.content_hash(p)
+
+
+def test_concurrent_inserts_of_same_text_store_one_copy(tiny):
+    results = []
+
+    def insert():
+        results.append(db.insert_passage({"doc_id": "luat#2#1", "text": "Nhà nước giao đất."}))
+
+    threads = [threading.Thread(target=insert) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert len(tiny.all()) == 1
@@ -0,0 +1,26 @@
+from chatbot.learning_engine import LearningEngine
+
+
+class _CheckedIndex(dict):
+    """_token_index that checks what a lock-free reader would see on every publish."""
+
+    def __init__(self, engine, items):
+        super().__init__(items)
+        self.engine = engine
+
+    def __setitem__(self, token, positions):
+        assert all(p < len(self.engine._learned_len) for p in positions)
+        assert all(self.engine._learned_len[p] > 0 for p in positions - self.get(token, frozenset()))
+        super().__setitem__(token, positions)
+
+
+def test_positions_are_published_after_their_length(tmp_path):
+    engine = LearningEngine(data_dir=str(tmp_path))
+    engine._token_index = _CheckedIndex(engine, engine._token_index)
+    ids = [engine.record_interaction(f"quyền thừa kế di sản số {i}", "trả lời", [])
+           for i in range(len(engine._learned_len) + 5)]
+    # The last ids sit past the initial _learned_len array, which grows on feedback
+    for interaction_id in ids[-3:]:
+        engine.submit_feedback(interaction_id, 5)
+    assert len(engine.find_similar_learned_answers("quyền thừa kế di sản số 1")) == 3
+    engine.flush()
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from backend import indexer
+
+
+@pytest.fixture
+def pending(tmp_path, monkeypatch):
+    path = tmp_path / "tfidf_pending.jsonl"
+    monkeypatch.setattr(indexer, "PENDING_PATH", str(path))
+    return path
+
+
+def _queued(path):
+    if not path.exists():
+        return []
+    return [json.loads(line)["text"] for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_passage_queued_after_claim_is_kept(pending):
+    indexer.queue_passage({"text": "đoạn luật thứ nhất"})
+    claimed, passages = indexer._claim_pending()
+    # Inserted while the index is being rebuilt
+    indexer.queue_passage({"text": "đoạn luật thứ hai"})
+    indexer._finish_pending(claimed)
+    assert [p["text"] for p in passages] == ["đoạn luật thứ nhất"]
+    assert _queued(pending) == ["đoạn luật thứ hai"]
+    assert list(pending.parent.iterdir()) == [pending]
+
+
+def test_build_requeues_pending_passages_it_did_not_index(pending, monkeypatch):
+    indexer.queue_passage({"text": "đã có trong chỉ mục"})
+    indexer.queue_passage({"text": "chèn sau khi đọc dữ liệu"})
+    monkeypatch.setattr(indexer, "_build_tfidf", lambda passages: list(passages))
+    indexer.build_tfidf(passages=[{"text": "đã có trong chỉ mục"}])
+    assert _queued(pending) == ["chèn sau khi đọc dữ liệu"]
+
+
+def test_failed_update_requeues_the_claim(pending, monkeypatch):
+    indexer.queue_passage({"text": "đoạn luật mới"})
+
+    def fail(passages):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(indexer, "_update_tfidf", fail)
+    with pytest.raises(RuntimeError):
+        indexer.update_tfidf()
+    assert _queued(pending) == ["đoạn luật mới"]
+    assert list(pending.parent.iterdir()) == [pending]
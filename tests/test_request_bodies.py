@@ -0,0 +1,23 @@
+import msgspec
+import pytest
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize("url", ["/api/search", "/api/chat"])
+@pytest.mark.parametrize("body", [b"", b"{}", b'{"q": ""}', b'{"q": "   "}', b'{"k": 5}'])
+def test_missing_or_blank_query_is_400(client, url, body):
+    resp = client.post(url, data=body, content_type="application/json")
+    assert resp.status_code == 400
+    assert resp.get_json()["status"] == "error"
+
+
+def test_query_and_defaults_are_decoded():
+    body = '{"q": "Điều 5", "k": "3"}'.encode("utf-8")
+    req = msgspec.json.decode(body, type=app_module.SearchReq, strict=False)
+    assert (req.q, req.k, req.mode) == ("Điều 5", 3, None)
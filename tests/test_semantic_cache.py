@@ -0,0 +1,19 @@
+from backend.semantic_cache import FuzzyQueryCache, _normalize, _simhash
+
+
+def _distance(a, b):
+    return (_simhash(_normalize(a)) ^ _simhash(_normalize(b))).bit_count()
+
+
+def test_tone_marks_change_the_signature():
+    # thuê (rent) / thuế (tax), đặt (place) / đất (land)
+    assert _distance("giá thuê đất nông nghiệp là bao nhiêu?", "giá thuế đất nông nghiệp là bao nhiêu?") > 3
+    assert _distance("thủ tục đặt cọc mua nhà", "thủ tục đất cọc mua nhà") > 3
+
+
+def test_rent_answer_is_not_served_for_tax_question():
+    cache = FuzzyQueryCache(max_entries=10, max_hamming=3)
+    cache.put("giá thuê đất nông nghiệp là bao nhiêu?", "chat", "rent answer")
+    assert cache.get("giá thuế đất nông nghiệp là bao nhiêu?", "chat") is None
+    # Punctuation / case / spacing differences still hit
+    assert cache.get("Giá thuê đất nông nghiệp  là bao nhiêu", "chat") == "rent answer"
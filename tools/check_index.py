@@ -1,8 +1,10 @@
-import sys, os, json
+import sys, os
 sys.path.insert(0, '.')
 
 from config import DATA_DIR, TINYDB_PATH
 from backend import indexer
+from backend.search import top_k_indices
+from backend.tinydb_storage import UTF8Storage
 
 print('Running index checks...')
 
@@ -18,7 +20,9 @@ if os.path.exists(tfidf_path):
     try:
         import joblib
         import numpy as np
-        vec, X, docs = joblib.load(tfidf_path)
+        # Memory-map the CSR arrays (as backend/search does): only the pages the
+        # test queries touch are read from disk
+        vec, X, docs = joblib.load(tfidf_path, mmap_mode='r')
         print('Loaded TF-IDF: docs=', len(docs), 'matrix shape=', X.shape)
 
         queries = [
@@ -26,13 +30,16 @@ if os.path.exists(tfidf_path):
             'Thủ tục mua đất cần gì?',
             'Điều 3 định nghĩa gì'
         ]
-        for q in queries:
-            qv = vec.transform([q])
-            scores = (X @ qv.T).toarray().ravel()
+        # One vectorizer call and one sparse product for all probes: X is
+        # walked once, giving a docs x queries score matrix
+        Q = vec.transform(queries)
+        S = (X @ Q.T).toarray()
+        for q, scores in zip(queries, S.T):
             if scores.max() > 0:
-                idxs = (-scores).argsort()[:5]
+                idxs = top_k_indices(scores, 5)
             else:
-                idxs = (-scores).argsort()[:5]
+                # No query term matched: every score ties at 0, show the first docs
+                idxs = np.arange(min(5, len(scores)))
             print('\nQuery:', q)
             for rank,i in enumerate(idxs,1):
                 print(f' {rank}. score={float(scores[i]):.4f} title={docs[i].get("title")[:60]} section={docs[i].get("section")}')
@@ -45,8 +52,11 @@ else:
 try:
     tiny_path = TINYDB_PATH or os.path.join('data','tinydb.json')
     if os.path.exists(tiny_path):
-        with open(tiny_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        # Same reader as the TinyDB fallback: raw UTF-8 bytes parsed by orjson
+        data = UTF8Storage(tiny_path, access_mode='r').read() or {}
+        if isinstance(data, dict):
+            # TinyDB layout is {table: {doc_id: document}}
+            data = [d for table in data.values() if isinstance(table, dict) for d in table.values()]
         print('\nTinyDB entries (sample):', len(data) if isinstance(data, list) else 'unknown')
         if isinstance(data, list):
             for d in data[:3]:
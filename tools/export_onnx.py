@@ -0,0 +1,38 @@
+"""Export EMBEDDING_MODEL to ONNX and quantize it to int8 for build_embeddings.
+
+Usage: python tools/export_onnx.py
+Needs sentence-transformers, torch and onnxruntime. Writes the int8 model to
+EMBEDDING_ONNX_PATH and the tokenizer next to it.
+"""
+import sys, os
+sys.path.insert(0, '.')
+
+import torch
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from sentence_transformers import SentenceTransformer
+
+from config import EMBEDDING_MODEL, EMBEDDING_ONNX_PATH
+
+out_dir = os.path.dirname(EMBEDDING_ONNX_PATH)
+os.makedirs(out_dir, exist_ok=True)
+fp32_path = os.path.join(out_dir, "model.onnx")
+
+st = SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+transformer = st[0].auto_model.eval()
+tokenizer = st.tokenizer
+tokenizer.save_pretrained(out_dir)
+
+sample = tokenizer(["Quyền sử dụng đất là gì?"], return_tensors="pt")
+names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+dynamic = {n: {0: "batch", 1: "seq"} for n in names}
+dynamic["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+print(f"Exporting {EMBEDDING_MODEL} -> {fp32_path}")
+with torch.no_grad():
+    torch.onnx.export(transformer, tuple(sample[n] for n in names), fp32_path,
+                      input_names=names, output_names=["last_hidden_state"],
+                      dynamic_axes=dynamic, opset_version=14)
+
+print(f"Quantizing -> {EMBEDDING_ONNX_PATH}")
+quantize_dynamic(fp32_path, EMBEDDING_ONNX_PATH, weight_type=QuantType.QInt8)
+print("Done.")